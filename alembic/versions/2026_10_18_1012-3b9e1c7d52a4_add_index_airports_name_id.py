@@ -0,0 +1,27 @@
+"""add index airports name id
+
+Revision ID: 3b9e1c7d52a4
+Revises: 82a6f8c72524
+Create Date: 2026-10-18 10:12:41.203518
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b9e1c7d52a4"
+down_revision: Union[str, None] = "82a6f8c72524"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_airports_name_id", "airports", ["name", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_airports_name_id", table_name="airports")
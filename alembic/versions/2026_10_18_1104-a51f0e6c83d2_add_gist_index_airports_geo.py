@@ -0,0 +1,31 @@
+"""add gist index airports geo
+
+Revision ID: a51f0e6c83d2
+Revises: 3b9e1c7d52a4
+Create Date: 2026-10-18 11:04:17.552190
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a51f0e6c83d2"
+down_revision: Union[str, None] = "3b9e1c7d52a4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индекс по geometry (для && и ST_DWithin по geometry), мог быть создан geoalchemy2 вместе с таблицей
+    op.execute("CREATE INDEX IF NOT EXISTS idx_airports_geo ON airports USING gist (geo)")
+    # Индекс по geography для KNN-сортировки (<->) по расстоянию на сфере
+    op.execute("CREATE INDEX IF NOT EXISTS idx_airports_geo_geography ON airports USING gist (geography(geo))")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # idx_airports_geo не удаляется: он мог существовать до этой миграции
+    op.execute("DROP INDEX IF EXISTS idx_airports_geo_geography")
@@ -0,0 +1,58 @@
+"""add table airportratings
+
+Revision ID: 7c2f4e9a1b38
+Revises: a51f0e6c83d2
+Create Date: 2026-10-18 12:10:42.318455
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2f4e9a1b38"
+down_revision: Union[str, None] = "a51f0e6c83d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STAR_COLUMNS = [f"stars_{star}" for star in range(1, 6)]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "airportratings",
+        sa.Column("airport_id", sa.UUID(), nullable=False),
+        sa.Column("review_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("rating_sum", sa.Integer(), server_default="0", nullable=False),
+        *(sa.Column(name, sa.Integer(), server_default="0", nullable=False) for name in STAR_COLUMNS),
+        sa.Column(
+            "id",
+            sa.UUID(),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.CheckConstraint("review_count >= 0", name="check_review_count"),
+        sa.ForeignKeyConstraint(["airport_id"], ["airports.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("airport_id"),
+    )
+    # Сводка по уже оставленным отзывам
+    op.execute(
+        "INSERT INTO airportratings (airport_id, review_count, rating_sum, {stars}) "
+        "SELECT airport_id, count(*), sum(rating), {filters} "
+        "FROM airportcomments GROUP BY airport_id".format(
+            stars=", ".join(STAR_COLUMNS),
+            filters=", ".join(f"count(*) FILTER (WHERE rating = {star})" for star in range(1, 6)),
+        )
+    )
+    # Отзывы пользователя выбираются при его удалении
+    op.create_index("ix_airportcomments_user_id", "airportcomments", ["user_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_airportcomments_user_id", table_name="airportcomments")
+    op.drop_table("airportratings")
@@ -0,0 +1,32 @@
+"""add index airportcomments airport_id created_at id
+
+Revision ID: d48a17b9e6f0
+Revises: 7c2f4e9a1b38
+Create Date: 2026-10-18 13:05:26.904117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d48a17b9e6f0"
+down_revision: Union[str, None] = "7c2f4e9a1b38"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Страницы отзывов аэропорта: WHERE airport_id = ... ORDER BY created_at DESC, id DESC (обратный обход индекса)
+    op.create_index(
+        "ix_airportcomments_airport_id_created_at_id",
+        "airportcomments",
+        ["airport_id", "created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_airportcomments_airport_id_created_at_id", table_name="airportcomments")
@@ -0,0 +1,32 @@
+"""add gist index citys geography
+
+Revision ID: e5b7a2c940d1
+Revises: d48a17b9e6f0
+Create Date: 2026-10-18 14:02:41.318604
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b7a2c940d1"
+down_revision: Union[str, None] = "d48a17b9e6f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индекс по выражению для KNN-сортировки (<->) населенных пунктов по расстоянию на сфере,
+    # выражение должно совпадать с используемым в get_city_nearest
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_citys_geography ON citys "
+        "USING gist (geography(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)))"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS idx_citys_geography")
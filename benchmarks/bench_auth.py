@@ -0,0 +1,52 @@
+"""
+Накладные расходы авторизации на запрос: полная проверка jwt-токена (decode_jwt)
+и кэш проверенных токенов (VerifiedTokenCache) для одного и того же токена.
+
+Запуск:
+    python -m benchmarks.bench_auth --requests 20000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from prometheus_client import REGISTRY
+
+from src.core.jwt_utils import create_jwt, decode_jwt
+from src.core.token_cache import VerifiedTokenCache
+
+
+def counter(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+async def run(requests: int) -> None:
+    token: str = await create_jwt(user=str(uuid.uuid4()))
+    cache = VerifiedTokenCache()
+
+    start: float = time.perf_counter()
+    for _ in range(requests):
+        await decode_jwt(token)
+    decode_time: float = time.perf_counter() - start
+
+    hits: float = counter("token_cache_hits_total")
+    misses: float = counter("token_cache_misses_total")
+    start = time.perf_counter()
+    for _ in range(requests):
+        await cache.decode(token)
+    cache_time: float = time.perf_counter() - start
+
+    print(f"requests: {requests}")
+    print(f"decode_jwt : {decode_time / requests * 1e6:8.2f} us/request")
+    print(f"token cache: {cache_time / requests * 1e6:8.2f} us/request")
+    print(f"speedup    : {decode_time / cache_time:8.1f}x")
+    hits, misses = counter("token_cache_hits_total") - hits, counter("token_cache_misses_total") - misses
+    print(f"cache hits: {hits:.0f}, misses: {misses:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(requests=args.requests))
@@ -0,0 +1,69 @@
+"""
+Сравнение движков поиска ближайших аэропортов: снимок в памяти (SphereIndex) и PostGIS.
+
+Запуск (нужна БД с загруженными аэропортами):
+    python -m benchmarks.bench_nearest --queries 500 --limit 3
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import select
+
+from src.api_v1.airports.crud import get_airports_nearest
+from src.api_v1.airports.snapshot import AirportSnapshot, load_airport_snapshot
+from src.core.database import async_session_maker, engine
+from src.models.airport import Airport
+from src.utils.spatial_index import DISTANCE_TOLERANCE_METERS
+
+
+def random_points(count: int, seed: int) -> list[tuple[float, float]]:
+    rnd = random.Random(seed)
+    # Территория России с запасом: широта 41..78, долгота 19..180
+    return [(rnd.uniform(41.0, 78.0), rnd.uniform(19.0, 180.0)) for _ in range(count)]
+
+
+async def run(queries: int, limit: int, seed: int) -> None:
+    points: list[tuple[float, float]] = random_points(queries, seed)
+
+    async with async_session_maker() as session:
+        snapshot: AirportSnapshot = await load_airport_snapshot(session=session, version="bench")
+        count: int = len((await session.execute(select(Airport.id))).all())
+        print(f"airports: {count}, queries: {queries}, limit: {limit}")
+
+        start: float = time.perf_counter()
+        memory_results = [snapshot.nearest(latitude=lat, longitude=lon, limit=limit) for lat, lon in points]
+        memory_time: float = time.perf_counter() - start
+
+        start = time.perf_counter()
+        postgis_results = [
+            await get_airports_nearest(session=session, latitude=lat, longitude=lon, limit=limit) for lat, lon in points
+        ]
+        postgis_time: float = time.perf_counter() - start
+
+    await engine.dispose()
+
+    mismatches: int = 0
+    max_diff_km: float = 0.0
+    for memory, postgis in zip(memory_results, postgis_results):
+        if [a.id for a in memory] != [a.id for a in postgis]:
+            mismatches += 1
+        for a, b in zip(memory, postgis):
+            max_diff_km = max(max_diff_km, abs((a.distance or 0.0) - (b.distance or 0.0)))
+
+    print(f"memory : {memory_time / queries * 1e6:10.1f} us/query")
+    print(f"postgis: {postgis_time / queries * 1e6:10.1f} us/query")
+    print(f"speedup: {postgis_time / memory_time:10.1f}x")
+    print(f"order mismatches: {mismatches}, max distance diff: {max_diff_km * 1000:.3f} m")
+    print(f"(distances are rounded to 10 m in responses, engine tolerance {DISTANCE_TOLERANCE_METERS} m)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(queries=args.queries, limit=args.limit, seed=args.seed))
@@ -1,7 +1,7 @@
 #!/bin/bash
 
 if [[ "${1}" == "celery" ]]; then
-  celery -A src.tasks.celery_conf worker -l INFO
+  celery -A src.tasks.celery_conf worker -B -l INFO
 elif [[ "${1}" == "flower" ]]; then
   celery -A src.tasks.celery_conf flower
  fi
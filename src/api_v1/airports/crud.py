@@ -1,17 +1,33 @@
 from typing import Any, Optional, Sequence
 from uuid import UUID
 
-from geoalchemy2.functions import ST_DistanceSphere, ST_Point
-from sqlalchemy import Float, Row, select
+from geoalchemy2.functions import ST_DistanceSphere, ST_DWithin, ST_MakeEnvelope, ST_Point
+from pydantic import TypeAdapter
+from sqlalchemy import Float, Row, Select, func, literal, select, tuple_
 from sqlalchemy.engine import Result
 from sqlalchemy.exc import NoResultFound, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.expression import cast
 
+from src.core.config import CACHE_EXP
 from src.core.exceptions import ExceptDB, NotFindData
 from src.models.airport import Airport
+from src.utils.cache_utils import ReadThroughCache
+from src.utils.data_utils import model_to_json
+from src.utils.geo_utils import distance_sphere, grid_cell_center, grid_cell_radius
 
-from .schemas import AirPortOutGeoSchemas
+from .schemas import AirPortOutAllSchemas, AirPortOutGeoSchemas
+
+NEAREST_CELL_MARGIN = 1000.0  # запас (в метрах) к радиусу выборки кандидатов ячейки
+# запас кандидатов KNN-сортировки: порядок по <-> (geography) может расходиться с ST_DistanceSphere
+NEAREST_KNN_MARGIN = 5
+
+airports_candidates_adapter = TypeAdapter(list[AirPortOutGeoSchemas])
+
+# данные аэропорта (json) по id и по имени
+airport_cache = ReadThroughCache(namespace="airport", ttl=CACHE_EXP)
+# аэропорты-кандидаты для поиска ближайших по ячейкам сетки
+nearest_cache = ReadThroughCache(namespace="nearest", ttl=CACHE_EXP, decode=airports_candidates_adapter.validate_json)
 
 
 async def get_all_airport(session: AsyncSession) -> list[Row[Any]]:
@@ -33,6 +49,52 @@ async def get_all_airport(session: AsyncSession) -> list[Row[Any]]:
     return list(airports)
 
 
+async def get_airports_page(
+    session: AsyncSession, size: int, after: Optional[tuple[str, UUID]] = None
+) -> list[Row[Any]]:
+    """
+    Возвращает страницу списка аэропортов (keyset-пагинация по name, id)
+    :param session: AsyncSession
+        сессия БД
+    :param size: int
+        размер страницы
+    :param after: Optional[tuple[str, UUID]]
+        ключ (name, id) последнего аэропорта предыдущей страницы
+    :return: list[Row[Any]]
+        до size + 1 записей, лишняя запись означает наличие следующей страницы
+    """
+    stmt = select(
+        Airport.id,
+        Airport.name,
+        Airport.address,
+        Airport.img_top,
+        Airport.short_description,
+    )
+    if after is not None:
+        last_key = tuple_(literal(after[0], Airport.name.type), literal(after[1], Airport.id.type))
+        stmt = stmt.where(tuple_(Airport.name, Airport.id) > last_key)
+    stmt = stmt.order_by(Airport.name, Airport.id).limit(size + 1)
+    try:
+        result: Result = await session.execute(stmt)
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+    return list(result.all())
+
+
+async def get_airports_count(session: AsyncSession) -> int:
+    """
+    Возвращает количество аэропортов
+    :param session: AsyncSession
+        сессия БД
+    :return: int
+    """
+    try:
+        count: Optional[int] = await session.scalar(select(func.count(Airport.id)))
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+    return count or 0
+
+
 async def get_airport(session: AsyncSession, id_airport: UUID) -> Airport:
     """
     Возвращает данные аэропорта по ID
@@ -52,6 +114,24 @@ async def get_airport(session: AsyncSession, id_airport: UUID) -> Airport:
     return airport
 
 
+async def get_airports_by_ids(session: AsyncSession, ids: list[UUID]) -> dict[UUID, Airport]:
+    """
+    Возвращает данные аэропортов по списку ID
+    :param session: AsyncSession
+        сессия БД
+    :param ids: list[UUID]
+        ID аэропортов
+    :return: dict[UUID, Airport]
+        ID -> аэропорт (отсутствующие в БД аэропорты пропускаются)
+    """
+    try:
+        stmt = select(Airport).where(Airport.id.in_(ids))
+        result: Result = await session.execute(stmt)
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+    return {airport.id: airport for airport in result.scalars().all()}
+
+
 async def get_airport_by_name_from_db(session: AsyncSession, airport_title: str) -> Airport:
     """
     Возвращает данные аэропорта по его имени
@@ -73,11 +153,41 @@ async def get_airport_by_name_from_db(session: AsyncSession, airport_title: str)
     return airport
 
 
+@airport_cache.cached(key=lambda session, id_airport: f"id:{id_airport}")
+async def get_airport_json(session: AsyncSession, id_airport: UUID) -> str:
+    """
+    Возвращает данные аэропорта по ID в виде json (через кэш)
+    :param session: AsyncSession
+        сессия БД
+    :param id_airport: UUID
+        ID аэропорта
+    :return: str
+    """
+    airport: Airport = await get_airport(session=session, id_airport=id_airport)
+    return await model_to_json(pydantic_model=AirPortOutAllSchemas, object=airport)
+
+
+@airport_cache.cached(key=lambda session, airport_title: f"name:{airport_title}")
+async def get_airport_by_name_json(session: AsyncSession, airport_title: str) -> str:
+    """
+    Возвращает данные аэропорта по его имени в виде json (через кэш)
+    :param session: AsyncSession
+        сессия БД
+    :param airport_title: str
+        имя аэропорта
+    :return: str
+    """
+    airport: Airport = await get_airport_by_name_from_db(session=session, airport_title=airport_title)
+    return await model_to_json(pydantic_model=AirPortOutAllSchemas, object=airport)
+
+
 async def get_airports_nearest(
     session: AsyncSession, latitude: float, longitude: float, limit: int
 ) -> list[AirPortOutGeoSchemas]:
     """
-    Поиск ближайших аэропортов от заданной точки, города или аэропорта
+    Поиск ближайших аэропортов от заданной точки, города или аэропорта.
+    Кандидаты выбираются KNN-сортировкой (<->) по индексу idx_airports_geo_geography с запасом
+    NEAREST_KNN_MARGIN, точное расстояние (ST_DistanceSphere) считается только для них
     :param session: AsyncSession
         сессия БД
     :param latitude: float
@@ -101,17 +211,147 @@ async def get_airports_nearest(
                 Float,
             ).label("distance"),
         )
-        .order_by("distance")
-        .limit(limit + 1)
+        .order_by(func.geography(Airport.geo).op("<->")(func.geography(geo)))
+        .limit(limit + 1 + NEAREST_KNN_MARGIN)
     )
 
     result: Result = await session.execute(stmt)
+    candidates: list[Row[Any]] = sorted(result.all(), key=lambda row: row.distance)
 
     airports_nearest = list()
-    for airport, distance in result:
+    for airport, distance in candidates:
         if (airport.latitude != latitude) and (airport.longitude != longitude):
             data = AirPortOutGeoSchemas(**airport.__dict__)
             data.distance: float = round(distance / 1000, 2)  # type: ignore
             airports_nearest.append(data)
 
     return airports_nearest[:limit]
+
+
+async def get_airports_candidates(
+    session: AsyncSession, latitude: float, longitude: float, count: int, margin: float
+) -> list[AirPortOutGeoSchemas]:
+    """
+    Возвращает аэропорты-кандидаты для поиска ближайших к любой точке в окрестности заданной:
+    count ближайших к точке аэропортов и все аэропорты, которые дальше ближайших не более чем на margin
+    :param session: AsyncSession
+        сессия БД
+    :param latitude: float
+        Широта
+    :param longitude: float
+        Долгота
+    :param count: int
+        количество ближайших аэропортов
+    :param margin: float
+        запас по расстоянию (в метрах)
+    :return: list[AirPortOutGeoSchemas]
+        аэропорты без расстояния (distance=None)
+    """
+    geo = ST_Point(longitude, latitude, srid=4326)
+
+    try:
+        stmt = (
+            select(cast(ST_DistanceSphere(geo, Airport.geo), Float))
+            .order_by(func.geography(Airport.geo).op("<->")(func.geography(geo)))
+            .limit(count)
+        )
+        distances: list[float] = list((await session.execute(stmt)).scalars().all())
+        if not distances:
+            return list()
+
+        # ST_DWithin по geography с use_spheroid=false считает расстояние на той же сфере, что и ST_DistanceSphere
+        radius: float = max(distances) + margin
+        stmt = select(Airport).where(ST_DWithin(func.geography(Airport.geo), func.geography(geo), radius, False))
+        result: Result = await session.execute(stmt)
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+
+    return [AirPortOutGeoSchemas(**airport.__dict__) for airport in result.scalars().all()]
+
+
+@nearest_cache.cached(key=lambda session, cell, cell_size, count: f"{cell_size}:{count}:{cell[0]}:{cell[1]}")
+async def get_cell_candidates(session: AsyncSession, cell: tuple[int, int], cell_size: float, count: int) -> str:
+    """
+    Возвращает аэропорты-кандидаты ячейки сетки в виде json (через кэш):
+    любой точке ячейки их хватает для выдачи до count ближайших аэропортов
+    :param session: AsyncSession
+        сессия БД
+    :param cell: tuple[int, int]
+        ячейка сетки
+    :param cell_size: float
+        размер ячейки (в градусах)
+    :param count: int
+        количество ближайших аэропортов
+    :return: str
+    """
+    center_latitude, center_longitude = grid_cell_center(cell, cell_size)
+    candidates: list[AirPortOutGeoSchemas] = await get_airports_candidates(
+        session=session,
+        latitude=center_latitude,
+        longitude=center_longitude,
+        count=count + 1,
+        margin=2 * grid_cell_radius(cell, cell_size) + NEAREST_CELL_MARGIN,
+    )
+    return airports_candidates_adapter.dump_json(candidates).decode()
+
+
+def get_nearest_from_candidates(
+    candidates: list[AirPortOutGeoSchemas], latitude: float, longitude: float, limit: int
+) -> list[AirPortOutGeoSchemas]:
+    """
+    Выбирает из кандидатов ближайшие к заданной точке аэропорты с расчетом расстояния
+    :param candidates: list[AirPortOutGeoSchemas]
+        аэропорты-кандидаты
+    :param latitude: float
+        Широта
+    :param longitude: float
+        Долгота
+    :param limit: int
+        количество возвращаемых объектов
+    :return: list[AirPortOutGeoSchemas]
+    """
+    distances = [
+        (distance_sphere(latitude, longitude, airport.latitude, airport.longitude), airport) for airport in candidates
+    ]
+    distances.sort(key=lambda item: item[0])
+
+    airports_nearest = list()
+    for distance, airport in distances:
+        if (airport.latitude != latitude) and (airport.longitude != longitude):
+            airports_nearest.append(airport.model_copy(update={"distance": round(distance / 1000, 2)}))
+
+    return airports_nearest[:limit]
+
+
+def get_airports_within_stmt(
+    latitude: float,
+    longitude: float,
+    radius: Optional[float] = None,
+    bbox: Optional[tuple[float, float, float, float]] = None,
+) -> Select[Any]:
+    """
+    Запрос аэропортов в радиусе от точки и/или в прямоугольнике координат, отсортированных по расстоянию.
+    Отбор выполняется по пространственным индексам (ST_DWithin по geography, && по geometry),
+    расстояние считается только для отобранных аэропортов
+    :param latitude: float
+        Широта точки, от которой считается расстояние
+    :param longitude: float
+        Долгота точки, от которой считается расстояние
+    :param radius: Optional[float]
+        радиус (в метрах)
+    :param bbox: Optional[tuple[float, float, float, float]]
+        прямоугольник (min_latitude, min_longitude, max_latitude, max_longitude)
+    :return: Select[Any]
+        строки (Airport, distance), distance в метрах
+    """
+    geo = ST_Point(longitude, latitude, srid=4326)
+    distance = cast(ST_DistanceSphere(geo, Airport.geo), Float).label("distance")
+
+    stmt = select(Airport, distance)
+    if radius is not None:
+        stmt = stmt.where(ST_DWithin(func.geography(Airport.geo), func.geography(geo), radius, False))
+    if bbox is not None:
+        min_latitude, min_longitude, max_latitude, max_longitude = bbox
+        envelope = ST_MakeEnvelope(min_longitude, min_latitude, max_longitude, max_latitude, 4326)
+        stmt = stmt.where(Airport.geo.op("&&")(envelope))
+    return stmt.order_by(distance, Airport.id)
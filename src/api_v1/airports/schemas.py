@@ -6,18 +6,55 @@ from pydantic import UUID4, BaseModel, Field, computed_field
 
 from src.core.config import DIR_FOTO, DIR_LOGOTIP
 
+DISTANCE_BATCH_MAX_PAIRS = 1000
+DISTANCE_MATRIX_MAX_POINTS = 1000
+DISTANCE_MATRIX_MAX_CELLS = 10000
+
 
 class GeoDataSchemas(BaseModel):
     latitude: float
     longitude: float
 
 
+class DistancePairSchemas(BaseModel):
+    origin: GeoDataSchemas
+    destination: GeoDataSchemas
+
+
+class DistanceBatchInSchemas(BaseModel):
+    pairs: list[DistancePairSchemas] = Field(max_length=DISTANCE_BATCH_MAX_PAIRS)
+
+
+class DistanceBatchOutSchemas(BaseModel):
+    distance_meters: list[float]
+    distance_kilometers: list[float]
+
+
+class DistanceMatrixInSchemas(BaseModel):
+    origins: list[GeoDataSchemas] = Field(max_length=DISTANCE_MATRIX_MAX_POINTS)
+    destinations: list[GeoDataSchemas] = Field(max_length=DISTANCE_MATRIX_MAX_POINTS)
+
+
+class DistanceMatrixOutSchemas(BaseModel):
+    distance_meters: list[list[float]] = Field(description="Строки - начальные точки, столбцы - конечные")
+    distance_kilometers: list[list[float]]
+
+
 class AirPortOutShortSchemas(BaseModel):
     id: UUID4 = Field(default_factory=uuid4)
     name: str
     address: str
     short_description: str
     img_top: str = Field(description="Имя файла логотипа аэропорта")
+    average_rating: Optional[float] = Field(None, description="Средний рейтинг по отзывам")
+    review_count: Optional[int] = Field(None, description="Число отзывов")
+
+
+class AirPortCursorPageSchemas(BaseModel):
+    items: list[AirPortOutShortSchemas]
+    total: int
+    size: int
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы")
 
 
 class AirPortOutAllSchemas(BaseModel):
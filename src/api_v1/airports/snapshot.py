@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, Optional
+from uuid import UUID
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api_v1.airports.crud import airport_cache, nearest_cache
+from src.core.config import AIRPORTS_SNAPSHOT_CHECK, configure_logging
+from src.core.invalidation import invalidation_bus
+from src.models.airport import Airport
+from src.utils.spatial_index import SphereIndex
+
+from .schemas import AirPortOutAllSchemas, AirPortOutGeoSchemas, AirPortOutShortSchemas
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+AIRPORTS_VERSION_KEY = "airports:version"
+AIRPORTS_COUNT_KEY = "airports:count"
+AIRPORTS_SNAPSHOT_NAMESPACE = "airport_snapshot"
+
+
+@dataclass(frozen=True, slots=True)
+class AirportSnapshot:
+    """
+    Неизменяемый снимок справочника аэропортов в памяти процесса
+    """
+
+    version: str
+    airports: tuple[AirPortOutAllSchemas, ...]
+    short: tuple[AirPortOutShortSchemas, ...] = field(init=False)
+    by_id: Mapping[UUID, AirPortOutAllSchemas] = field(init=False)
+    by_name: Mapping[str, AirPortOutAllSchemas] = field(init=False)
+    json_by_id: Mapping[UUID, bytes] = field(init=False)
+    json_by_name: Mapping[str, bytes] = field(init=False)
+    index: SphereIndex = field(init=False)
+
+    def __post_init__(self) -> None:
+        short = tuple(AirPortOutShortSchemas(**airport.model_dump()) for airport in self.airports)
+        object.__setattr__(self, "short", short)
+        object.__setattr__(self, "by_id", MappingProxyType({airport.id: airport for airport in self.airports}))
+        object.__setattr__(self, "by_name", MappingProxyType({airport.full_name: airport for airport in self.airports}))
+        # Готовые json представления аэропортов отдаются клиенту без повторной сериализации
+        json_by_id = {airport.id: airport.model_dump_json().encode() for airport in self.airports}
+        object.__setattr__(self, "json_by_id", MappingProxyType(json_by_id))
+        json_by_name = {airport.full_name: json_by_id[airport.id] for airport in self.airports}
+        object.__setattr__(self, "json_by_name", MappingProxyType(json_by_name))
+        index = SphereIndex(
+            latitudes=[airport.latitude for airport in self.airports],
+            longitudes=[airport.longitude for airport in self.airports],
+        )
+        object.__setattr__(self, "index", index)
+
+    def nearest(self, latitude: float, longitude: float, limit: int) -> list[AirPortOutGeoSchemas]:
+        """
+        Поиск ближайших аэропортов от заданной точки (аналог get_airports_nearest без обращения к БД)
+        :param latitude: float
+            Широта
+        :param longitude: float
+            Долгота
+        :param limit: int
+            количество возвращаемых объектов
+        :return: list[AirPortOutGeoSchemas]
+        """
+        indexes, distances = self.index.nearest(latitude=latitude, longitude=longitude, k=limit + 1)
+
+        airports_nearest: list[AirPortOutGeoSchemas] = list()
+        for i, distance in zip(indexes.tolist(), distances.tolist()):
+            airport: AirPortOutAllSchemas = self.airports[i]
+            if (airport.latitude != latitude) and (airport.longitude != longitude):
+                data = AirPortOutGeoSchemas(**airport.model_dump())
+                data.distance = round(distance / 1000, 2)
+                airports_nearest.append(data)
+
+        return airports_nearest[:limit]
+
+
+async def load_airport_snapshot(session: AsyncSession, version: str) -> AirportSnapshot:
+    """
+    Загружает из БД снимок справочника аэропортов
+    :param session: AsyncSession
+        сессия БД
+    :param version: str
+        версия данных справочника
+    :return: AirportSnapshot
+    """
+    stmt = select(Airport).order_by(Airport.name)
+    result: Result = await session.execute(stmt)
+    airports = tuple(AirPortOutAllSchemas(**airport.__dict__) for airport in result.scalars().all())
+    return AirportSnapshot(version=version, airports=airports)
+
+
+async def get_airports_version(db_cache: Redis) -> str:
+    """
+    Возвращает текущую версию данных справочника аэропортов
+    """
+    version: Optional[str] = await db_cache.get(AIRPORTS_VERSION_KEY)
+    return version or "0"
+
+
+async def bump_airports_version(db_cache: Redis) -> None:
+    """
+    Увеличивает версию данных справочника аэропортов и сбрасывает кэш списка, количества,
+    данных и ближайших аэропортов.
+    Вызывается после изменения таблицы airports
+    """
+    await db_cache.incr(AIRPORTS_VERSION_KEY)
+    await db_cache.delete("airports", AIRPORTS_COUNT_KEY)
+    await airport_cache.invalidate_all(db_cache)
+    await nearest_cache.invalidate_all(db_cache)
+    await invalidation_bus.publish(AIRPORTS_SNAPSHOT_NAMESPACE, redis=db_cache)
+
+
+class AirportDirectory:
+    """
+    Хранит актуальный снимок справочника аэропортов.
+    Версия данных проверяется не чаще одного раза в check_interval секунд,
+    при изменении версии снимок пересобирается и атомарно подменяется
+    """
+
+    def __init__(self, check_interval: float = AIRPORTS_SNAPSHOT_CHECK) -> None:
+        self.check_interval = check_interval
+        self._snapshot: Optional[AirportSnapshot] = None
+        self._checked_at: float = float("-inf")
+        self._lock = asyncio.Lock()
+
+    @property
+    def snapshot(self) -> Optional[AirportSnapshot]:
+        return self._snapshot
+
+    def clear(self) -> None:
+        self._snapshot = None
+        self._checked_at = float("-inf")
+
+    def expire(self, key: Optional[str] = None) -> None:
+        """
+        Сверяет версию снимка при следующем обращении, не дожидаясь check_interval.
+        До окончания сверки отдается текущий снимок
+        """
+        self._checked_at = float("-inf")
+
+    async def get(self, session: AsyncSession, db_cache: Redis) -> Optional[AirportSnapshot]:
+        """
+        Возвращает снимок справочника, при необходимости перезагружая его.
+        При недоступности Redis или БД продолжает отдавать последний загруженный снимок
+        :param session: AsyncSession
+            сессия БД
+        :param db_cache: Redis
+            кэш
+        :return: Optional[AirportSnapshot]
+        """
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._snapshot
+
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return self._snapshot
+            await self.refresh(session=session, db_cache=db_cache)
+        return self._snapshot
+
+    async def refresh(self, session: AsyncSession, db_cache: Redis) -> None:
+        """
+        Сверяет версию снимка с версией данных и при расхождении загружает новый снимок
+        """
+        try:
+            version: str = await get_airports_version(db_cache)
+        except RedisError as exc:
+            logger.warning("Unable to check airports version: %s", exc)
+            self._checked_at = time.monotonic()
+            return
+
+        if self._snapshot is not None and self._snapshot.version == version:
+            self._checked_at = time.monotonic()
+            return
+
+        try:
+            snapshot: AirportSnapshot = await load_airport_snapshot(session=session, version=version)
+        except SQLAlchemyError as exc:
+            logger.warning("Unable to load airports snapshot: %s", exc)
+            self._checked_at = time.monotonic()
+            return
+
+        if not snapshot.airports:
+            logger.warning("Airports table is empty, snapshot is not used")
+            self._checked_at = time.monotonic()
+            return
+
+        self._snapshot = snapshot
+        self._checked_at = time.monotonic()
+        logger.info("Airports snapshot version %s loaded (%d airports)", version, len(snapshot.airports))
+
+
+airport_directory = AirportDirectory()
+invalidation_bus.subscribe(AIRPORTS_SNAPSHOT_NAMESPACE, airport_directory.expire)
@@ -1,25 +1,53 @@
 import json
 import logging
-from typing import Any, Optional, Union
+from typing import Any, Optional, Sequence
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+import numpy as np
+from fastapi import APIRouter, Depends, Query, Response, status
 from fastapi.exceptions import HTTPException
 from fastapi_pagination import Page, paginate
-from geoalchemy2.functions import ST_DistanceSphere, ST_Point
-from geoalchemy2.types import Geometry
-from sqlalchemy import select
+from fastapi_pagination.ext.sqlalchemy import paginate as paginate_query
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.api_v1.airports.crud import get_airport, get_airport_by_name_from_db, get_airports_nearest, get_all_airport
-from src.core.config import CACHE_EXP, configure_logging
+from src.api_v1.airports.crud import (
+    get_airport_by_name_json,
+    get_airport_json,
+    get_airports_count,
+    get_airports_nearest,
+    get_airports_page,
+    get_airports_within_stmt,
+    get_all_airport,
+    get_cell_candidates,
+    get_nearest_from_candidates,
+)
+from src.api_v1.airports.snapshot import AIRPORTS_COUNT_KEY, AirportSnapshot, airport_directory
+from src.api_v1.cities.crud import get_city_nearest
+from src.api_v1.cities.schemas import CityGeoSchemas
+from src.api_v1.cities.snapshot import city_directory
+from src.api_v1.comments.crude import get_rating_histograms
+from src.core.config import CACHE_EXP, configure_logging, setting
 from src.core.database import get_async_session, get_cache_connection
-from src.core.exceptions import ExceptDB, NotFindData
-from src.models.airport import Airport
-from src.utils.data_utils import json_to_model, model_to_json
-from src.utils.geo_utils import get_location_info
+from src.core.depends import rate_limit
+from src.core.exceptions import ErrorInData, ExceptDB, NotFindData
+from src.utils.cache_utils import get_or_rebuild_list
+from src.utils.data_utils import decode_cursor, encode_cursor, json_response
+from src.utils.geo_utils import distance_sphere, grid_cell
+from src.utils.geocoder import reverse_geocoder
+from src.utils.spatial_index import distance_sphere_array
 
-from .schemas import AirPortOutAllSchemas, AirPortOutGeoSchemas, AirPortOutShortSchemas
+from .schemas import (
+    DISTANCE_MATRIX_MAX_CELLS,
+    AirPortCursorPageSchemas,
+    AirPortOutAllSchemas,
+    AirPortOutGeoSchemas,
+    AirPortOutShortSchemas,
+    DistanceBatchInSchemas,
+    DistanceBatchOutSchemas,
+    DistanceMatrixInSchemas,
+    DistanceMatrixOutSchemas,
+)
 
 router = APIRouter(tags=["Airports"])
 
@@ -27,6 +55,41 @@ configure_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+async def with_ratings(
+    session: AsyncSession, db_cache: Redis, airports: Sequence[AirPortOutShortSchemas]
+) -> list[AirPortOutShortSchemas]:
+    """
+    Дополняет страницу аэропортов средним рейтингом и числом отзывов (через кэш рейтингов).
+    Возвращает копии: объекты снимка справочника не изменяются.
+    Если рейтинги недоступны, страница возвращается без них
+    :param session: AsyncSession
+        сессия БД
+    :param db_cache: Redis
+        кэш
+    :param airports: Sequence[AirPortOutShortSchemas]
+        аэропорты страницы
+    :return: list[AirPortOutShortSchemas]
+    """
+    try:
+        ratings = await get_rating_histograms(
+            session=session, ids=[airport.id for airport in airports], db_cache=db_cache
+        )
+    except ExceptDB as exp:
+        logger.warning("Unable to load ratings of airports: %s", exp)
+        return list(airports)
+    return [
+        airport.model_copy(
+            update={
+                "average_rating": ratings[airport.id].average_rating,
+                "review_count": ratings[airport.id].review_count,
+            }
+        )
+        if airport.id in ratings
+        else airport
+        for airport in airports
+    ]
+
+
 @router.get("/airports", response_model=Page[AirPortOutShortSchemas])
 async def get_airports_all(
     session: AsyncSession = Depends(get_async_session),
@@ -36,29 +99,83 @@ async def get_airports_all(
     Возвращает список с данными аэропортов
     """
     logger.info("Start load info about airports")
-    all_airports = await db_cache.lrange("airports", 0, -1)
-    if not all_airports:
+    snapshot: Optional[AirportSnapshot] = await airport_directory.get(session=session, db_cache=db_cache)
+    if snapshot is not None:
+        logger.info("Read from snapshot info about airports")
+        page: Page[AirPortOutShortSchemas] = paginate(snapshot.short)
+        page.items = await with_ratings(session=session, db_cache=db_cache, airports=page.items)
+        return page
+
+    async def load_airports() -> list[str]:
         airports_db: list[Any] = await get_all_airport(session)
-        for airport in airports_db:
-            id_, name, address, img_top, short_description = airport
-            airport_data = {
-                "id": str(id_),
-                "name": name,
-                "address": address,
-                "img_top": img_top,
-                "short_description": short_description,
-            }
-            await db_cache.rpush("airports", json.dumps(airport_data))
-            await db_cache.expire("airports", CACHE_EXP)
-        logger.info("Write in cache info about airports")
-    else:
-        logger.info("Read from cache info about airports")
-        airports_db: list[AirPortOutShortSchemas] = list()  # type: ignore
-        for airport_json in all_airports:
-            airport_dict: dict[str, Any] = json.loads(airport_json)
-            airport_dict["id"] = UUID(airport_dict["id"])
-            airports_db.append(AirPortOutShortSchemas(**airport_dict))
-    return paginate(airports_db)
+        logger.info("Load from db info about airports")
+        return [
+            json.dumps(
+                {
+                    "id": str(id_),
+                    "name": name,
+                    "address": address,
+                    "img_top": img_top,
+                    "short_description": short_description,
+                }
+            )
+            for id_, name, address, img_top, short_description in airports_db
+        ]
+
+    all_airports: list[str] = await get_or_rebuild_list(db_cache=db_cache, key="airports", loader=load_airports)
+    airports: list[AirPortOutShortSchemas] = [
+        AirPortOutShortSchemas(**json.loads(airport_json)) for airport_json in all_airports
+    ]
+    page = paginate(airports)
+    page.items = await with_ratings(session=session, db_cache=db_cache, airports=page.items)
+    return page
+
+
+@router.get("/airports/cursor", response_model=AirPortCursorPageSchemas)
+async def get_airports_by_cursor(
+    cursor: Optional[str] = Query(None, description="Курсор страницы, полученный в next_cursor"),
+    size: int = Query(12, ge=1, le=100, description="Размер страницы"),
+    session: AsyncSession = Depends(get_async_session),
+    db_cache=Depends(get_cache_connection),
+) -> AirPortCursorPageSchemas:
+    """
+    Возвращает страницу списка аэропортов (пагинация по курсору)
+    """
+    logger.info("Start load page of airports by cursor")
+    after: Optional[tuple[str, UUID]] = None
+    if cursor is not None:
+        try:
+            name, id_airport = decode_cursor(cursor)
+            after = (name, UUID(id_airport))
+        except (ErrorInData, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+
+    try:
+        airports_db: list[Any] = await get_airports_page(session=session, size=size, after=after)
+        total: Optional[str] = await db_cache.get(AIRPORTS_COUNT_KEY)
+        if total is None:
+            total = str(await get_airports_count(session=session))
+            await db_cache.set(AIRPORTS_COUNT_KEY, total, ex=CACHE_EXP)
+    except ExceptDB as exp:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+
+    items: list[AirPortOutShortSchemas] = await with_ratings(
+        session=session,
+        db_cache=db_cache,
+        airports=[AirPortOutShortSchemas(**airport._mapping) for airport in airports_db[:size]],
+    )
+    next_cursor: Optional[str] = None
+    if len(airports_db) > size:
+        last: AirPortOutShortSchemas = items[-1]
+        next_cursor = encode_cursor([last.name, str(last.id)])
+
+    return AirPortCursorPageSchemas(items=items, total=int(total), size=size, next_cursor=next_cursor)
 
 
 @router.get("/airport/{airport_id}", response_model=AirPortOutAllSchemas)
@@ -66,35 +183,29 @@ async def get_airport_by_id(
     airport_id: UUID,
     session: AsyncSession = Depends(get_async_session),
     db_cache=Depends(get_cache_connection),
-) -> AirPortOutAllSchemas:
+) -> Response:
     """
     Возвращает данные аэропорта по ID
     """
     logger.info("Start load info about airport with id %s", str(airport_id))
-    airport_json: str = await db_cache.get(str(airport_id))
-    if airport_json is None:
-        try:
-            airport: Airport = await get_airport(session=session, id_airport=airport_id)
-        except ExceptDB as exp:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"{exp}",
-            )
-        except NotFindData as exp:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"{exp}",
-            )
-        else:
-            airport_json_model: str = await model_to_json(pydantic_model=AirPortOutAllSchemas, object=airport)
-            await db_cache.set(str(airport_id), airport_json_model, ex=CACHE_EXP)
-            logger.info("Write in cache info about airport with id %s", str(airport_id))
-    else:
-        logger.info("Read from cache info about airport with id %s", str(airport_id))
-        airport: AirPortOutAllSchemas = await json_to_model(  # type: ignore
-            pydantic_model=AirPortOutAllSchemas, json_object=airport_json
-        )  # type: ignore
-    return airport
+    snapshot: Optional[AirportSnapshot] = await airport_directory.get(session=session, db_cache=db_cache)
+    if snapshot is not None and airport_id in snapshot.by_id:
+        logger.info("Read from snapshot info about airport with id %s", str(airport_id))
+        return json_response(snapshot.json_by_id[airport_id])
+
+    try:
+        airport_json: str = await get_airport_json(session=session, id_airport=airport_id, db_cache=db_cache)
+    except ExceptDB as exp:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    except NotFindData as exp:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    return json_response(airport_json)
 
 
 @router.get("/airport", response_model=AirPortOutAllSchemas)
@@ -102,35 +213,31 @@ async def get_airport_by_name(
     airport_title: str,
     session: AsyncSession = Depends(get_async_session),
     db_cache=Depends(get_cache_connection),
-) -> AirPortOutAllSchemas:
+) -> Response:
     """
     Возвращает данные аэропорта по имени аэропорта
     """
     logger.info("Start load info about airport with title %s", airport_title)
-    airport_json: str = await db_cache.get(airport_title)
-    if airport_json is None:
-        try:
-            airport: Airport = await get_airport_by_name_from_db(session=session, airport_title=airport_title)
-        except ExceptDB as exp:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"{exp}",
-            )
-        except NotFindData as exp:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"{exp}",
-            )
-        else:
-            airport_json_model: str = await model_to_json(pydantic_model=AirPortOutAllSchemas, object=airport)
-            await db_cache.set(airport_title, airport_json_model, ex=CACHE_EXP)
-            logger.info("Write in cache info about airport with name %s", airport_title)
-    else:
-        logger.info("Read from cache info about airport with name %s", airport_title)
-        airport: AirPortOutAllSchemas = await json_to_model(  # type: ignore
-            pydantic_model=AirPortOutAllSchemas, json_object=airport_json
-        )  # type: ignore
-    return airport
+    snapshot: Optional[AirportSnapshot] = await airport_directory.get(session=session, db_cache=db_cache)
+    if snapshot is not None and airport_title in snapshot.by_name:
+        logger.info("Read from snapshot info about airport with title %s", airport_title)
+        return json_response(snapshot.json_by_name[airport_title])
+
+    try:
+        airport_json: str = await get_airport_by_name_json(
+            session=session, airport_title=airport_title, db_cache=db_cache
+        )
+    except ExceptDB as exp:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    except NotFindData as exp:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    return json_response(airport_json)
 
 
 @router.get("/distance")
@@ -139,22 +246,60 @@ async def get_distance(
     longitude_city: float = Query(..., description="Долгота города"),
     latitude_airport: float = Query(..., description="Широта аэропорта"),
     longitude_airport: float = Query(..., description="Долгота аэропорта"),
-    session: AsyncSession = Depends(get_async_session),
 ) -> dict[str, float]:
     """
     Возвращает расстояние от города до аэропорта
     """
     logger.info("Start of distance calculation")
-    geo_city: Union[Geometry, ST_Point] = ST_Point(longitude_city, latitude_city, srid=4326)
-    geo_airport: Union[Geometry, ST_Point] = ST_Point(longitude_airport, latitude_airport, srid=4326)
-
-    distance: float = await session.scalar(select(ST_DistanceSphere(geo_city, geo_airport)))  # результат в метрах
+    # результат в метрах, совпадает с ST_DistanceSphere
+    distance: float = distance_sphere(latitude_city, longitude_city, latitude_airport, longitude_airport)
     distance_km: float = round(distance / 1000, 2)
     distance_meters: float = round(distance, 2)
 
     return {"distance_meters": distance_meters, "distance_kilometers": distance_km}
 
 
+@router.post("/distance/batch", response_model=DistanceBatchOutSchemas)
+async def get_distance_batch(pairs: DistanceBatchInSchemas) -> DistanceBatchOutSchemas:
+    """
+    Возвращает расстояния для списка пар точек (начало, конец)
+    """
+    logger.info("Start of distance calculation for %d pairs", len(pairs.pairs))
+    distances = distance_sphere_array(
+        [pair.origin.latitude for pair in pairs.pairs],
+        [pair.origin.longitude for pair in pairs.pairs],
+        [pair.destination.latitude for pair in pairs.pairs],
+        [pair.destination.longitude for pair in pairs.pairs],
+    )
+    return DistanceBatchOutSchemas(
+        distance_meters=np.round(distances, 2).tolist(),
+        distance_kilometers=np.round(distances / 1000, 2).tolist(),
+    )
+
+
+@router.post("/distance/matrix", response_model=DistanceMatrixOutSchemas)
+async def get_distance_matrix(points: DistanceMatrixInSchemas) -> DistanceMatrixOutSchemas:
+    """
+    Возвращает матрицу расстояний: строки - начальные точки, столбцы - конечные
+    """
+    logger.info("Start of distance matrix calculation %d x %d", len(points.origins), len(points.destinations))
+    if len(points.origins) * len(points.destinations) > DISTANCE_MATRIX_MAX_CELLS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Matrix size exceeds {DISTANCE_MATRIX_MAX_CELLS} cells",
+        )
+    distances = distance_sphere_array(
+        np.array([point.latitude for point in points.origins])[:, np.newaxis],
+        np.array([point.longitude for point in points.origins])[:, np.newaxis],
+        np.array([point.latitude for point in points.destinations])[np.newaxis, :],
+        np.array([point.longitude for point in points.destinations])[np.newaxis, :],
+    )
+    return DistanceMatrixOutSchemas(
+        distance_meters=np.round(distances, 2).tolist(),
+        distance_kilometers=np.round(distances / 1000, 2).tolist(),
+    )
+
+
 @router.get("/nearest", response_model=list[AirPortOutGeoSchemas])
 async def get_nearest_airports(
     latitude: float = Query(..., description="Широта города/аэропорта"),
@@ -167,40 +312,129 @@ async def get_nearest_airports(
     Возвращает список ближайших к заданной точке аэропортов
     """
     logger.info(f"Start find nearest airports by {latitude=} {longitude=}")
-    redis_key: str = f"{longitude}:{latitude}"
-    all_airports: list[str] = await db_cache.lrange(redis_key, 0, -1)
-    if not all_airports:
-        airports_nearest: list[AirPortOutGeoSchemas] = await get_airports_nearest(
-            session=session,
-            latitude=latitude,
-            longitude=longitude,
-            limit=limit,
+    if setting.geo.nearest_engine == "memory":
+        snapshot: Optional[AirportSnapshot] = await airport_directory.get(session=session, db_cache=db_cache)
+        if snapshot is not None:
+            logger.info("Read from snapshot info about airports nearest")
+            return snapshot.nearest(latitude=latitude, longitude=longitude, limit=limit)
+
+    cell_size: float = setting.geo.nearest_cell_size
+    candidates_count: int = setting.geo.nearest_cell_candidates
+    if limit > candidates_count:
+        logger.info("Limit %d exceeds cached candidates, read from db info about airports nearest", limit)
+        return await get_airports_nearest(session=session, latitude=latitude, longitude=longitude, limit=limit)
+
+    # Кэш хранит кандидатов на ячейку сетки: любой точке ячейки хватает их для выдачи до candidates_count аэропортов
+    cell: tuple[int, int] = grid_cell(latitude, longitude, cell_size)
+    try:
+        candidates: list[AirPortOutGeoSchemas] = await get_cell_candidates(
+            session=session, cell=cell, cell_size=cell_size, count=candidates_count, db_cache=db_cache
+        )
+    except ExceptDB as exp:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
         )
-        for airport in airports_nearest:
-            await db_cache.rpush(redis_key, airport.model_dump_json())
 
-        await db_cache.expire(redis_key, CACHE_EXP)
-        logger.info("Write in cache info about airports nearest")
-    else:
-        logger.info("Read from cache info about airports nearest")
-        airports_nearest: list[AirPortOutGeoSchemas] = list()  # type: ignore
-        for airport_json in all_airports:
-            airport_dict: dict[str, Any] = json.loads(airport_json)
-            obj: AirPortOutGeoSchemas = AirPortOutGeoSchemas(**airport_dict)
-            airports_nearest.append(obj)
-    return airports_nearest
+    return get_nearest_from_candidates(candidates=candidates, latitude=latitude, longitude=longitude, limit=limit)
 
 
-@router.get("/geo-local")
+@router.get("/airports/within", response_model=Page[AirPortOutGeoSchemas])
+async def get_airports_within(
+    latitude: Optional[float] = Query(None, description="Широта точки"),
+    longitude: Optional[float] = Query(None, description="Долгота точки"),
+    radius_km: Optional[float] = Query(None, gt=0, le=20000, description="Радиус поиска от точки, км"),
+    min_latitude: Optional[float] = Query(None, ge=-90, le=90, description="Минимальная широта"),
+    min_longitude: Optional[float] = Query(None, ge=-180, le=180, description="Минимальная долгота"),
+    max_latitude: Optional[float] = Query(None, ge=-90, le=90, description="Максимальная широта"),
+    max_longitude: Optional[float] = Query(None, ge=-180, le=180, description="Максимальная долгота"),
+    session: AsyncSession = Depends(get_async_session),
+) -> Page[AirPortOutGeoSchemas]:
+    """
+    Возвращает аэропорты в радиусе от точки и/или в прямоугольнике координат, отсортированные по расстоянию
+    (от точки, а без нее - от центра прямоугольника)
+    """
+    logger.info(f"Start find airports within {latitude=} {longitude=} {radius_km=}")
+    bbox_values = (min_latitude, min_longitude, max_latitude, max_longitude)
+    bbox: Optional[tuple[float, float, float, float]] = None
+    if any(value is not None for value in bbox_values):
+        if min_latitude is None or min_longitude is None or max_latitude is None or max_longitude is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="All bounding box coordinates are required",
+            )
+        if min_latitude > max_latitude or min_longitude > max_longitude:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid bounding box",
+            )
+        bbox = (min_latitude, min_longitude, max_latitude, max_longitude)
+
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Both latitude and longitude are required",
+        )
+    if radius_km is not None and latitude is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Radius search requires latitude and longitude",
+        )
+    if radius_km is None and bbox is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Radius or bounding box is required",
+        )
+
+    if latitude is None or longitude is None:
+        latitude = (bbox[0] + bbox[2]) / 2  # type: ignore[index]
+        longitude = (bbox[1] + bbox[3]) / 2  # type: ignore[index]
+
+    stmt = get_airports_within_stmt(
+        latitude=latitude,
+        longitude=longitude,
+        radius=radius_km * 1000 if radius_km is not None else None,
+        bbox=bbox,
+    )
+
+    def to_schemas(rows: Sequence[Any]) -> list[AirPortOutGeoSchemas]:
+        airports: list[AirPortOutGeoSchemas] = list()
+        for airport, distance in rows:
+            data = AirPortOutGeoSchemas(**airport.__dict__)
+            data.distance = round(distance / 1000, 2)
+            airports.append(data)
+        return airports
+
+    return await paginate_query(session, stmt, transformer=to_schemas)
+
+
+@router.get("/geo-local", dependencies=[Depends(rate_limit("geo_local"))])
 async def get_city_name(
     latitude: float = Query(..., description="Широта"),
     longitude: float = Query(..., description="Долгота"),
+    session: AsyncSession = Depends(get_async_session),
+    db_cache=Depends(get_cache_connection),
 ) -> dict[str, str]:
     """
     Возвращает наименование населенного пункта по заданным координатам
     """
     logger.info("Start geolocation latitude: %s longitude: %s" % (latitude, longitude))
-    city_info: Optional[dict[str, str]] = await get_location_info(latitude, longitude)
+    city: Optional[CityGeoSchemas] = None
+    try:
+        if setting.geo.geocoder_engine == "memory" and (snapshot := await city_directory.get(session=session)):
+            city = snapshot.nearest(latitude=latitude, longitude=longitude)
+        else:
+            city = await get_city_nearest(session=session, latitude=latitude, longitude=longitude)
+    except ExceptDB as exp:
+        logger.warning("Offline geolocation failed: %s", exp)
+
+    if city is not None and city.distance is not None and city.distance <= setting.geo.geocoder_max_distance:
+        logger.info("Geolocation search result %s (%s km)", city.city, city.distance)
+        return {"city": city.city}
+
+    city_info: Optional[dict[str, str]] = None
+    if setting.geo.geocoder_fallback:
+        city_info = await reverse_geocoder.reverse(latitude=latitude, longitude=longitude, db_cache=db_cache)
 
     if city_info is not None:
         logger.info("Geolocation search result %s", city_info["city"])
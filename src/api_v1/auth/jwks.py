@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+import aiohttp
+import jwt
+
+from src.core.config import configure_logging, setting
+from src.core.http_client import HttpClient, http_client
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+JWKS_MIN_REFRESH = 60  # наименьший интервал между загрузками ключей при неизвестном kid, сек
+
+
+class JWKSCache:
+    """
+    Кэш открытых ключей провайдера (JWKS) для локальной проверки подписи id_token.
+    Ключи обновляются фоновой задачей раз в refresh_interval секунд,
+    а также при появлении неизвестного kid (не чаще одного раза в JWKS_MIN_REFRESH секунд)
+    """
+
+    def __init__(self, url: str, refresh_interval: float, client: HttpClient = http_client) -> None:
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.client = client
+        self._keys: dict[str, jwt.PyJWK] = dict()
+        self._loaded_at: float = float("-inf")
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        """
+        Загружает набор ключей провайдера
+        """
+        async with self.client.session.get(self.url) as response:
+            response.raise_for_status()
+            jwks: dict[str, Any] = await response.json()
+        keys: jwt.PyJWKSet = jwt.PyJWKSet.from_dict(jwks)
+        self._keys = {key.key_id: key for key in keys.keys if key.key_id}
+        self._loaded_at = time.monotonic()
+        logger.info("JWKS loaded from %s (%d keys)", self.url, len(self._keys))
+
+    async def get_key(self, kid: str) -> jwt.PyJWK:
+        """
+        Возвращает ключ по его идентификатору
+        :param kid: str
+            идентификатор ключа из заголовка токена
+        :return: jwt.PyJWK
+        :raises jwt.InvalidTokenError: ключ не найден
+        """
+        key: Optional[jwt.PyJWK] = self._keys.get(kid)
+        if key is not None and time.monotonic() - self._loaded_at < self.refresh_interval * 2:
+            return key
+
+        async with self._lock:
+            key = self._keys.get(kid)
+            stale: bool = time.monotonic() - self._loaded_at >= self.refresh_interval * 2
+            if (key is None and time.monotonic() - self._loaded_at >= JWKS_MIN_REFRESH) or stale:
+                try:
+                    await self.refresh()
+                except (aiohttp.ClientError, asyncio.TimeoutError, jwt.PyJWKSetError) as exc:
+                    logger.warning("Unable to load JWKS from %s: %s", self.url, exc)
+                key = self._keys.get(kid)
+
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid}")
+        return key
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except (aiohttp.ClientError, asyncio.TimeoutError, jwt.PyJWKSetError) as exc:
+                logger.warning("Unable to refresh JWKS from %s: %s", self.url, exc)
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        """
+        Запускает фоновое обновление ключей
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+google_jwks = JWKSCache(url=setting.google.GOOGLE_JWKS_URI, refresh_interval=setting.google.GOOGLE_JWKS_REFRESH)
+
+
+async def verify_google_id_token(id_token: str, jwks: JWKSCache = google_jwks) -> dict[str, Any]:
+    """
+    Проверяет подпись и поля (aud, iss, exp) id_token Google по закэшированным ключам
+    :param id_token: str
+        id_token из ответа Google
+    :param jwks: JWKSCache
+        кэш ключей Google
+    :return: dict[str, Any]
+        содержание токена
+    :raises jwt.InvalidTokenError: токен некорректен
+    """
+    kid: Optional[str] = jwt.get_unverified_header(id_token).get("kid")
+    if kid is None:
+        raise jwt.InvalidTokenError("Token has no key id")
+    key: jwt.PyJWK = await jwks.get_key(kid)
+    return jwt.decode(
+        id_token,
+        key=key,
+        algorithms=["RS256"],
+        audience=setting.google.OAUTH_GOOGLE_CLIENT_ID,
+        issuer=setting.google.GOOGLE_ISSUERS,
+    )
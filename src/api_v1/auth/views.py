@@ -1,12 +1,14 @@
+import asyncio
 import logging
 
 import aiohttp
 import jwt
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
-from redis import Redis
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.api_v1.auth.crud import check_auth_user
+from src.api_v1.auth.jwks import verify_google_id_token
 from src.api_v1.auth.schemas import AuthUserSchemas, GoogleCallbackSchemas, YandexCallbackSchemas
 from src.api_v1.auth.utils import generate_google_oauth_redirect_uri, get_yandex_token, get_yandex_user_info
 from src.api_v1.users.schemas import OutUserSchemas, UserInfoSchemas
@@ -18,7 +20,8 @@ from src.core.config import (
 )
 from src.core.database import get_async_session, get_cache_connection, get_redis_connection
 from src.core.exceptions import ExceptAuthentication
-from src.core.jwt_utils import create_jwt
+from src.core.http_client import http_client
+from src.core.sessions import SessionTokens, open_session
 from src.models.user import User
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
@@ -53,11 +56,9 @@ async def handle_code(
     if google_state is None:
         raise HTTPException(status_code=400, detail="Error state for Google")
 
-    google_token_url = "https://oauth2.googleapis.com/token"
-
-    async with aiohttp.ClientSession() as client:
-        async with client.post(
-            url=google_token_url,
+    try:
+        async with http_client.session.post(
+            url=setting.google.GOOGLE_TOKEN_URI,
             data={
                 "client_id": setting.google.OAUTH_GOOGLE_CLIENT_ID,
                 "client_secret": setting.google.OAUTH_GOOGLE_CLIENT_SECRET,
@@ -65,21 +66,21 @@ async def handle_code(
                 "redirect_uri": setting.google.GOOGLE_REDIRECT_URI,
                 "code": code_state.code,
             },
-            ssl=True,  # в разработке ssl=False
         ) as resp:
             response_data = await resp.json()
-            if "access_token" not in response_data:
-                raise HTTPException(status_code=400, detail="Error getting access token from Google")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exp:
+        logger.error("Error requesting token from Google: %s", exp)
+        raise HTTPException(status_code=400, detail="Error getting access token from Google")
 
-            id_token = response_data["id_token"]
+    if "access_token" not in response_data:
+        raise HTTPException(status_code=400, detail="Error getting access token from Google")
+
+    id_token = response_data["id_token"]
 
     try:
-        user_data_full = jwt.decode(
-            id_token,
-            algorithms=["RS256"],
-            options={"verify_signature": False},
-        )
-    except jwt.ExpiredSignatureError:
+        user_data_full = await verify_google_id_token(id_token)
+    except jwt.InvalidTokenError as exp:
+        logger.warning("Invalid id_token from Google: %s", exp)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Error jwt token from Google",
@@ -96,14 +97,8 @@ async def handle_code(
 
     # сгенерить токен
     logger.info("Generate JWT for user by name %s" % user.full_name)
-    access_token: str = await create_jwt(
-        user=str(user.id),
-        expire_minutes=setting.auth_jwt.access_token_expire_minutes,
-    )
-    refresh_token: str = await create_jwt(
-        user=str(user.id),
-        expire_minutes=setting.auth_jwt.refresh_token_expire_minutes,
-    )
+    tokens: SessionTokens = await open_session(redis=redis, id_user=str(user.id))
+    access_token: str = tokens.access_token
 
     response.set_cookie(
         key=COOKIE_NAME,
@@ -114,8 +109,7 @@ async def handle_code(
         path="/",
     )
 
-    request.session["user"] = {"family_name": user.full_name, "id": str(user.id)}
-    await redis.set(str(user.id), refresh_token)
+    request.session["user"] = {"family_name": user.full_name, "id": str(user.id), "sid": tokens.sid}
 
     return OutUserSchemas(
         access_token=access_token,
@@ -189,14 +183,8 @@ async def auth_yandex(
 
     # сгенерить токен
     logger.info("Generate JWT for user by name %s" % user.full_name)
-    access_token: str = await create_jwt(
-        user=str(user.id),
-        expire_minutes=setting.auth_jwt.access_token_expire_minutes,
-    )
-    refresh_token: str = await create_jwt(
-        user=str(user.id),
-        expire_minutes=setting.auth_jwt.refresh_token_expire_minutes,
-    )
+    tokens: SessionTokens = await open_session(redis=redis, id_user=str(user.id))
+    access_token: str = tokens.access_token
 
     response.set_cookie(
         key=COOKIE_NAME,
@@ -207,8 +195,7 @@ async def auth_yandex(
         path="/",
     )
 
-    request.session["user"] = {"family_name": user.full_name, "id": str(user.id)}
-    await redis.set(str(user.id), refresh_token)
+    request.session["user"] = {"family_name": user.full_name, "id": str(user.id), "sid": tokens.sid}
 
     return OutUserSchemas(
         access_token=access_token,
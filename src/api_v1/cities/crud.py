@@ -1,12 +1,25 @@
-from typing import Optional
+from typing import Any, Optional
 
-from sqlalchemy import select
+from geoalchemy2.functions import ST_DistanceSphere, ST_MakePoint, ST_SetSRID
+from sqlalchemy import Float, Row, func, literal_column, select
 from sqlalchemy.engine import Result
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import cast
 
+from src.core.config import CACHE_EXP
 from src.core.exceptions import ExceptDB, NotFindData
 from src.models.city import City
+from src.utils.cache_utils import ReadThroughCache
+from src.utils.data_utils import model_to_json
+
+from .schemas import CityDataSchemas, CityGeoSchemas
+
+# запас кандидатов KNN-сортировки: порядок по <-> (geography) может расходиться с ST_DistanceSphere
+NEAREST_CITY_KNN_MARGIN = 5
+
+# данные города (json) по названию
+city_cache = ReadThroughCache(namespace="city", ttl=CACHE_EXP)
 
 
 async def get_city_by_name(session: AsyncSession, title: str) -> City:
@@ -27,3 +40,57 @@ async def get_city_by_name(session: AsyncSession, title: str) -> City:
     if city is None:
         raise NotFindData("City by id not found")
     return city
+
+
+@city_cache.cached(key=lambda session, title: f"name:{title}")
+async def get_city_json(session: AsyncSession, title: str) -> str:
+    """
+    Возвращает данные города по названию в виде json (через кэш)
+    :param session: AsyncSession
+        сессия БД
+    :param title: str
+        название города
+    :return: str
+    """
+    city: City = await get_city_by_name(session=session, title=title)
+    return await model_to_json(pydantic_model=CityDataSchemas, object=city)
+
+
+async def get_city_nearest(session: AsyncSession, latitude: float, longitude: float) -> Optional[CityGeoSchemas]:
+    """
+    Возвращает ближайший к заданной точке населенный пункт.
+    Кандидаты выбираются KNN-сортировкой (<->) по индексу idx_citys_geography с запасом
+    NEAREST_CITY_KNN_MARGIN, точное расстояние (ST_DistanceSphere) считается только для них
+    :param session: AsyncSession
+        сессия БД
+    :param latitude: float
+        Широта
+    :param longitude: float
+        Долгота
+    :return: Optional[CityGeoSchemas]
+        населенный пункт и расстояние до него (в км)
+    """
+    # выражение совпадает с выражением индекса idx_citys_geography (SRID - константа, а не параметр)
+    city_geo = ST_SetSRID(ST_MakePoint(City.longitude, City.latitude), literal_column("4326"))
+    geo = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+    distance = cast(ST_DistanceSphere(city_geo, geo), Float).label("distance")
+    try:
+        stmt = (
+            select(City, distance)
+            .order_by(func.geography(city_geo).op("<->")(func.geography(geo)))
+            .limit(1 + NEAREST_CITY_KNN_MARGIN)
+        )
+        result: Result = await session.execute(stmt)
+        candidates: list[Row[Any]] = list(result.all())
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+    if not candidates:
+        return None
+    city, distance_meters = min(candidates, key=lambda row: row.distance)
+    return CityGeoSchemas(
+        city=city.city,
+        region=city.region,
+        latitude=city.latitude,
+        longitude=city.longitude,
+        distance=round(distance_meters / 1000, 2),
+    )
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -5,3 +7,8 @@ class CityDataSchemas(BaseModel):
     city: str
     latitude: float
     longitude: float
+
+
+class CityGeoSchemas(CityDataSchemas):
+    region: str
+    distance: Optional[float] = None
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api_v1.cities.crud import city_cache
+from src.core.config import CITIES_SNAPSHOT_TTL, configure_logging
+from src.core.invalidation import invalidation_bus
+from src.models.city import City
+from src.utils.spatial_index import SphereIndex
+
+from .schemas import CityGeoSchemas
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+CITIES_SNAPSHOT_NAMESPACE = "city_snapshot"
+
+
+@dataclass(frozen=True, slots=True)
+class CitySnapshot:
+    """
+    Неизменяемый снимок справочника населенных пунктов в памяти процесса
+    """
+
+    cities: tuple[CityGeoSchemas, ...]
+    index: SphereIndex = field(init=False)
+
+    def __post_init__(self) -> None:
+        index = SphereIndex(
+            latitudes=[city.latitude for city in self.cities],
+            longitudes=[city.longitude for city in self.cities],
+        )
+        object.__setattr__(self, "index", index)
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[CityGeoSchemas]:
+        """
+        Поиск ближайшего к заданной точке населенного пункта (аналог get_city_nearest без обращения к БД)
+        :param latitude: float
+            Широта
+        :param longitude: float
+            Долгота
+        :return: Optional[CityGeoSchemas]
+            населенный пункт и расстояние до него (в км)
+        """
+        indexes, distances = self.index.nearest(latitude=latitude, longitude=longitude, k=1)
+        if not len(indexes):
+            return None
+        return self.cities[int(indexes[0])].model_copy(update={"distance": round(float(distances[0]) / 1000, 2)})
+
+
+async def load_city_snapshot(session: AsyncSession) -> CitySnapshot:
+    """
+    Загружает из БД снимок справочника населенных пунктов
+    :param session: AsyncSession
+        сессия БД
+    :return: CitySnapshot
+    """
+    stmt = select(City).order_by(City.city)
+    result: Result = await session.execute(stmt)
+    cities = tuple(CityGeoSchemas(**city.__dict__) for city in result.scalars().all())
+    return CitySnapshot(cities=cities)
+
+
+async def invalidate_cities(db_cache: Redis) -> None:
+    """
+    Сбрасывает кэш данных городов и снимки справочника во всех воркерах.
+    Вызывается после изменения таблицы cities
+    """
+    await city_cache.invalidate_all(db_cache)
+    await invalidation_bus.publish(CITIES_SNAPSHOT_NAMESPACE, redis=db_cache)
+
+
+class CityDirectory:
+    """
+    Хранит снимок справочника населенных пунктов.
+    Справочник меняется только утилитой загрузки, поэтому снимок
+    перечитывается из БД не чаще одного раза в ttl секунд
+    """
+
+    def __init__(self, ttl: float = CITIES_SNAPSHOT_TTL) -> None:
+        self.ttl = ttl
+        self._snapshot: Optional[CitySnapshot] = None
+        self._checked_at: float = float("-inf")
+        self._lock = asyncio.Lock()
+
+    @property
+    def snapshot(self) -> Optional[CitySnapshot]:
+        return self._snapshot
+
+    def clear(self) -> None:
+        self._snapshot = None
+        self._checked_at = float("-inf")
+
+    def expire(self, key: Optional[str] = None) -> None:
+        """
+        Перечитывает снимок при следующем обращении, не дожидаясь ttl.
+        До окончания загрузки отдается текущий снимок
+        """
+        self._checked_at = float("-inf")
+
+    async def get(self, session: AsyncSession) -> Optional[CitySnapshot]:
+        """
+        Возвращает снимок справочника, при истечении ttl перечитывая его из БД.
+        При недоступности БД продолжает отдавать последний загруженный снимок
+        :param session: AsyncSession
+            сессия БД
+        :return: Optional[CitySnapshot]
+        """
+        if time.monotonic() - self._checked_at < self.ttl:
+            return self._snapshot
+
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.ttl:
+                return self._snapshot
+            await self.refresh(session=session)
+        return self._snapshot
+
+    async def refresh(self, session: AsyncSession) -> None:
+        """
+        Загружает новый снимок справочника
+        """
+        self._checked_at = time.monotonic()
+        try:
+            snapshot: CitySnapshot = await load_city_snapshot(session=session)
+        except SQLAlchemyError as exc:
+            logger.warning("Unable to load cities snapshot: %s", exc)
+            return
+
+        if not snapshot.cities:
+            logger.warning("Cities table is empty, snapshot is not used")
+            return
+
+        self._snapshot = snapshot
+        logger.info("Cities snapshot loaded (%d cities)", len(snapshot.cities))
+
+
+city_directory = CityDirectory()
+invalidation_bus.subscribe(CITIES_SNAPSHOT_NAMESPACE, city_directory.expire)
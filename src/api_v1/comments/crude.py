@@ -1,22 +1,111 @@
-from typing import Optional
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, cast
 from uuid import UUID
 
-from sqlalchemy import func, select
-from sqlalchemy.engine import Result
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+from sqlalchemy import Row, delete, func, literal, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import CursorResult, Result
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 
-from src.api_v1.comments.schemas import CommentAddSchemas
+from src.api_v1.comments.leaderboard import update_airport_rating
+from src.api_v1.comments.schemas import (
+    CommentAddSchemas,
+    CommentAllOutSchemas,
+    CommentAverageRating,
+    CommentRatingHistogramSchemas,
+    UserInfoSchemas,
+)
+from src.core.config import CACHE_EXP
 from src.core.exceptions import ErrorInData, ExceptDB, NotFindData
 from src.models.airport import Airport
 from src.models.comment import AirportComment
+from src.models.rating import RATING_STARS, AirportRating
 from src.models.user import User
+from src.utils.cache_utils import ReadThroughCache
+from src.utils.data_utils import decode_cursor, encode_cursor
 
+REVIEWS_NAMESPACE = "reviews"
+RATING_NAMESPACE = "rating"
 
-async def add_new_comment(session: AsyncSession, comment: CommentAddSchemas, user: User, airport: Airport) -> None:
+comments_adapter = TypeAdapter(list[CommentAllOutSchemas])
+
+
+@dataclass(frozen=True, slots=True)
+class ReviewsPage:
+    body: str  # json списка отзывов страницы
+    next_cursor: Optional[str] = None
+
+
+def decode_reviews_page(data: str) -> ReviewsPage:
+    page: dict[str, Any] = json.loads(data)
+    return ReviewsPage(body=json.dumps(page["items"], ensure_ascii=False), next_cursor=page["next_cursor"])
+
+
+# страницы отзывов аэропорта: ключ - id аэропорта, поле - размер страницы и курсор
+reviews_cache = ReadThroughCache(namespace=REVIEWS_NAMESPACE, ttl=CACHE_EXP, decode=decode_reviews_page)
+# рейтинг и распределение оценок аэропорта (json): ключ - id аэропорта, поле - вид сводки
+rating_cache = ReadThroughCache(namespace=RATING_NAMESPACE, ttl=CACHE_EXP)
+
+
+async def invalidate_reviews(id_airport: UUID, db_cache: Optional[Redis] = None) -> None:
+    """
+    Сбрасывает закэшированные страницы отзывов и рейтинг аэропорта в Redis и в памяти всех воркеров.
+    Вызывается после фиксации транзакции, изменившей отзывы аэропорта
+    """
+    await reviews_cache.invalidate(str(id_airport), db_cache=db_cache)
+    await rating_cache.invalidate(str(id_airport), db_cache=db_cache)
+
+
+async def change_airport_rating(
+    session: AsyncSession, id_airport: UUID, stars: dict[int, int]
+) -> Optional[tuple[int, int]]:
+    """
+    Изменяет сводку отзывов аэропорта в текущей транзакции
+    :param session: AsyncSession
+        сессия БД
+    :param id_airport: UUID
+        ID аэропорта
+    :param stars: dict[int, int]
+        оценка -> изменение числа отзывов с этой оценкой (отрицательное при удалении отзывов)
+    :return: Optional[tuple[int, int]]
+        число отзывов и сумма оценок аэропорта после изменения (None, если сводки нет)
+    """
+    values: dict[str, int] = {
+        "review_count": sum(stars.values()),
+        "rating_sum": sum(star * count for star, count in stars.items()),
+    }
+    values.update({f"stars_{star}": stars.get(star, 0) for star in RATING_STARS})
+    increments = {name: getattr(AirportRating, name) + delta for name, delta in values.items()}
+
+    returning = (AirportRating.review_count, AirportRating.rating_sum)
+    if values["review_count"] > 0:
+        upsert = pg_insert(AirportRating).values(airport_id=id_airport, **values)
+        upsert = upsert.on_conflict_do_update(index_elements=[AirportRating.airport_id], set_=increments)
+        result: Result = await session.execute(upsert.returning(*returning))
+    else:
+        decrement = update(AirportRating).where(AirportRating.airport_id == id_airport).values(**increments)
+        result = await session.execute(decrement.returning(*returning))
+    row: Optional[Row[Any]] = result.one_or_none()
+    return None if row is None else (row.review_count, row.rating_sum)
+
+
+async def add_new_comment(
+    session: AsyncSession,
+    comment: CommentAddSchemas,
+    user: User,
+    airport: Airport,
+    db_cache: Optional[Redis] = None,
+) -> None:
     """
-    Добавление нового комментария об аэропорте в БД
+    Добавление нового комментария об аэропорте в БД.
+    Сводка отзывов аэропорта обновляется в той же транзакции.
+    После сохранения воркерам рассылается сброс кэшей отзывов аэропорта, обновляются рейтинги аэропортов
     """
     try:
         new_comment: AirportComment = AirportComment(
@@ -27,46 +116,301 @@ async def add_new_comment(session: AsyncSession, comment: CommentAddSchemas, use
 
     try:
         session.add(new_comment)
+        summary = await change_airport_rating(session=session, id_airport=airport.id, stars={comment.rating: 1})
     except SQLAlchemyError as exc:
         raise ExceptDB(exc)
 
     await session.commit()
+    await invalidate_reviews(id_airport=airport.id, db_cache=db_cache)
+    if db_cache is not None and summary is not None:
+        await update_airport_rating(db_cache, airport.id, *summary, reviews=1, created_at=new_comment.created_at)
+
+
+async def get_comments_page(
+    session: AsyncSession, id_airport: UUID, size: int, after: Optional[tuple[datetime, UUID]] = None
+) -> list[Row[Any]]:
+    """
+    Возвращает страницу комментариев об аэропорте, новые первыми
+    (keyset-пагинация по created_at, id; индекс ix_airportcomments_airport_id_created_at_id)
+    :param session: AsyncSession
+        сессия БД
+    :param id_airport: UUID
+        ID аэропорта
+    :param size: int
+        размер страницы
+    :param after: Optional[tuple[datetime, UUID]]
+        ключ (created_at, id) последнего комментария предыдущей страницы
+    :return: list[Row[Any]]
+        до size + 1 записей (id, comment_text, rating, created_at, full_name),
+        лишняя запись означает наличие следующей страницы
+    """
+    stmt = (
+        select(
+            AirportComment.id,
+            AirportComment.comment_text,
+            AirportComment.rating,
+            AirportComment.created_at,
+            User.full_name,
+        )
+        .join(User, User.id == AirportComment.user_id)
+        .where(AirportComment.airport_id == id_airport)
+    )
+    if after is not None:
+        last_key = tuple_(literal(after[0], AirportComment.created_at.type), literal(after[1], AirportComment.id.type))
+        stmt = stmt.where(tuple_(AirportComment.created_at, AirportComment.id) < last_key)
+    stmt = stmt.order_by(AirportComment.created_at.desc(), AirportComment.id.desc()).limit(size + 1)
+    try:
+        result: Result = await session.execute(stmt)
+        comments: list[Row[Any]] = list(result.all())
+        # аэропорт проверяется, только если у него нет отзывов
+        if not comments and after is None and await session.get(Airport, id_airport) is None:
+            raise NotFindData("Airport by id not found")
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+
+    return comments
+
+
+@reviews_cache.cached(
+    key=lambda session, id_airport, size, cursor: str(id_airport),
+    field=lambda session, id_airport, size, cursor: f"{size}:{cursor or ''}",
+)
+async def get_reviews_page_json(session: AsyncSession, id_airport: UUID, size: int, cursor: Optional[str]) -> str:
+    """
+    Возвращает страницу отзывов об аэропорте в виде json (через кэш)
+    :param session: AsyncSession
+        сессия БД
+    :param id_airport: UUID
+        ID аэропорта
+    :param size: int
+        размер страницы
+    :param cursor: Optional[str]
+        курсор страницы (None - первая страница)
+    :return: str
+        {"items": [...], "next_cursor": ...}
+    """
+    after: Optional[tuple[datetime, UUID]] = None
+    if cursor is not None:
+        try:
+            created_at, id_comment = decode_cursor(cursor)
+            after = (datetime.fromisoformat(created_at), UUID(id_comment))
+        except ValueError:
+            raise ErrorInData("Invalid cursor")
+
+    comments_db: list[Row[Any]] = await get_comments_page(
+        session=session, id_airport=id_airport, size=size, after=after
+    )
+    comments: list[CommentAllOutSchemas] = [
+        CommentAllOutSchemas(
+            id=comment.id,
+            comment_text=comment.comment_text,
+            rating=comment.rating,
+            created_at=comment.created_at,
+            user=UserInfoSchemas(full_name=comment.full_name),
+        )
+        for comment in comments_db[:size]
+    ]
+    next_cursor: Optional[str] = None
+    if len(comments_db) > size:
+        last: Row[Any] = comments_db[size - 1]
+        next_cursor = encode_cursor([last.created_at.isoformat(), str(last.id)])
+    return json.dumps(
+        {"items": comments_adapter.dump_python(comments, mode="json"), "next_cursor": next_cursor},
+        ensure_ascii=False,
+    )
+
+
+async def get_comment_by_id(session: AsyncSession, id_comment: UUID) -> AirportComment:
+    """
+    Возвращает комментарий по ID
+    """
+    try:
+        comment: Optional[AirportComment] = await session.get(AirportComment, id_comment)
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+    if comment is None:
+        raise NotFindData("Comment by id not found")
+    return comment
 
 
-async def get_comment(session: AsyncSession, id_airport: UUID):
+async def delete_comment_db(session: AsyncSession, comment: AirportComment, db_cache: Optional[Redis] = None) -> None:
     """
-    Возвращает комментарии об аэропорте
+    Удаляет комментарий и в той же транзакции уменьшает сводку отзывов аэропорта
     """
+    id_airport: UUID = comment.airport_id
+    created_at: datetime = comment.created_at
     try:
-        airport: Optional[Airport] = await session.get(Airport, id_airport)
+        summary = await change_airport_rating(session=session, id_airport=id_airport, stars={comment.rating: -1})
+        await session.delete(comment)
+        await session.commit()
     except SQLAlchemyError as exc:
         raise ExceptDB(exc)
-    if airport is None:
-        raise NotFindData("Airport by id not found")
+    await invalidate_reviews(id_airport=id_airport, db_cache=db_cache)
+    if db_cache is not None and summary is not None:
+        await update_airport_rating(db_cache, id_airport, *summary, reviews=-1, created_at=created_at)
+
 
+async def remove_user_ratings(session: AsyncSession, id_user: UUID) -> dict[UUID, Optional[tuple[int, int]]]:
+    """
+    Вычитает отзывы пользователя из сводок отзывов аэропортов (в текущей транзакции).
+    Вызывается перед удалением пользователя вместе с его отзывами
+    :param session: AsyncSession
+        сессия БД
+    :param id_user: UUID
+        ID пользователя
+    :return: dict[UUID, Optional[tuple[int, int]]]
+        ID аэропорта, сводка которого изменилась -> число отзывов и сумма оценок после изменения
+    """
     try:
         stmt = (
-            select(AirportComment)
-            .options(joinedload(AirportComment.user))
-            .filter(AirportComment.airport_id == id_airport)
+            select(AirportComment.airport_id, AirportComment.rating, func.count())
+            .where(AirportComment.user_id == id_user)
+            .group_by(AirportComment.airport_id, AirportComment.rating)
         )
         result: Result = await session.execute(stmt)
-        comments = result.scalars().all()
+        changes: dict[UUID, dict[int, int]] = defaultdict(dict)
+        for id_airport, rating, count in result.all():
+            changes[id_airport][rating] = -count
+        summaries: dict[UUID, Optional[tuple[int, int]]] = dict()
+        for id_airport, stars in changes.items():
+            summaries[id_airport] = await change_airport_rating(session=session, id_airport=id_airport, stars=stars)
     except SQLAlchemyError as exc:
         raise ExceptDB(exc)
+    return summaries
 
-    return comments
+
+async def get_rating_summary(session: AsyncSession, id_airport: UUID) -> Optional[AirportRating]:
+    """
+    Возвращает сводку отзывов аэропорта (None, если отзывов не было)
+    """
+    try:
+        stmt = select(AirportRating).where(AirportRating.airport_id == id_airport)
+        result: Result = await session.execute(stmt)
+        return result.scalars().one_or_none()
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
 
 
-async def get_average_rating(session: AsyncSession, id_airport: UUID) -> float:
+async def get_rating_summaries(session: AsyncSession, ids: list[UUID]) -> dict[UUID, AirportRating]:
     """
-    Возвращает рейтинг аэропорта по отзывам
+    Возвращает сводки отзывов аэропортов одним запросом
+    :param session: AsyncSession
+        сессия БД
+    :param ids: list[UUID]
+        ID аэропортов
+    :return: dict[UUID, AirportRating]
+        ID аэропорта -> сводка (аэропорты без отзывов пропускаются)
     """
+    if not ids:
+        return dict()
     try:
-        stmt = select(func.avg(AirportComment.rating)).where(AirportComment.airport_id == id_airport)
-        rating_result = await session.execute(stmt)
-        avg_rating = rating_result.scalar()
+        stmt = select(AirportRating).where(AirportRating.airport_id.in_(ids))
+        result: Result = await session.execute(stmt)
     except SQLAlchemyError as exc:
         raise ExceptDB(exc)
+    return {summary.airport_id: summary for summary in result.scalars().all()}
+
+
+async def get_rating_histograms(
+    session: AsyncSession, ids: list[UUID], db_cache: Optional[Redis] = None
+) -> dict[UUID, CommentRatingHistogramSchemas]:
+    """
+    Возвращает число отзывов, рейтинг и распределение оценок аэропортов через кэш рейтингов
+    (поле histogram, как у get_rating_histogram_json); отсутствующие в кэше сводки загружаются одним запросом
+    :param session: AsyncSession
+        сессия БД
+    :param ids: list[UUID]
+        ID аэропортов
+    :param db_cache: Optional[Redis]
+        кэш
+    :return: dict[UUID, CommentRatingHistogramSchemas]
+    """
+
+    async def load(keys: list[str]) -> dict[str, str]:
+        summaries = await get_rating_summaries(session=session, ids=[UUID(key) for key in keys])
+        histograms: dict[str, str] = dict()
+        for key in keys:
+            summary: Optional[AirportRating] = summaries.get(UUID(key))
+            histogram = CommentRatingHistogramSchemas()
+            if summary is not None:
+                histogram = CommentRatingHistogramSchemas(
+                    review_count=summary.review_count,
+                    average_rating=summary.average_rating,
+                    histogram=summary.histogram,
+                )
+            histograms[key] = histogram.model_dump_json()
+        return histograms
+
+    cached: dict[str, Any] = await rating_cache.get_many(
+        keys=[str(id_airport) for id_airport in ids], loader=load, db_cache=db_cache, field="histogram"
+    )
+    return {UUID(key): CommentRatingHistogramSchemas.model_validate_json(data) for key, data in cached.items()}
 
-    return float(avg_rating) if avg_rating is not None else 0.0
+
+async def get_average_rating(session: AsyncSession, id_airport: UUID) -> float:
+    """
+    Возвращает рейтинг аэропорта по отзывам (из сводки отзывов)
+    """
+    summary: Optional[AirportRating] = await get_rating_summary(session=session, id_airport=id_airport)
+    return summary.average_rating if summary is not None else 0.0
+
+
+@rating_cache.cached(key=lambda session, id_airport: str(id_airport), field=lambda session, id_airport: "average")
+async def get_average_rating_json(session: AsyncSession, id_airport: UUID) -> str:
+    """
+    Возвращает рейтинг аэропорта в виде json (через кэш)
+    """
+    average_rating: float = await get_average_rating(session=session, id_airport=id_airport)
+    return CommentAverageRating(average_rating=average_rating).model_dump_json()
+
+
+@rating_cache.cached(key=lambda session, id_airport: str(id_airport), field=lambda session, id_airport: "histogram")
+async def get_rating_histogram_json(session: AsyncSession, id_airport: UUID) -> str:
+    """
+    Возвращает число отзывов, рейтинг и распределение оценок аэропорта в виде json (через кэш)
+    """
+    summary: Optional[AirportRating] = await get_rating_summary(session=session, id_airport=id_airport)
+    if summary is None:
+        return CommentRatingHistogramSchemas().model_dump_json()
+    return CommentRatingHistogramSchemas(
+        review_count=summary.review_count,
+        average_rating=summary.average_rating,
+        histogram=summary.histogram,
+    ).model_dump_json()
+
+
+async def rebuild_airport_ratings(session: AsyncSession) -> int:
+    """
+    Пересчитывает сводки отзывов всех аэропортов по таблице комментариев (сверка сводок).
+    На время пересчета таблица сводок блокируется от изменений: добавление и удаление отзывов
+    ждут фиксации пересчета и применяют свои изменения к пересчитанным сводкам
+    :param session: AsyncSession
+        сессия БД
+    :return: int
+        число аэропортов с отзывами
+    """
+    columns: list[str] = ["airport_id", "review_count", "rating_sum", *(f"stars_{star}" for star in RATING_STARS)]
+    aggregates = select(
+        AirportComment.airport_id,
+        func.count(),
+        func.sum(AirportComment.rating),
+        *(func.count().filter(AirportComment.rating == star) for star in RATING_STARS),
+    ).group_by(AirportComment.airport_id)
+    rebuilt = pg_insert(AirportRating).from_select(columns, aggregates, include_defaults=False)
+    rebuilt = rebuilt.on_conflict_do_update(
+        index_elements=[AirportRating.airport_id],
+        set_={name: rebuilt.excluded[name] for name in columns[1:]},
+    )
+    try:
+        # SHARE ROW EXCLUSIVE конфликтует с ROW EXCLUSIVE: изменения сводок, начатые до блокировки,
+        # фиксируются до пересчета и видны в нем, начатые после - ждут его фиксации
+        await session.execute(text(f"LOCK TABLE {AirportRating.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+        result = cast(CursorResult, await session.execute(rebuilt))
+        await session.execute(
+            delete(AirportRating).where(AirportRating.airport_id.not_in(select(AirportComment.airport_id)))
+        )
+        await session.commit()
+    except SQLAlchemyError as exc:
+        await session.rollback()
+        raise ExceptDB(exc)
+    return result.rowcount
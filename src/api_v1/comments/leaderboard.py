@@ -0,0 +1,197 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from uuid import UUID
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import func, select
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import configure_logging
+from src.core.exceptions import ExceptDB
+from src.models.comment import AirportComment
+from src.models.rating import AirportRating
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+RATING_KEY = "leaderboard:rating"  # id аэропорта -> средний рейтинг
+REVIEWS_KEY = "leaderboard:reviews"  # id аэропорта -> число отзывов
+WEEK_KEY = "leaderboard:week"  # id аэропорта -> число отзывов за последние LEADERBOARD_DAYS дней
+LEADERBOARD_DAYS = 7
+LEADERBOARD_MIN_REVIEWS = 3  # минимальное число отзывов для попадания в рейтинг по умолчанию
+LEADERBOARD_MAX_MIN_REVIEWS = 100  # наибольшее допустимое значение минимального числа отзывов
+WEEK_UNION_EXP = 60  # время жизни объединения дневных счетчиков, сек
+RATING_SCAN_STEP = 100  # число аэропортов, читаемых за один запрос при отборе по числу отзывов
+RATING_SCAN_MAX_STEPS = 10  # наибольшее число запросов при отборе по числу отзывов
+DAY_EXP = (LEADERBOARD_DAYS + 1) * 24 * 3600  # время жизни дневного счетчика, сек
+
+
+def day_key(day: date) -> str:
+    # id аэропорта -> число отзывов за день (UTC)
+    return f"leaderboard:day:{day.isoformat()}"
+
+
+def week_days(today: Optional[date] = None) -> list[date]:
+    today = today or datetime.now(timezone.utc).date()
+    return [today - timedelta(days=shift) for shift in range(LEADERBOARD_DAYS)]
+
+
+async def update_airport_rating(
+    db_cache: Redis,
+    id_airport: UUID,
+    review_count: int,
+    rating_sum: int,
+    reviews: int = 0,
+    created_at: Optional[datetime] = None,
+) -> None:
+    """
+    Обновляет позицию аэропорта в рейтингах после фиксации изменения его отзывов.
+    Ошибки Redis не прерывают запрос: расхождение устраняется периодической пересборкой рейтингов
+    :param db_cache: Redis
+        кэш
+    :param id_airport: UUID
+        ID аэропорта
+    :param review_count: int
+        число отзывов аэропорта после изменения (из сводки отзывов)
+    :param rating_sum: int
+        сумма оценок аэропорта после изменения
+    :param reviews: int
+        изменение числа отзывов (1 - добавлен, -1 - удален)
+    :param created_at: Optional[datetime]
+        время создания добавленного или удаленного отзыва
+    :return: None
+    """
+    member: str = str(id_airport)
+    try:
+        async with db_cache.pipeline(transaction=True) as pipe:
+            if review_count > 0:
+                pipe.zadd(RATING_KEY, {member: rating_sum / review_count})
+                pipe.zadd(REVIEWS_KEY, {member: review_count})
+            else:
+                pipe.zrem(RATING_KEY, member)
+                pipe.zrem(REVIEWS_KEY, member)
+            if reviews and created_at is not None:
+                day: date = created_at.astimezone(timezone.utc).date()
+                if day in week_days():
+                    pipe.zincrby(day_key(day), reviews, member)
+                    pipe.expire(day_key(day), DAY_EXP)
+                    pipe.delete(WEEK_KEY)
+            await pipe.execute()
+    except RedisError as exc:
+        logger.warning("Unable to update leaderboards of airport %s: %s", id_airport, exc)
+
+
+async def get_top_rated(db_cache: Redis, limit: int, min_reviews: int) -> list[tuple[UUID, float, int]]:
+    """
+    Аэропорты с наибольшим средним рейтингом среди аэропортов с числом отзывов не менее min_reviews.
+    Просматриваются не более RATING_SCAN_STEP * RATING_SCAN_MAX_STEPS аэропортов с наибольшим рейтингом,
+    поэтому при большом min_reviews аэропортов может оказаться меньше limit.
+    При недоступности Redis возвращается пустой список
+    :param db_cache: Redis
+        кэш
+    :param limit: int
+        число аэропортов
+    :param min_reviews: int
+        минимальное число отзывов
+    :return: list[tuple[UUID, float, int]]
+        (ID аэропорта, средний рейтинг, число отзывов)
+    """
+    top: list[tuple[UUID, float, int]] = list()
+    try:
+        for start in range(0, RATING_SCAN_STEP * RATING_SCAN_MAX_STEPS, RATING_SCAN_STEP):
+            rated: list[tuple[str, float]] = await db_cache.zrevrange(
+                RATING_KEY, start, start + RATING_SCAN_STEP - 1, withscores=True
+            )
+            if not rated:
+                break
+            counts: list[Optional[float]] = await db_cache.zmscore(REVIEWS_KEY, [member for member, _ in rated])
+            for (member, rating), count in zip(rated, counts):
+                if count is not None and count >= min_reviews:
+                    top.append((UUID(member), rating, int(count)))
+            if len(top) >= limit:
+                break
+    except RedisError as exc:
+        logger.warning("Unable to read top rated airports: %s", exc)
+        return list()
+    return top[:limit]
+
+
+async def get_most_reviewed(db_cache: Redis, limit: int) -> list[tuple[UUID, int]]:
+    """
+    Аэропорты с наибольшим числом отзывов за последние LEADERBOARD_DAYS дней.
+    Дневные счетчики объединяются в отдельный ключ, который живет WEEK_UNION_EXP секунд
+    либо до следующего изменения счетчиков. При недоступности Redis возвращается пустой список
+    :param db_cache: Redis
+        кэш
+    :param limit: int
+        число аэропортов
+    :return: list[tuple[UUID, int]]
+        (ID аэропорта, число отзывов)
+    """
+    try:
+        if not await db_cache.exists(WEEK_KEY):
+            async with db_cache.pipeline(transaction=True) as pipe:
+                pipe.zunionstore(WEEK_KEY, [day_key(day) for day in week_days()])
+                pipe.expire(WEEK_KEY, WEEK_UNION_EXP)
+                await pipe.execute()
+        reviewed: list[tuple[str, float]] = await db_cache.zrevrangebyscore(
+            WEEK_KEY, "+inf", 1, start=0, num=limit, withscores=True
+        )
+    except RedisError as exc:
+        logger.warning("Unable to read most reviewed airports: %s", exc)
+        return list()
+    return [(UUID(member), int(count)) for member, count in reviewed]
+
+
+async def rebuild_leaderboards(session: AsyncSession, db_cache: Redis) -> None:
+    """
+    Пересобирает рейтинги: средний рейтинг и число отзывов - по сводкам отзывов,
+    дневные счетчики - по таблице комментариев за последние LEADERBOARD_DAYS дней.
+    :param session: AsyncSession
+        сессия БД
+    :param db_cache: Redis
+        кэш
+    :return: None
+    """
+    days: list[date] = week_days()
+    comment_day = func.date(func.timezone("UTC", AirportComment.created_at))
+    try:
+        result: Result = await session.execute(
+            select(AirportRating.airport_id, AirportRating.review_count, AirportRating.rating_sum).where(
+                AirportRating.review_count > 0
+            )
+        )
+        ratings = result.all()
+        result = await session.execute(
+            select(AirportComment.airport_id, comment_day, func.count())
+            .where(AirportComment.created_at >= datetime.combine(days[-1], datetime.min.time(), timezone.utc))
+            .group_by(AirportComment.airport_id, comment_day)
+        )
+        daily: dict[date, dict[str, float]] = defaultdict(dict)
+        for id_airport, day_comments, count in result.all():
+            daily[day_comments][str(id_airport)] = count
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+
+    boards: dict[str, dict[str, float]] = {
+        RATING_KEY: {str(id_airport): rating_sum / count for id_airport, count, rating_sum in ratings},
+        REVIEWS_KEY: {str(id_airport): count for id_airport, count, _ in ratings},
+    }
+    boards.update({day_key(day_comments): daily.get(day_comments, dict()) for day_comments in days})
+
+    # MULTI/EXEC: читатели видят либо прежние, либо пересобранные рейтинги целиком
+    async with db_cache.pipeline(transaction=True) as pipe:
+        for key, scores in boards.items():
+            pipe.delete(key)
+            if scores:
+                pipe.zadd(key, scores)
+        for day_comments in days:
+            pipe.expire(day_key(day_comments), DAY_EXP)
+        pipe.delete(WEEK_KEY)
+        await pipe.execute()
+    logger.info("Leaderboards rebuilt (%d rated airports)", len(ratings))
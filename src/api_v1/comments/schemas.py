@@ -4,6 +4,8 @@ from uuid import uuid4
 
 from pydantic import UUID4, BaseModel, Field, field_serializer
 
+from src.api_v1.airports.schemas import AirPortOutShortSchemas
+
 
 class UserInfoSchemas(BaseModel):
     full_name: Optional[str] = None
@@ -16,6 +18,7 @@ class CommentAddSchemas(BaseModel):
 
 
 class CommentAllOutSchemas(BaseModel):
+    id: Optional[UUID4] = None
     comment_text: str
     rating: int
     created_at: datetime
@@ -31,3 +34,16 @@ class CommentAllOutSchemas(BaseModel):
 
 class CommentAverageRating(BaseModel):
     average_rating: float = Field(default=0.0)
+
+
+class CommentRatingHistogramSchemas(BaseModel):
+    review_count: int = Field(default=0)
+    average_rating: float = Field(default=0.0)
+    histogram: dict[int, int] = Field(
+        default_factory=lambda: {star: 0 for star in range(1, 6)}, description="Число отзывов с каждой оценкой"
+    )
+
+
+class AirportLeaderboardSchemas(AirPortOutShortSchemas):
+    average_rating: Optional[float] = Field(None, description="Средний рейтинг (для лучших аэропортов)")
+    review_count: int = Field(description="Число отзывов (для самых обсуждаемых - за последние 7 дней)")
@@ -1,22 +1,52 @@
 import logging
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, Response, status
 from fastapi.exceptions import HTTPException
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.api_v1.airports.crud import get_airport
-from src.api_v1.comments.crude import add_new_comment, get_average_rating, get_comment
-from src.api_v1.comments.schemas import CommentAddSchemas, CommentAllOutSchemas, CommentAverageRating
+from src.api_v1.airports.crud import get_airport, get_airports_by_ids
+from src.api_v1.airports.schemas import AirPortOutShortSchemas
+from src.api_v1.airports.snapshot import AirportSnapshot, airport_directory
+from src.api_v1.comments.crude import (
+    ReviewsPage,
+    add_new_comment,
+    delete_comment_db,
+    get_average_rating_json,
+    get_comment_by_id,
+    get_rating_histogram_json,
+    get_reviews_page_json,
+)
+from src.api_v1.comments.leaderboard import (
+    LEADERBOARD_MAX_MIN_REVIEWS,
+    LEADERBOARD_MIN_REVIEWS,
+    get_most_reviewed,
+    get_top_rated,
+)
+from src.api_v1.comments.schemas import (
+    AirportLeaderboardSchemas,
+    CommentAddSchemas,
+    CommentAllOutSchemas,
+    CommentAverageRating,
+    CommentRatingHistogramSchemas,
+)
 from src.core.config import configure_logging
-from src.core.database import get_async_session
+from src.core.database import get_async_session, get_cache_connection
 from src.core.depends import current_user_authorization
 from src.core.exceptions import ErrorInData, ExceptDB, NotFindData
 from src.models.airport import Airport
+from src.models.comment import AirportComment
 from src.models.user import User
+from src.utils.data_utils import json_response
 
 router = APIRouter(tags=["Comments"])
 
+REVIEWS_PAGE_SIZE = 20
+LEADERBOARD_SIZE = 10
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 configure_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -25,6 +55,7 @@ logger = logging.getLogger(__name__)
 async def add_comment(
     comment: CommentAddSchemas,
     session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
     user: User = Depends(current_user_authorization),
 ):
     """
@@ -56,7 +87,7 @@ async def add_comment(
 
     try:
         logger.info("Adding a comment about an airport with an id %s" % comment.airport_id)
-        await add_new_comment(session=session, comment=comment, user=user, airport=airport)
+        await add_new_comment(session=session, comment=comment, user=user, airport=airport, db_cache=db_cache)
     except ErrorInData as exp:
         logger.error(exp)
         raise HTTPException(
@@ -74,39 +105,188 @@ async def add_comment(
 @router.get("/reviews/{airport_id}", response_model=list[CommentAllOutSchemas])
 async def get_reviews_airport(
     airport_id: UUID,
+    cursor: Optional[str] = Query(None, description="Курсор страницы, полученный в заголовке X-Next-Cursor"),
+    size: int = Query(REVIEWS_PAGE_SIZE, ge=1, le=100, description="Размер страницы"),
     session: AsyncSession = Depends(get_async_session),
-) -> list[CommentAllOutSchemas]:
+    db_cache: Redis = Depends(get_cache_connection),
+) -> Response:
+    """
+    Возвращает страницу отзывов об аэропорте, новые первыми.
+    Курсор следующей страницы передается в заголовке X-Next-Cursor
+    """
     logger.info("Getting comments about an airport with an id %s" % airport_id)
     try:
-        comments: list[CommentAllOutSchemas] = await get_comment(session=session, id_airport=airport_id)
+        page: ReviewsPage = await get_reviews_page_json(
+            session=session, id_airport=airport_id, size=size, cursor=cursor, db_cache=db_cache
+        )
     except ExceptDB as exp:
         logger.error(exp)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"{exp}",
         )
-    except NotFindData as exp:
+    except (NotFindData, ErrorInData) as exp:
         logger.error(exp)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"{exp}",
         )
 
-    return comments
+    response: Response = json_response(page.body)
+    if page.next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return response
 
 
 @router.get("/reviews/{airport_id}/rating", response_model=CommentAverageRating)
 async def get_comments_airport(
     airport_id: UUID,
     session: AsyncSession = Depends(get_async_session),
-) -> CommentAverageRating:
+    db_cache: Redis = Depends(get_cache_connection),
+) -> Response:
     logger.info("Getting average rating airport with an id %s" % airport_id)
     try:
-        average_rating: float = await get_average_rating(session=session, id_airport=airport_id)
+        rating_json: str = await get_average_rating_json(session=session, id_airport=airport_id, db_cache=db_cache)
+    except ExceptDB as exp:
+        logger.error(exp)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    return json_response(rating_json)
+
+
+@router.get("/reviews/{airport_id}/histogram", response_model=CommentRatingHistogramSchemas)
+async def get_rating_histogram(
+    airport_id: UUID,
+    session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
+) -> Response:
+    """
+    Возвращает число отзывов об аэропорте, средний рейтинг и распределение оценок
+    """
+    logger.info("Getting rating histogram airport with an id %s" % airport_id)
+    try:
+        histogram_json: str = await get_rating_histogram_json(session=session, id_airport=airport_id, db_cache=db_cache)
+    except ExceptDB as exp:
+        logger.error(exp)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    return json_response(histogram_json)
+
+
+@router.delete("/reviews/comment/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_comment(
+    comment_id: UUID,
+    session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
+    user: User = Depends(current_user_authorization),
+) -> None:
+    """
+    Удаление комментария (автором комментария либо администратором)
+    """
+    logger.info("Start delete comment by id %s user by id %s" % (comment_id, user.id))
+    try:
+        comment: AirportComment = await get_comment_by_id(session=session, id_comment=comment_id)
+    except ExceptDB as exp:
+        logger.error(exp)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    except NotFindData as exp:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{exp}",
+        )
+
+    if comment.user_id != user.id and not user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough rights",
+        )
+
+    try:
+        await delete_comment_db(session=session, comment=comment, db_cache=db_cache)
+    except ExceptDB as exp:
+        logger.error(exp)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+
+
+async def get_airports_short(
+    session: AsyncSession, db_cache: Redis, ids: list[UUID]
+) -> dict[UUID, AirPortOutShortSchemas]:
+    """
+    Краткие данные аэропортов по списку ID: из снимка справочника, при его отсутствии - из БД
+    """
+    snapshot: Optional[AirportSnapshot] = await airport_directory.get(session=session, db_cache=db_cache)
+    if snapshot is not None:
+        return {
+            id_airport: AirPortOutShortSchemas(**snapshot.by_id[id_airport].model_dump())
+            for id_airport in ids
+            if id_airport in snapshot.by_id
+        }
+    airports = await get_airports_by_ids(session=session, ids=ids)
+    return {id_airport: AirPortOutShortSchemas(**airport.__dict__) for id_airport, airport in airports.items()}
+
+
+@router.get("/leaderboard/top-rated", response_model=list[AirportLeaderboardSchemas])
+async def get_top_rated_airports(
+    limit: int = Query(LEADERBOARD_SIZE, ge=1, le=100, description="Число аэропортов"),
+    min_reviews: int = Query(
+        LEADERBOARD_MIN_REVIEWS, ge=1, le=LEADERBOARD_MAX_MIN_REVIEWS, description="Минимальное число отзывов"
+    ),
+    session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
+) -> list[AirportLeaderboardSchemas]:
+    """
+    Аэропорты с наибольшим средним рейтингом (среди аэропортов с числом отзывов не менее min_reviews)
+    """
+    logger.info("Getting top %d rated airports" % limit)
+    top: list[tuple[UUID, float, int]] = await get_top_rated(db_cache=db_cache, limit=limit, min_reviews=min_reviews)
+    try:
+        airports = await get_airports_short(session=session, db_cache=db_cache, ids=[item[0] for item in top])
+    except ExceptDB as exp:
+        logger.error(exp)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{exp}",
+        )
+    return [
+        AirportLeaderboardSchemas(
+            **{**airports[id_airport].model_dump(), "average_rating": rating, "review_count": count}
+        )
+        for id_airport, rating, count in top
+        if id_airport in airports
+    ]
+
+
+@router.get("/leaderboard/most-reviewed", response_model=list[AirportLeaderboardSchemas])
+async def get_most_reviewed_airports(
+    limit: int = Query(LEADERBOARD_SIZE, ge=1, le=100, description="Число аэропортов"),
+    session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
+) -> list[AirportLeaderboardSchemas]:
+    """
+    Аэропорты с наибольшим числом отзывов за последние 7 дней
+    """
+    logger.info("Getting top %d most reviewed airports" % limit)
+    reviewed: list[tuple[UUID, int]] = await get_most_reviewed(db_cache=db_cache, limit=limit)
+    try:
+        airports = await get_airports_short(session=session, db_cache=db_cache, ids=[item[0] for item in reviewed])
     except ExceptDB as exp:
         logger.error(exp)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"{exp}",
         )
-    return CommentAverageRating(average_rating=average_rating)
+    return [
+        AirportLeaderboardSchemas(**{**airports[id_airport].model_dump(), "review_count": count})
+        for id_airport, count in reviewed
+        if id_airport in airports
+    ]
@@ -3,11 +3,15 @@ from typing import Optional, Union
 from uuid import UUID
 
 import jwt
+from redis.asyncio import Redis
 from sqlalchemy import select, update
 from sqlalchemy.engine import Result
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.api_v1.comments.crude import invalidate_reviews, remove_user_ratings
+from src.api_v1.comments.leaderboard import update_airport_rating
+from src.api_v1.users.identity import invalidate_user
 from src.api_v1.users.schemas import (
     UserBaseSchemas,
     UserCreateSchemas,
@@ -143,6 +147,7 @@ async def update_user_db(
     user: User,
     user_update: Union[UserUpdateSchemas, UserUpdatePartialSchemas],
     partial: bool = False,
+    db_cache: Optional[Redis] = None,
 ) -> User:
     """
     :param session: сессия
@@ -153,6 +158,8 @@ async def update_user_db(
     :type user_update: Union[UserUpdateSchemas, UserUpdatePartialSchemas]
     :param partial: признак полного или частичного изменения
     :type partial: bool
+    :param db_cache: кэш, из которого удаляются данные пользователя
+    :type db_cache: Optional[Redis]
     :rtype: User
     :return: возвращает измененного пользователя
     """
@@ -164,31 +171,45 @@ async def update_user_db(
     except IntegrityError:
         await session.rollback()
         raise UniqueViolationError("Duplicate key value violates unique constraint users_email_key")
+    await invalidate_user(db_cache=db_cache, id_user=user.id)
     return user
 
 
-async def delete_user_db(session: AsyncSession, user: User) -> None:
+async def delete_user_db(session: AsyncSession, user: User, db_cache: Optional[Redis] = None) -> None:
     """
     Удаляет заданного пользователя
     :param session: сессия
     :type session: AsyncSession
     :param user: данные удаляемого пользователя
     :type user: UserCreateSchemas
+    :param db_cache: кэш, из которого удаляются данные пользователя
+    :type db_cache: Optional[Redis]
     :rtype: None
     :return:
     """
     logger.info("Delete user by id %s" % user.id)
+    id_user: UUID = user.id
+    # отзывы пользователя удаляются вместе с ним: сводки отзывов аэропортов уменьшаются в той же транзакции
+    summaries: dict[UUID, Optional[tuple[int, int]]] = await remove_user_ratings(session=session, id_user=id_user)
     await session.delete(user)
     await session.commit()
+    await invalidate_user(db_cache=db_cache, id_user=id_user)
+    for id_airport, summary in summaries.items():
+        await invalidate_reviews(id_airport=id_airport, db_cache=db_cache)
+        # дневные счетчики отзывов пересчитываются периодической пересборкой рейтингов
+        if db_cache is not None and summary is not None:
+            await update_airport_rating(db_cache, id_airport, *summary)
 
 
-async def confirm_user(session: AsyncSession, token: str) -> None:
+async def confirm_user(session: AsyncSession, token: str, db_cache: Optional[Redis] = None) -> None:
     """
     Устанавливает статус подтверждения почты пользователя
     :param session: сессия
     :type session: AsyncSession
     :param token: данные удаляемого пользователя
     :type token: str
+    :param db_cache: кэш, из которого удаляются данные пользователя
+    :type db_cache: Optional[Redis]
     :rtype: None
     :return:
     """
@@ -205,3 +226,4 @@ async def confirm_user(session: AsyncSession, token: str) -> None:
     stmt = update(User).where(User.id == id_user).values(is_verified=True, is_active=True)
     await session.execute(stmt)
     await session.commit()
+    await invalidate_user(db_cache=db_cache, id_user=id_user)
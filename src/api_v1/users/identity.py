@@ -0,0 +1,138 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Optional
+from uuid import UUID
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.core.config import CACHE_EXP, configure_logging
+from src.core.exceptions import ExceptDB
+from src.core.invalidation import invalidation_bus
+from src.models.user import User
+from src.utils.cache_utils import LocalTTLCache
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+USER_CACHE_EXP = CACHE_EXP // 12  # время жизни данных пользователя в Redis, сек
+USER_LOCAL_CACHE_TTL = 60  # время жизни данных пользователя в памяти процесса, сек
+USER_NAMESPACE = "user"
+USER_LOCAL_CACHE_SIZE = 10000
+
+# Поля пользователя, которые хранятся в кэше (хеш пароля в кэш не попадает)
+USER_CACHE_FIELDS = ("id", "full_name", "email", "registered_at", "is_superuser", "is_active", "is_verified")
+
+_local_users = LocalTTLCache(maxsize=USER_LOCAL_CACHE_SIZE, ttl=USER_LOCAL_CACHE_TTL)
+
+
+def user_cache_key(id_user: UUID) -> str:
+    return f"user:{id_user}"
+
+
+def evict_local_user(key: Optional[str] = None) -> None:
+    # обработчик событий шины сброса кэшей: key - id пользователя
+    if key is None:
+        _local_users.clear()
+    else:
+        _local_users.delete(user_cache_key(UUID(key)))
+
+
+invalidation_bus.subscribe(USER_NAMESPACE, evict_local_user)
+
+
+def user_to_json(user: User) -> str:
+    """
+    Сериализует данные пользователя для кэша
+    """
+    data: dict[str, Any] = {name: getattr(user, name) for name in USER_CACHE_FIELDS}
+    data["id"] = str(data["id"])
+    data["registered_at"] = data["registered_at"].isoformat() if data["registered_at"] else None
+    return json.dumps(data, ensure_ascii=False)
+
+
+async def user_from_json(session: AsyncSession, user_json: str) -> User:
+    """
+    Восстанавливает пользователя из кэша и присоединяет его к сессии без запроса к БД.
+    Загружены только поля USER_CACHE_FIELDS. Обращение к остальным атрибутам (hashed_password,
+    airport_comments) запускает неявную ленивую загрузку, которая в AsyncSession завершается
+    ошибкой MissingGreenlet; такие атрибуты загружаются явно:
+    await user.awaitable_attrs.<атрибут> либо await session.refresh(user, [<атрибуты>])
+    :param session: AsyncSession
+        сессия БД
+    :param user_json: str
+        данные пользователя из кэша
+    :return: User
+    """
+    data: dict[str, Any] = json.loads(user_json)
+    data["id"] = UUID(data["id"])
+    data["registered_at"] = datetime.fromisoformat(data["registered_at"]) if data["registered_at"] else None
+    user: User = User(**data)
+    make_transient_to_detached(user)
+    return await session.merge(user, load=False)
+
+
+async def get_user_cached(session: AsyncSession, db_cache: Redis, id_user: UUID) -> Optional[User]:
+    """
+    Возвращает пользователя по его id, используя кэш в памяти процесса и в Redis.
+    Если пользователь уже загружен в текущую сессию (в рамках запроса), он берется из сессии.
+    У пользователя из кэша заполнены только поля USER_CACHE_FIELDS (см. user_from_json)
+    :param session: AsyncSession
+        сессия БД
+    :param db_cache: Redis
+        кэш
+    :param id_user: UUID
+        id пользователя
+    :return: Optional[User]
+    """
+    user: Optional[User] = session.identity_map.get(session.identity_key(User, id_user))
+    if user is not None:
+        return user
+
+    key: str = user_cache_key(id_user)
+    user_json: Optional[str] = _local_users.get(key)
+    if user_json is None:
+        try:
+            user_json = await db_cache.get(key)
+        except RedisError as exc:
+            logger.warning("Unable to read user cache: %s", exc)
+    if user_json is not None:
+        _local_users.set(key, user_json)
+        return await user_from_json(session=session, user_json=user_json)
+
+    try:
+        user = await session.get(User, id_user)
+    except SQLAlchemyError as exc:
+        raise ExceptDB(exc)
+    if user is None:
+        return None
+
+    user_json = user_to_json(user)
+    _local_users.set(key, user_json)
+    try:
+        await db_cache.set(key, user_json, ex=USER_CACHE_EXP)
+    except RedisError as exc:
+        logger.warning("Unable to write user cache: %s", exc)
+    return user
+
+
+async def invalidate_user(db_cache: Optional[Redis], id_user: UUID) -> None:
+    """
+    Удаляет данные пользователя из Redis и из памяти всех воркеров.
+    Вызывается после изменения или удаления пользователя
+    :param db_cache: Optional[Redis]
+        кэш
+    :param id_user: UUID
+        id пользователя
+    :return: None
+    """
+    if db_cache is not None:
+        try:
+            await db_cache.delete(user_cache_key(id_user))
+        except RedisError as exc:
+            logger.warning("Unable to invalidate user cache: %s", exc)
+    await invalidation_bus.publish(USER_NAMESPACE, str(id_user), redis=db_cache)
@@ -59,3 +59,9 @@ class LoginSchemas(BaseModel):
 
 class TokenSchemas(BaseModel):
     access_token: str
+
+
+class SessionsStatsSchemas(BaseModel):
+    users: int
+    sessions: int
+    memory_bytes: int
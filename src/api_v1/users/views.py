@@ -6,13 +6,12 @@ import jwt
 from fastapi import APIRouter, Depends, Request, Response, Security, status
 from fastapi.exceptions import HTTPException
 from fastapi.responses import RedirectResponse
-from redis import Redis
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.api_v1.users.crud import (
     confirm_user,
     create_user,
-    find_user_by_email,
     get_user_by_id,
     get_user_from_db,
     update_user_db,
@@ -20,6 +19,7 @@ from src.api_v1.users.crud import (
 from src.api_v1.users.schemas import (
     LoginSchemas,
     OutUserSchemas,
+    SessionsStatsSchemas,
     TokenSchemas,
     UserCreateSchemas,
     UserInfoSchemas,
@@ -27,18 +27,22 @@ from src.api_v1.users.schemas import (
     UserUpdateSchemas,
 )
 from src.core.config import COOKIE_NAME, api_key_header, configure_logging, setting
-from src.core.database import get_async_session, get_redis_connection
+from src.core.database import get_async_session, get_cache_connection, get_redis_connection
 from src.core.depends import (
     current_user_authorization,
+    rate_limit,
     user_by_id,
 )
 from src.core.exceptions import (
     EmailInUse,
     ErrorInData,
     NotFindUser,
+    PasswordHashBusy,
     UniqueViolationError,
 )
-from src.core.jwt_utils import create_jwt, decode_jwt, validate_password
+from src.core.jwt_utils import create_jwt, validate_password
+from src.core.sessions import SessionTokens, close_session, get_sessions_stats, open_session
+from src.core.token_cache import revoke_user_tokens, token_cache
 from src.models.user import User
 from src.tasks.tasks import send_email_about_registration
 
@@ -55,12 +59,13 @@ logger = logging.getLogger(__name__)
 async def get_register_confirm(
     token: str,
     session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
 ):
     """
     Подтверждение регистрации пользователя через почту
     """
     try:
-        await confirm_user(session=session, token=token)
+        await confirm_user(session=session, token=token, db_cache=db_cache)
     except ErrorInData:
         redirect_url = "https://airportcards.ru/?error=invalid_token"
         return RedirectResponse(url=redirect_url, status_code=status.HTTP_302_FOUND)
@@ -72,10 +77,12 @@ async def get_register_confirm(
     "/mail_confirm",
     response_model=TokenSchemas,
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(rate_limit("mail_confirm"))],
 )
 async def get_mail_confirm(
     response: Response,
     session: AsyncSession = Depends(get_async_session),
+    redis: Redis = Depends(get_redis_connection),
     authorization_header: str = Security(api_key_header),
 ):
     """
@@ -93,7 +100,8 @@ async def get_mail_confirm(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not authorized")
 
     try:
-        payload = await decode_jwt(token)
+        # отзыв токена (закрытие сессии, выход на всех устройствах) проверяется так же, как при авторизации
+        payload = await token_cache.decode(token, redis=redis)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -104,6 +112,13 @@ async def get_mail_confirm(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error in request",
         )
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not authorized")
+
+    # новый токен выдается только в рамках действующей сессии
+    sid: Optional[str] = payload.get("sid")
+    if sid is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired. Please login again")
 
     id_user = UUID(payload["sub"])
     user: Optional[User] = await get_user_by_id(session=session, id_user=id_user)
@@ -118,6 +133,7 @@ async def get_mail_confirm(
     access_token: str = await create_jwt(
         user=str(user.id),
         expire_minutes=setting.auth_jwt.access_token_expire_minutes,
+        session_id=sid,
     )
 
     response.set_cookie(
@@ -144,29 +160,32 @@ async def get_mail_confirm(
     status_code=status.HTTP_200_OK,
 )
 async def get_info_about_me(
-    session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_user_authorization),
+    user: Optional[User] = Depends(current_user_authorization),
 ) -> UserInfoSchemas:
     """
     Возвращает информацию об авторизованном пользователе
     """
-    find_user: Optional[User] = await find_user_by_email(session=session, email=user.email)
-    if find_user is None:
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The user not found",
         )
 
     return UserInfoSchemas(
-        id=str(find_user.id),
-        email=find_user.email,
-        full_name=find_user.full_name,
-        is_active=find_user.is_active,
-        is_verified=find_user.is_verified,
+        id=str(user.id),
+        email=user.email,
+        full_name=user.full_name,
+        is_active=user.is_active,
+        is_verified=user.is_verified,
     )
 
 
-@router.post("/login", response_model=OutUserSchemas, status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/login",
+    response_model=OutUserSchemas,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit("login"))],
+)
 async def user_login(
     response: Response,
     request: Request,
@@ -187,16 +206,22 @@ async def user_login(
             detail=f"The user with the username: {data_login.username} not found",
         )
 
-    if await validate_password(password=data_login.password, hashed_password=user.hashed_password):
-        access_token: str = await create_jwt(
-            user=str(user.id),
-            expire_minutes=setting.auth_jwt.access_token_expire_minutes,
+    try:
+        password_valid: bool = await validate_password(
+            password=data_login.password, hashed_password=user.hashed_password
         )
-        refresh_token: str = await create_jwt(
-            user=str(user.id),
-            expire_minutes=setting.auth_jwt.refresh_token_expire_minutes,
+    except PasswordHashBusy as exp:
+        logger.warning("Login %s rejected: %s", data_login.username, exp)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{exp}",
+            headers={"Retry-After": "1"},
         )
 
+    if password_valid:
+        tokens: SessionTokens = await open_session(redis=redis, id_user=str(user.id))
+        access_token: str = tokens.access_token
+
         response.set_cookie(
             key=COOKIE_NAME,
             value=access_token,
@@ -206,8 +231,7 @@ async def user_login(
             path="/",
         )
 
-        request.session["user"] = {"family_name": user.full_name, "id": str(user.id)}
-        await redis.set(str(user.id), refresh_token)
+        request.session["user"] = {"family_name": user.full_name, "id": str(user.id), "sid": tokens.sid}
 
         logger.info(f"User {data_login.username} logged in")
 
@@ -234,6 +258,7 @@ async def user_login(
     response_model=OutUserSchemas,
     status_code=status.HTTP_201_CREATED,
     include_in_schema=True,
+    dependencies=[Depends(rate_limit("register"))],
 )
 async def user_register(
     response: Response,
@@ -258,16 +283,17 @@ async def user_register(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"{exp}",
         )
+    except PasswordHashBusy as exp:
+        logger.warning("Registration of %s rejected: %s", new_user.email, exp)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{exp}",
+            headers={"Retry-After": "1"},
+        )
     else:
         logger.info("Generate JWT for user by name %s" % new_user.full_name)
-        access_token: str = await create_jwt(
-            user=str(user.id),
-            expire_minutes=setting.auth_jwt.access_token_expire_minutes,
-        )
-        refresh_token: str = await create_jwt(
-            user=str(user.id),
-            expire_minutes=setting.auth_jwt.refresh_token_expire_minutes,
-        )
+        tokens: SessionTokens = await open_session(redis=redis, id_user=str(user.id))
+        access_token: str = tokens.access_token
 
         response.set_cookie(
             key=COOKIE_NAME,
@@ -278,8 +304,7 @@ async def user_register(
             path="/",
         )
 
-        request.session["user"] = {"family_name": user.full_name, "id": str(user.id)}
-        await redis.set(str(user.id), refresh_token)
+        request.session["user"] = {"family_name": user.full_name, "id": str(user.id), "sid": tokens.sid}
 
         logger.info("Sending a user registration email")
         send_email_about_registration.delay(
@@ -303,32 +328,96 @@ async def user_register(
 
 
 @router.get("/logout", status_code=status.HTTP_200_OK)
-def logout(request: Request, response: Response) -> None:
+async def logout(
+    request: Request,
+    response: Response,
+    authorization_header: Optional[str] = Security(api_key_header),
+    redis: Redis = Depends(get_redis_connection),
+) -> None:
     """
     Обрабатывает выход пользователя из системы.
+    Текущая сессия пользователя закрывается, ее токены отзываются
     """
+    session_user: dict[str, str] = request.session.get("user", {})
+    id_user: Optional[str] = session_user.get("id")
+    sid: Optional[str] = session_user.get("sid")
+    if authorization_header is not None and "Bearer " in authorization_header:
+        try:
+            payload = await token_cache.decode(authorization_header.replace("Bearer ", ""))
+        except jwt.InvalidTokenError:
+            logger.info("Logout with invalid token")
+        else:
+            id_user, sid = payload["sub"], payload.get("sid")
+
+    if id_user is not None and sid is not None:
+        token_cache.revoke_subject(id_user, sid=sid)
+        await close_session(redis=redis, id_user=id_user, sid=sid)
+        logger.info("Session %s of user by id %s closed", sid, id_user)
+    elif id_user is not None:
+        await revoke_user_tokens(redis=redis, sub=id_user)
+        logger.info("Tokens of user by id %s revoked", id_user)
+
+    response.delete_cookie(COOKIE_NAME)
+    request.session.clear()
+
+
+@router.post("/logout_all", status_code=status.HTTP_200_OK)
+async def logout_all(
+    request: Request,
+    response: Response,
+    user: User = Depends(current_user_authorization),
+    redis: Redis = Depends(get_redis_connection),
+) -> None:
+    """
+    Выход пользователя из системы на всех устройствах: закрываются все его сессии
+    """
+    await revoke_user_tokens(redis=redis, sub=str(user.id))
+    logger.info("All sessions of user by id %s closed", user.id)
     response.delete_cookie(COOKIE_NAME)
     request.session.clear()
 
 
+@router.get("/sessions/stats", response_model=SessionsStatsSchemas, status_code=status.HTTP_200_OK)
+async def sessions_stats(
+    user: User = Depends(current_user_authorization),
+    redis: Redis = Depends(get_redis_connection),
+) -> SessionsStatsSchemas:
+    """
+    Число сессий пользователей и оценка занимаемой ими памяти Redis (только для администратора)
+    """
+    if not user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough rights",
+        )
+    return SessionsStatsSchemas(**await get_sessions_stats(redis))
+
+
 @router.put("/{id_user}/", response_model=UserInfoSchemas, status_code=status.HTTP_200_OK)
 async def update_user(
     user_update: UserUpdateSchemas,
     user: User = Depends(user_by_id),
     session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
 ) -> UserInfoSchemas:
     """
     Переписывает данные пользователе
     """
     try:
-        res = await update_user_db(session=session, user=user, user_update=user_update)
+        res = await update_user_db(session=session, user=user, user_update=user_update, db_cache=db_cache)
     except UniqueViolationError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Duplicate email",
         )
     else:
-        return UserInfoSchemas(**res.__dict__)
+        return UserInfoSchemas(
+            id=str(res.id),
+            email=res.email,
+            full_name=res.full_name,
+            is_active=res.is_active,
+            is_verified=res.is_verified,
+        )
 
 
 @router.patch("/{id_user}/", response_model=UserInfoSchemas, status_code=status.HTTP_200_OK)
@@ -336,16 +425,23 @@ async def update_user_partial(
     user_update: UserUpdatePartialSchemas,
     user: User = Depends(user_by_id),
     session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
 ) -> UserInfoSchemas:
     """
     Редактирует данные пользователе
     """
     try:
-        res = await update_user_db(session=session, user=user, user_update=user_update, partial=True)
+        res = await update_user_db(session=session, user=user, user_update=user_update, partial=True, db_cache=db_cache)
     except UniqueViolationError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Duplicate email",
         )
     else:
-        return UserInfoSchemas(**res.__dict__)
+        return UserInfoSchemas(
+            id=str(res.id),
+            email=res.email,
+            full_name=res.full_name,
+            is_active=res.is_active,
+            is_verified=res.is_verified,
+        )
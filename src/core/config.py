@@ -1,9 +1,10 @@
 import logging
 from pathlib import Path
+from typing import Any, Literal
 
 from authlib.integrations.starlette_client import OAuth
 from fastapi.security.api_key import APIKeyHeader
-from pydantic import BaseModel, SecretStr
+from pydantic import BaseModel, SecretStr, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 BASE_DIR = Path(__file__).parent.parent.parent
@@ -13,6 +14,8 @@ DIR_FOTO = "foto"
 
 COOKIE_NAME = "bonds_airport"
 CACHE_EXP = 3600
+AIRPORTS_SNAPSHOT_CHECK = 30  # период проверки версии справочника аэропортов, сек
+CITIES_SNAPSHOT_TTL = CACHE_EXP  # период перечитывания справочника населенных пунктов, сек
 
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
@@ -51,6 +54,13 @@ class RedisSettings(BaseSettings):
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_db: int = 0
+    # пул соединений одного клиента: размер, ожидание свободного соединения (сек),
+    # период проверки простаивающих соединений (сек) и таймауты сокета (сек)
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 5.0
+    redis_health_check_interval: int = 30
+    redis_socket_timeout: float = 5.0
+    redis_socket_connect_timeout: float = 2.0
 
     model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
 
@@ -68,16 +78,104 @@ class EmailSettings(BaseSettings):
     model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
 
 
+class GeoSettings(BaseSettings):
+    # postgis - запрос к БД, memory - поиск по снимку справочника в памяти процесса (включается NEAREST_ENGINE=memory)
+    nearest_engine: Literal["memory", "postgis"] = "postgis"
+    # кэш движка postgis: размер ячейки сетки (в градусах) и число аэропортов-кандидатов на ячейку
+    nearest_cell_size: float = 0.1
+    nearest_cell_candidates: int = 20
+    # обратное геокодирование по таблице населенных пунктов: postgis - запрос к БД,
+    # memory - снимок в памяти процесса (включается GEOCODER_ENGINE=memory)
+    geocoder_engine: Literal["memory", "postgis"] = "postgis"
+    # наибольшее расстояние (в км) до найденного населенного пункта
+    geocoder_max_distance: float = 30.0
+    # обращаться ли к внешнему геокодеру (Nominatim), если населенный пункт не найден
+    geocoder_fallback: bool = True
+    # внешний геокодер: адрес сервиса, таймаут запроса (сек) и ограничение частоты запросов (запросов в сек)
+    geocoder_domain: str = "nominatim.openstreetmap.org"
+    geocoder_scheme: Literal["http", "https"] = "https"
+    geocoder_user_agent: str = "geo_locator"
+    geocoder_timeout: float = 5.0
+    geocoder_rate: float = 1.0
+    geocoder_burst: int = 1
+    # ответы внешнего геокодера кэшируются по ячейкам сетки (размер в градусах)
+    geocoder_cell_size: float = 0.01
+    geocoder_cache_size: int = 10000
+
+    model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
+
+
 class AuthJWT(BaseModel):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60
     refresh_token_expire_minutes: int = 60 * 24 * 7
+    max_sessions_per_user: int = 10  # при превышении закрываются самые старые сессии пользователя
+
+
+class PasswordHashSettings(BaseSettings):
+    # пул потоков для bcrypt: число потоков и наибольшее число запросов, ожидающих свободный поток
+    password_hash_workers: int = 2
+    password_hash_queue: int = 16
+
+    model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
+
+
+class HttpSettings(BaseSettings):
+    # общий HTTP-клиент воркера: таймауты (сек), размер пула соединений и время жизни простаивающего соединения (сек)
+    http_timeout: float = 10.0
+    http_connect_timeout: float = 3.0
+    http_pool_size: int = 100
+    http_keepalive_timeout: float = 30.0
+
+    model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
+
+
+class RateLimitPolicy(BaseModel):
+    # «корзина токенов»: rate запросов в секунду в среднем и не более burst запросов подряд
+    rate: float
+    burst: int
+    key: Literal["ip", "user"] = "ip"  # ограничение по адресу клиента либо по пользователю
+
+
+RATE_LIMIT_POLICIES: dict[str, RateLimitPolicy] = {
+    "login": RateLimitPolicy(rate=10 / 60, burst=10),
+    "register": RateLimitPolicy(rate=5 / 3600, burst=5),
+    "mail_confirm": RateLimitPolicy(rate=3 / 600, burst=3, key="user"),
+    "geo_local": RateLimitPolicy(rate=2.0, burst=60),
+}
+
+
+class RateLimitSettings(BaseSettings):
+    rate_limit_enabled: bool = True
+    # политики ограничения частоты запросов по маршрутам (в .env задаются в формате JSON);
+    # заданные в .env политики заменяют политики по умолчанию с теми же именами, остальные сохраняются
+    rate_limit_policies: dict[str, RateLimitPolicy] = RATE_LIMIT_POLICIES
+    # размер локального ограничителя, который используется при недоступности Redis
+    rate_limit_local_size: int = 10000
+    # заголовок с адресом клиента, который выставляет nginx ($remote_addr);
+    # пустая строка - адрес соединения (приложение доступно без прокси)
+    rate_limit_client_ip_header: str = "X-Real-IP"
+
+    @field_validator("rate_limit_policies", mode="before")
+    @classmethod
+    def merge_policies(cls, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {**RATE_LIMIT_POLICIES, **value}
+        return value
+
+    model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
 
 
 class AuthGoogle(BaseSettings):
     OAUTH_GOOGLE_CLIENT_ID: str = "test"
     OAUTH_GOOGLE_CLIENT_SECRET: str = "test"
     GOOGLE_REDIRECT_URI: str = "test"
+    GOOGLE_AUTH_URI: str = "https://accounts.google.com/o/oauth2/v2/auth"
+    GOOGLE_TOKEN_URI: str = "https://oauth2.googleapis.com/token"
+    GOOGLE_JWKS_URI: str = "https://www.googleapis.com/oauth2/v3/certs"
+    GOOGLE_ISSUERS: list[str] = ["accounts.google.com", "https://accounts.google.com"]
+    # период фонового обновления ключей Google (JWKS), сек
+    GOOGLE_JWKS_REFRESH: int = 3600
 
     model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
 
@@ -86,6 +184,9 @@ class AuthYandex(BaseSettings):
     OAUTH_YANDEX_CLIENT_ID: str = "test"
     OAUTH_YANDEX_CLIENT_SECRET: str = "test"
     YANDEX_REDIRECT_URI: str = "test"
+    YANDEX_AUTHORIZE_URI: str = "https://oauth.yandex.ru/authorize"
+    YANDEX_TOKEN_URI: str = "https://oauth.yandex.ru/token"
+    YANDEX_USERINFO_URI: str = "https://login.yandex.ru/info"
 
     model_config = SettingsConfigDict(env_file=BASE_DIR / ".env", env_file_encoding="utf8", extra="ignore")
 
@@ -94,7 +195,11 @@ class Setting(BaseSettings):
     db: DbSetting = DbSetting()
     redis: RedisSettings = RedisSettings()
     email_settings: EmailSettings = EmailSettings()
+    geo: GeoSettings = GeoSettings()
     auth_jwt: AuthJWT = AuthJWT()
+    password_hash: PasswordHashSettings = PasswordHashSettings()
+    http: HttpSettings = HttpSettings()
+    rate_limit: RateLimitSettings = RateLimitSettings()
     google: AuthGoogle = AuthGoogle()
     yandex: AuthYandex = AuthYandex()
     secret_key: SecretStr = "test"
@@ -112,9 +217,9 @@ oauth_yandex.register(
     name="yandex",
     client_id=setting.yandex.OAUTH_YANDEX_CLIENT_ID,
     client_secret=setting.yandex.OAUTH_YANDEX_CLIENT_SECRET,
-    authorize_url="https://oauth.yandex.ru/authorize",
-    access_token_url="https://oauth.yandex.ru/token",
-    userinfo_endpoint="https://login.yandex.ru/info",
+    authorize_url=setting.yandex.YANDEX_AUTHORIZE_URI,
+    access_token_url=setting.yandex.YANDEX_TOKEN_URI,
+    userinfo_endpoint=setting.yandex.YANDEX_USERINFO_URI,
     client_kwargs={
         "scope": "login:email login:info login:avatar",
     },
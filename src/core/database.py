@@ -1,10 +1,15 @@
-from typing import AsyncGenerator
+import asyncio
+import logging
+from typing import AsyncGenerator, Optional
 
-from redis import Redis
 from redis import asyncio as aioredis
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from src.core.config import setting
+from src.core.config import configure_logging, setting
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
 
 engine = create_async_engine(
     url=setting.db.url,
@@ -12,21 +17,100 @@ engine = create_async_engine(
 )
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+REDIS_SESSIONS = "sessions"  # токены обновления (БД 0)
+REDIS_CACHE = "cache"  # кэш (БД 1)
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
-        yield session
+REDIS_URLS: dict[str, str] = {
+    REDIS_SESSIONS: setting.redis.url,
+    REDIS_CACHE: setting.redis.url + "/1",
+}
+
+
+class RedisClients:
+    """
+    Клиенты Redis, общие для всех запросов воркера: у каждого клиента свой пул соединений.
+    Клиенты создаются при старте приложения (либо при первом обращении) и закрываются при остановке.
+    Соединения привязаны к циклу событий, поэтому в новом цикле (тесты, asyncio.run) клиенты создаются заново,
+    а пулы прежнего цикла закрываются
+    """
+
+    def __init__(self) -> None:
+        self._clients: dict[str, aioredis.Redis] = dict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: set[asyncio.Task] = set()
+
+    @property
+    def clients(self) -> dict[str, aioredis.Redis]:
+        return self._clients
+
+    def get(self, name: str) -> aioredis.Redis:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            stale, self._clients = self._clients, dict()
+            self._loop = loop
+            if stale:
+                task: asyncio.Task = loop.create_task(close_clients(list(stale.values())))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+        client: Optional[aioredis.Redis] = self._clients.get(name)
+        if client is None:
+            client = create_redis_client(REDIS_URLS[name])
+            self._clients[name] = client
+        return client
+
+    async def init(self) -> None:
+        for name in REDIS_URLS:
+            self.get(name)
+
+    async def close(self) -> None:
+        clients, self._clients = self._clients, dict()
+        await close_clients(list(clients.values()))
 
 
-async def get_redis_connection() -> AsyncGenerator[Redis, None]:
-    redis = await aioredis.from_url(setting.redis.url, decode_responses=True)
-    yield redis
+async def close_clients(clients: list[aioredis.Redis]) -> None:
+    """
+    Закрывает клиенты Redis вместе с их пулами соединений.
+    Соединения клиентов завершившегося цикла событий закрываются с ошибкой: она только записывается в журнал
+    """
+    for client in clients:
+        try:
+            await client.aclose()
+        except (RedisError, OSError, RuntimeError) as exc:
+            logger.info("Redis client of a previous event loop closed with error: %s", exc)
 
 
-async def get_cache_connection() -> AsyncGenerator[Redis, None]:
-    redis_cash = await aioredis.from_url(
-        setting.redis.url + "/1",
+def create_redis_client(url: str) -> aioredis.Redis:
+    """
+    Создает клиент Redis с ограниченным пулом соединений
+    :param url: str
+        адрес Redis
+    :return: aioredis.Redis
+    """
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=setting.redis.redis_max_connections,
+        timeout=setting.redis.redis_pool_timeout,
+        health_check_interval=setting.redis.redis_health_check_interval,
+        socket_timeout=setting.redis.redis_socket_timeout,
+        socket_connect_timeout=setting.redis.redis_socket_connect_timeout,
         encoding="utf8",
         decode_responses=True,
     )
-    yield redis_cash
+    return aioredis.Redis.from_pool(pool)
+
+
+redis_clients = RedisClients()
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_maker() as session:
+        yield session
+
+
+async def get_redis_connection() -> AsyncGenerator[aioredis.Redis, None]:
+    yield redis_clients.get(REDIS_SESSIONS)
+
+
+async def get_cache_connection() -> AsyncGenerator[aioredis.Redis, None]:
+    yield redis_clients.get(REDIS_CACHE)
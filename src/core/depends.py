@@ -1,17 +1,20 @@
-from typing import Annotated, Optional
+import math
+from typing import Annotated, Awaitable, Callable, Optional
 from uuid import UUID
 
 import jwt
 from fastapi import Depends, Path, Request, Response, Security, status
 from fastapi.exceptions import HTTPException
-from redis import Redis
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.api_v1.users.crud import get_user_by_id
-from src.core.config import api_key_header
-from src.core.database import get_async_session, get_redis_connection
-from src.core.jwt_utils import decode_jwt
+from src.api_v1.users.identity import get_user_cached
+from src.core.config import api_key_header, setting
+from src.core.database import get_async_session, get_cache_connection, get_redis_connection
+from src.core.exceptions import ExceptDB
+from src.core.token_cache import token_cache
 from src.models.user import User
+from src.utils.rate_limit import RateLimiter, RateLimitResult, rate_limiters
 
 
 async def current_user_authorization(
@@ -20,6 +23,7 @@ async def current_user_authorization(
     authorization_header: str = Security(api_key_header),
     redis: Redis = Depends(get_redis_connection),
     session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
 ) -> Optional[User]:
     if authorization_header is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not authorized")
@@ -33,7 +37,7 @@ async def current_user_authorization(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not authorized")
 
     try:
-        payload = await decode_jwt(token)
+        payload = await token_cache.decode(token, redis=redis)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -71,17 +75,29 @@ async def current_user_authorization(
         #     response.set_cookie(key=COOKIE_NAME, value=access_token, httponly=True)
         #     return user
 
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not authorized")
     else:
         id_user = UUID(payload["sub"])
-    return await get_user_by_id(session=session, id_user=id_user)
+    try:
+        return await get_user_cached(session=session, db_cache=db_cache, id_user=id_user)
+    except ExceptDB as exp:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{exp}")
 
 
 async def user_by_id(
     id_user: Annotated[UUID, Path],
     session: AsyncSession = Depends(get_async_session),
+    db_cache: Redis = Depends(get_cache_connection),
     user: User = Depends(current_user_authorization),
 ) -> Optional[User]:
-    find_user: Optional[User] = await get_user_by_id(session=session, id_user=id_user)
+    if user.id == id_user:
+        # Пользователь запрашивает свои данные: повторно его не загружаем
+        return user
+    try:
+        find_user: Optional[User] = await get_user_cached(session=session, db_cache=db_cache, id_user=id_user)
+    except ExceptDB as exp:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{exp}")
     if find_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -94,3 +110,47 @@ async def user_by_id(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough rights",
         )
+
+
+async def client_identity(request: Request, by_user: bool) -> str:
+    """
+    Ключ клиента для ограничения частоты запросов: id пользователя из токена доступа
+    (для политик по пользователю) либо адрес клиента, переданный nginx в заголовке X-Real-IP
+    """
+    if by_user:
+        authorization_header: Optional[str] = request.headers.get(api_key_header.model.name)
+        if authorization_header is not None and authorization_header.startswith("Bearer "):
+            try:
+                payload = await token_cache.decode(authorization_header.replace("Bearer ", ""))
+            except jwt.InvalidTokenError:
+                pass
+            else:
+                return f"user:{payload['sub']}"
+    # адрес берется из заголовка nginx, а не из X-Forwarded-For: его левую часть задает сам клиент
+    header: str = setting.rate_limit.rate_limit_client_ip_header
+    address: Optional[str] = request.headers.get(header) if header else None
+    if address is None:
+        address = request.client.host if request.client else "unknown"
+    return f"ip:{address}"
+
+
+def rate_limit(name: str) -> Callable[..., Awaitable[None]]:
+    """
+    Зависимость, ограничивающая частоту запросов к маршруту по политике name
+    из setting.rate_limit.rate_limit_policies. При превышении возвращается 429 с заголовком Retry-After
+    """
+    limiter: RateLimiter = rate_limiters[name]
+
+    async def check_rate_limit(request: Request, db_cache: Redis = Depends(get_cache_connection)) -> None:
+        if not setting.rate_limit.rate_limit_enabled:
+            return
+        identity: str = await client_identity(request=request, by_user=limiter.policy.key == "user")
+        result: RateLimitResult = await limiter.hit(identity=identity, redis=db_cache)
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))},
+            )
+
+    return check_rate_limit
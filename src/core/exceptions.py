@@ -38,3 +38,7 @@ class EmailInUse(Exception):
 
 class UniqueViolationError(Exception):
     pass
+
+
+class PasswordHashBusy(Exception):
+    pass
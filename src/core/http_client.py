@@ -0,0 +1,43 @@
+import asyncio
+from typing import Optional
+
+import aiohttp
+
+from src.core.config import setting
+
+
+class HttpClient:
+    """
+    HTTP-клиент, общий для всех запросов воркера: пул соединений с keep-alive и таймаутами.
+    Сессия создается при первом обращении и закрывается при остановке приложения.
+    Сессия привязана к циклу событий, поэтому в новом цикле она создается заново
+    """
+
+    def __init__(self) -> None:
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=setting.http.http_pool_size,
+                keepalive_timeout=setting.http.http_keepalive_timeout,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=setting.http.http_timeout,
+                connect=setting.http.http_connect_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._loop = loop
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+http_client = HttpClient()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Callable, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.core.config import configure_logging
+from src.core.metrics import INVALIDATION_MESSAGES, INVALIDATION_RECONNECTS, INVALIDATION_RESYNCS
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "invalidation"
+INVALIDATION_VERSION_CHECK = 5.0  # период сверки версий пространств имен с Redis, сек
+RECONNECT_MIN_DELAY = 0.5  # задержка перед повторным подключением к Redis, сек
+RECONNECT_MAX_DELAY = 30.0
+
+# Обработчик события: удаляет из памяти процесса запись по ключу либо (key=None) все записи пространства имен
+Handler = Callable[[Optional[str]], None]
+
+
+def namespace_version_key(namespace: str) -> str:
+    # число изменений данных пространства имен
+    return f"invalidation:version:{namespace}"
+
+
+class InvalidationBus:
+    """
+    Шина сброса кэшей в памяти процессов (воркеров).
+    Изменивший данные процесс увеличивает в Redis версию пространства имен и публикует событие в канал;
+    каждый воркер подписан на канал и удаляет у себя устаревшие записи.
+    События, пропущенные при обрыве соединения, восполняются сверкой версий:
+    при расхождении версии из памяти процесса удаляются все записи пространства имен
+    """
+
+    def __init__(self, channel: str = INVALIDATION_CHANNEL, version_check: float = INVALIDATION_VERSION_CHECK) -> None:
+        self.channel = channel
+        self.version_check = version_check
+        self._handlers: dict[str, list[Handler]] = defaultdict(list)
+        self._versions: dict[str, int] = dict()  # версии, события которых уже обработаны
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, namespace: str, handler: Handler) -> None:
+        self._handlers[namespace].append(handler)
+
+    def evict(self, namespace: str, key: Optional[str] = None) -> None:
+        """
+        Удаляет записи из кэшей в памяти текущего процесса
+        """
+        for handler in self._handlers.get(namespace, ()):
+            handler(key)
+
+    async def publish(self, namespace: str, key: Optional[str] = None, redis: Optional[Redis] = None) -> None:
+        """
+        Сбрасывает записи в текущем процессе и сообщает об изменении данных остальным воркерам
+        :param namespace: str
+            пространство имен
+        :param key: Optional[str]
+            ключ измененной записи; None - изменены все записи пространства имен
+        :param redis: Optional[Redis]
+            кэш; если не задан, записи сбрасываются только в текущем процессе
+        :return: None
+        """
+        self.evict(namespace, key)
+        if redis is None:
+            return
+        try:
+            version: int = await redis.incr(namespace_version_key(namespace))
+            message: str = json.dumps({"namespace": namespace, "key": key, "version": version})
+            await redis.publish(self.channel, message)
+        except RedisError as exc:
+            logger.warning("Unable to publish invalidation of %s: %s", namespace, exc)
+
+    def handle_message(self, data: str | bytes) -> None:
+        """
+        Обрабатывает событие, полученное из канала
+        """
+        try:
+            message: dict = json.loads(data)
+            namespace: str = message["namespace"]
+            version: int = int(message["version"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Invalid invalidation message: %r", data)
+            return
+        INVALIDATION_MESSAGES.labels(namespace).inc()
+        self.evict(namespace, message.get("key"))
+        # версия считается обработанной, только если не пропущено ни одного предыдущего события
+        if self._versions.get(namespace) == version - 1:
+            self._versions[namespace] = version
+
+    async def sync_versions(self, redis: Redis) -> None:
+        """
+        Сверяет версии пространств имен с Redis и полностью сбрасывает пространства имен,
+        события которых могли быть пропущены
+        """
+        namespaces: list[str] = list(self._handlers)
+        if not namespaces:
+            return
+        values: list[Optional[str]] = await redis.mget([namespace_version_key(namespace) for namespace in namespaces])
+        for namespace, value in zip(namespaces, values):
+            version: int = int(value or 0)
+            if self._versions.get(namespace) != version:
+                if namespace in self._versions:
+                    INVALIDATION_RESYNCS.labels(namespace).inc()
+                    logger.info("Invalidation events of %s may be missed, namespace evicted", namespace)
+                self.evict(namespace)
+                self._versions[namespace] = version
+
+    async def _listen(self, redis: Redis) -> None:
+        delay: float = RECONNECT_MIN_DELAY
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                await self.sync_versions(redis)
+                delay = RECONNECT_MIN_DELAY
+                checked_at: float = time.monotonic()
+                while True:
+                    message: Optional[dict] = await pubsub.get_message(timeout=self.version_check)
+                    if message is not None and message["type"] == "message":
+                        self.handle_message(message["data"])
+                    if time.monotonic() - checked_at >= self.version_check:
+                        await self.sync_versions(redis)
+                        checked_at = time.monotonic()
+            except (RedisError, OSError) as exc:
+                INVALIDATION_RECONNECTS.inc()
+                logger.warning("Invalidation channel is unavailable, reconnect in %.1f s: %s", delay, exc)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except (RedisError, OSError):
+                    pass
+
+    def start(self, redis: Redis) -> None:
+        """
+        Запускает фоновую подписку на канал
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen(redis))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+invalidation_bus = InvalidationBus()
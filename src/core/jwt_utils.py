@@ -1,11 +1,81 @@
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Callable, Optional, TypeVar
 
 import bcrypt
 import jwt
 
 from src.core.config import setting
+from src.core.exceptions import PasswordHashBusy
+from src.core.metrics import PASSWORD_HASH_QUEUE_TIME, PASSWORD_HASH_REJECTED, PASSWORD_HASH_TIME
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt в отдельном пуле потоков (bcrypt освобождает GIL), не блокируя цикл событий.
+    Если число ожидающих операций превышает max_queue, новые операции отклоняются
+    """
+
+    def __init__(self, max_workers: int, max_queue: int) -> None:
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: int = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, operation: str, func: Callable[..., T], *args: Any) -> T:
+        """
+        Выполняет операцию в пуле потоков
+        :param operation: str
+            название операции (для метрик)
+        :param func: Callable[..., T]
+            функция bcrypt
+        :param args: Any
+            аргументы функции
+        :rtype: T
+        :return: результат функции
+        :raises PasswordHashBusy: очередь операций заполнена
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            PASSWORD_HASH_REJECTED.labels(operation).inc()
+            raise PasswordHashBusy("Too many password hash operations, try again later")
+
+        queued_at: float = time.perf_counter()
+
+        def task() -> T:
+            started_at: float = time.perf_counter()
+            PASSWORD_HASH_QUEUE_TIME.labels(operation).observe(started_at - queued_at)
+            try:
+                return func(*args)
+            finally:
+                PASSWORD_HASH_TIME.labels(operation).observe(time.perf_counter() - started_at)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password_hash")
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=setting.password_hash.password_hash_workers,
+    max_queue=setting.password_hash.password_hash_queue,
+)
 
 
 async def create_hash_password(password: str) -> bytes:
@@ -15,11 +85,11 @@ async def create_hash_password(password: str) -> bytes:
     :type password: str
     :rtype: bytes
     :return: хеш значение пароля
+    :raises PasswordHashBusy: очередь операций bcrypt заполнена
     """
     salt = bcrypt.gensalt()
     pwd_bytes: bytes = password.encode()
-    await asyncio.sleep(0)
-    return bcrypt.hashpw(pwd_bytes, salt)
+    return await password_hasher.run("hash", bcrypt.hashpw, pwd_bytes, salt)
 
 
 async def validate_password(
@@ -34,12 +104,9 @@ async def validate_password(
     :type hashed_password: str
     :rtype: bool
     :return: возвращает True, если пароль верный иначе - False
+    :raises PasswordHashBusy: очередь операций bcrypt заполнена
     """
-    await asyncio.sleep(0)
-    return bcrypt.checkpw(
-        password=password.encode(),
-        hashed_password=hashed_password.encode(),
-    )
+    return await password_hasher.run("check", bcrypt.checkpw, password.encode(), hashed_password.encode())
 
 
 async def encode_jwt(
@@ -88,6 +155,7 @@ async def decode_jwt(
 async def create_jwt(
     user: str,
     expire_minutes: Optional[int] = None,
+    session_id: Optional[str] = None,
 ) -> str:
     """
     Создание jwt-токен
@@ -95,13 +163,18 @@ async def create_jwt(
     :type user: str
     :param expire_minutes: время экспирации токена
     :type user: Optional[int]
+    :param session_id: id сессии пользователя, к которой привязан токен
+    :type session_id: Optional[str]
     :rtype: str
     :return: jwt-токен
     """
     payload = dict()
     payload["sub"] = user
+    if session_id is not None:
+        payload["sid"] = session_id
     if expire_minutes is None:
         expire_minutes = setting.auth_jwt.access_token_expire_minutes
-    expire = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
-    payload["exp"] = expire  # type: ignore
+    now = datetime.now(timezone.utc)
+    payload["iat"] = now.timestamp()  # type: ignore  # дробные секунды: сравнивается со временем отзыва
+    payload["exp"] = now + timedelta(minutes=expire_minutes)  # type: ignore
     return await encode_jwt(payload)
@@ -0,0 +1,99 @@
+from typing import Iterator
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from src.core.database import RedisClients
+
+PASSWORD_HASH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+PASSWORD_HASH_QUEUE_TIME = Histogram(
+    "password_hash_queue_seconds",
+    "Time a password hash operation waits for a free worker",
+    ["operation"],
+    buckets=PASSWORD_HASH_BUCKETS,
+)
+
+PASSWORD_HASH_TIME = Histogram(
+    "password_hash_seconds",
+    "Time spent computing a password hash",
+    ["operation"],
+    buckets=PASSWORD_HASH_BUCKETS,
+)
+
+TOKEN_CACHE_HITS = Counter("token_cache_hits_total", "Bearer tokens served from the verified-token cache")
+
+TOKEN_CACHE_MISSES = Counter("token_cache_misses_total", "Bearer tokens decoded and verified from scratch")
+
+SESSIONS_OPENED = Counter("sessions_opened_total", "User sessions opened (login, registration, OAuth)")
+
+SESSIONS_CLOSED = Counter("sessions_closed_total", "User sessions closed", ["reason"])
+
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash operations rejected because the queue is full",
+    ["operation"],
+)
+
+RATE_LIMIT_REJECTED = Counter("rate_limit_rejected_total", "Requests rejected by the rate limiter", ["policy"])
+
+RATE_LIMIT_FALLBACK = Counter(
+    "rate_limit_fallback_total",
+    "Rate limiter checks served by in-process buckets because Redis was unavailable",
+    ["policy"],
+)
+
+CACHE_REQUESTS = Histogram(
+    "read_cache_request_seconds",
+    "Read-through cache lookups by result (local, redis, coalesced, miss)",
+    ["namespace", "result"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+CACHE_LOAD_TIME = Histogram(
+    "read_cache_load_seconds",
+    "Time spent loading a missing read-through cache entry from the database",
+    ["namespace"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+INVALIDATION_MESSAGES = Counter(
+    "invalidation_messages_total", "Cache invalidation events received from other workers", ["namespace"]
+)
+
+INVALIDATION_RESYNCS = Counter(
+    "invalidation_resyncs_total",
+    "Namespaces fully evicted because invalidation events may have been missed",
+    ["namespace"],
+)
+
+INVALIDATION_RECONNECTS = Counter("invalidation_reconnects_total", "Reconnects of the cache invalidation subscriber")
+
+
+class RedisPoolCollector(Collector):
+    """
+    Метрики использования пулов соединений Redis, снимаются в момент запроса /metrics
+    """
+
+    def __init__(self, clients: RedisClients) -> None:
+        self.clients = clients
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        in_use = GaugeMetricFamily(
+            "redis_pool_connections_in_use", "Connections currently checked out of the pool", labels=["client"]
+        )
+        available = GaugeMetricFamily(
+            "redis_pool_connections_available", "Idle connections kept in the pool", labels=["client"]
+        )
+        max_connections = GaugeMetricFamily(
+            "redis_pool_max_connections", "Maximum number of connections in the pool", labels=["client"]
+        )
+        for name, client in list(self.clients.clients.items()):
+            pool = client.connection_pool
+            in_use.add_metric([name], len(pool._in_use_connections))
+            available.add_metric([name], len(pool._available_connections))
+            max_connections.add_metric([name], pool.max_connections)
+        yield in_use
+        yield available
+        yield max_connections
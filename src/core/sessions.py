@@ -0,0 +1,146 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+from src.core.config import configure_logging, setting
+from src.core.jwt_utils import create_jwt
+from src.core.metrics import SESSIONS_CLOSED, SESSIONS_OPENED
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSION_EXP = setting.auth_jwt.refresh_token_expire_minutes * 60  # время жизни сессии, сек
+SESSIONS_STATS_SAMPLE = 100  # число ключей, по которым оценивается занимаемая сессиями память
+
+
+def session_key(id_user: str, sid: str) -> str:
+    # токен обновления сессии
+    return f"refresh:{id_user}:{sid}"
+
+
+def sessions_index_key(id_user: str) -> str:
+    # индекс сессий пользователя: id сессии -> время ее истечения (unix)
+    return f"sessions:{id_user}"
+
+
+@dataclass(frozen=True, slots=True)
+class SessionTokens:
+    sid: str
+    access_token: str
+    refresh_token: str
+
+
+async def open_session(redis: Redis, id_user: str) -> SessionTokens:
+    """
+    Открывает новую сессию пользователя: выдает токены доступа и обновления,
+    сохраняет токен обновления с временем жизни сессии и добавляет сессию в индекс пользователя.
+    Сессии сверх max_sessions_per_user закрываются, начиная с самых старых
+    :param redis: хранилище сессий
+    :type redis: Redis
+    :param id_user: id пользователя
+    :type id_user: str
+    :rtype: SessionTokens
+    :return: id сессии и токены
+    """
+    sid: str = uuid4().hex
+    access_token: str = await create_jwt(
+        user=id_user,
+        expire_minutes=setting.auth_jwt.access_token_expire_minutes,
+        session_id=sid,
+    )
+    refresh_token: str = await create_jwt(
+        user=id_user,
+        expire_minutes=setting.auth_jwt.refresh_token_expire_minutes,
+        session_id=sid,
+    )
+
+    now: float = time.time()
+    index_key: str = sessions_index_key(id_user)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(session_key(id_user, sid), refresh_token, ex=SESSION_EXP)
+        pipe.zadd(index_key, {sid: now + SESSION_EXP})
+        pipe.zremrangebyscore(index_key, "-inf", now)
+        pipe.expire(index_key, SESSION_EXP)
+        pipe.delete(id_user)  # токен обновления в прежнем формате (ключ - id пользователя)
+        pipe.zcard(index_key)
+        *_, count = await pipe.execute()
+    SESSIONS_OPENED.inc()
+
+    excess: int = count - setting.auth_jwt.max_sessions_per_user
+    if excess > 0:
+        evicted = await redis.zpopmin(index_key, excess)
+        await redis.delete(*(session_key(id_user, evicted_sid) for evicted_sid, _ in evicted))
+        SESSIONS_CLOSED.labels("evicted").inc(len(evicted))
+        logger.info("%d oldest sessions of user by id %s closed", len(evicted), id_user)
+
+    return SessionTokens(sid=sid, access_token=access_token, refresh_token=refresh_token)
+
+
+async def session_exists(redis: Redis, id_user: str, sid: str) -> bool:
+    return bool(await redis.exists(session_key(id_user, sid)))
+
+
+async def close_session(redis: Redis, id_user: str, sid: str) -> None:
+    """
+    Закрывает сессию пользователя
+    """
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(session_key(id_user, sid))
+        pipe.zrem(sessions_index_key(id_user), sid)
+        await pipe.execute()
+    SESSIONS_CLOSED.labels("logout").inc()
+
+
+async def close_all_sessions(redis: Redis, id_user: str) -> int:
+    """
+    Закрывает все сессии пользователя (выход на всех устройствах)
+    :param redis: хранилище сессий
+    :type redis: Redis
+    :param id_user: id пользователя
+    :type id_user: str
+    :rtype: int
+    :return: число закрытых сессий
+    """
+    index_key: str = sessions_index_key(id_user)
+    sids: list[str] = await redis.zrange(index_key, 0, -1)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(index_key, id_user, *(session_key(id_user, sid) for sid in sids))
+        await pipe.execute()
+    SESSIONS_CLOSED.labels("logout_all").inc(len(sids))
+    return len(sids)
+
+
+async def get_sessions_stats(redis: Redis, sample: int = SESSIONS_STATS_SAMPLE) -> dict[str, int]:
+    """
+    Оценка числа сессий и занимаемой ими памяти Redis.
+    Память оценивается по выборке ключей (MEMORY USAGE) и экстраполируется на все ключи
+    :param redis: хранилище сессий
+    :type redis: Redis
+    :param sample: размер выборки ключей
+    :type sample: int
+    :rtype: dict[str, int]
+    """
+    users: int = 0
+    sessions: int = 0
+    index_sample: list[int] = list()
+    session_sample: list[int] = list()
+    async for index_key in redis.scan_iter(match="sessions:*", count=1000):
+        users += 1
+        sessions += await redis.zcard(index_key)
+        if len(index_sample) < sample:
+            index_sample.append(await redis.memory_usage(index_key) or 0)
+            sid: Optional[str] = next(iter(await redis.zrange(index_key, -1, -1)), None)
+            if sid is not None:
+                id_user: str = index_key.split(":", 1)[1]
+                session_sample.append(await redis.memory_usage(session_key(id_user, sid)) or 0)
+
+    memory_bytes: float = 0.0
+    if index_sample:
+        memory_bytes += sum(index_sample) / len(index_sample) * users
+    if session_sample:
+        memory_bytes += sum(session_sample) / len(session_sample) * sessions
+    return {"users": users, "sessions": sessions, "memory_bytes": int(memory_bytes)}
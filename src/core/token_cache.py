@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import jwt
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.core.config import configure_logging, setting
+from src.core.jwt_utils import decode_jwt
+from src.core.metrics import TOKEN_CACHE_HITS, TOKEN_CACHE_MISSES
+from src.core.sessions import close_all_sessions, session_exists
+from src.utils.cache_utils import LocalTTLCache
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_SIZE = 10000
+TOKEN_REVOCATION_CHECK = 5  # период проверки отзыва токенов пользователя в Redis, сек
+
+
+def revoked_key(sub: str) -> str:
+    # время (unix), до которого выданные пользователю токены считаются отозванными
+    return f"revoked:{sub}"
+
+
+def token_digest(token: str | bytes) -> str:
+    if isinstance(token, str):
+        token = token.encode()
+    return hashlib.sha256(token).hexdigest()
+
+
+@dataclass(slots=True)
+class CachedToken:
+    payload: dict[str, Any]
+    checked_at: float = float("-inf")  # время последней проверки отзыва (time.monotonic)
+
+
+class VerifiedTokenCache:
+    """
+    Кэш проверенных jwt-токенов: по хешу токена хранится его содержание (payload) до истечения срока действия.
+    Отзыв токена (закрытие его сессии либо выход пользователя из системы) сверяется с Redis
+    не чаще одного раза в revocation_check секунд для каждого токена
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, revocation_check: float = TOKEN_REVOCATION_CHECK) -> None:
+        self.revocation_check = revocation_check
+        self._cache = LocalTTLCache(maxsize=maxsize, ttl=setting.auth_jwt.access_token_expire_minutes * 60)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def revoke_subject(self, sub: str, sid: Optional[str] = None) -> None:
+        """
+        Удаляет из кэша токены пользователя (либо только токены заданной сессии)
+        """
+        for key, cached in self._cache.items():
+            if cached.payload.get("sub") == sub and (sid is None or cached.payload.get("sid") == sid):
+                self._cache.delete(key)
+
+    async def decode(self, token: str | bytes, redis: Optional[Redis] = None) -> dict[str, Any]:
+        """
+        Раскодирует jwt-токен, используя кэш проверенных токенов
+        :param token: jwt-токен
+        :type token: str | bytes
+        :param redis: хранилище токенов обновления, в котором отмечается отзыв токенов
+        :type redis: Optional[Redis]
+        :rtype: dict
+        :return: содержание токена (payload)
+        :raises jwt.ExpiredSignatureError: срок действия токена истек
+        :raises jwt.InvalidTokenError: токен некорректен или отозван
+        """
+        key: str = token_digest(token)
+        cached: Optional[CachedToken] = self._cache.get(key)
+        if cached is not None and cached.payload["exp"] > time.time():
+            TOKEN_CACHE_HITS.inc()
+        else:
+            TOKEN_CACHE_MISSES.inc()
+            cached = CachedToken(payload=await decode_jwt(token))
+            if "exp" in cached.payload:
+                self._cache.set(key, cached, ttl=cached.payload["exp"] - time.time())
+
+        if redis is not None and time.monotonic() - cached.checked_at >= self.revocation_check:
+            await self.check_revoked(key=key, cached=cached, redis=redis)
+        return cached.payload
+
+    async def check_revoked(self, key: str, cached: CachedToken, redis: Redis) -> None:
+        """
+        Проверяет, не отозваны ли токены пользователя после выдачи данного токена
+        """
+        sub: str = cached.payload["sub"]
+        try:
+            if "sid" in cached.payload:
+                # токен привязан к сессии: он действует, пока сессия не закрыта
+                revoked: bool = not await session_exists(redis=redis, id_user=sub, sid=cached.payload["sid"])
+            else:
+                revoked_at: Optional[str] = await redis.get(revoked_key(sub))
+                revoked = revoked_at is not None and cached.payload.get("iat", 0) < float(revoked_at)
+        except RedisError as exc:
+            logger.warning("Unable to check token revocation: %s", exc)
+            return
+        if revoked:
+            self._cache.delete(key)
+            raise jwt.InvalidTokenError("Token has been revoked")
+        cached.checked_at = time.monotonic()
+
+
+async def revoke_user_tokens(redis: Redis, sub: str) -> None:
+    """
+    Отзывает все выданные пользователю токены: закрывает все его сессии
+    и отмечает время отзыва токенов, не привязанных к сессии, на срок действия токена доступа
+    :param redis: хранилище токенов обновления
+    :type redis: Redis
+    :param sub: id пользователя
+    :type sub: str
+    :rtype: None
+    """
+    token_cache.revoke_subject(sub)
+    await close_all_sessions(redis=redis, id_user=sub)
+    await redis.set(revoked_key(sub), time.time(), ex=setting.auth_jwt.access_token_expire_minutes * 60)
+
+
+token_cache = VerifiedTokenCache()
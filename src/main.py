@@ -1,18 +1,30 @@
 import logging
 import time
 import warnings
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
 
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_pagination import add_pagination
 from fastapi_pagination.utils import FastAPIPaginationWarning
-from prometheus_client import Counter, Histogram
+from prometheus_client import REGISTRY, Counter, Histogram
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
 from starlette.middleware.sessions import SessionMiddleware
 from starlette_exporter import PrometheusMiddleware, handle_metrics
 
 from src.api_v1 import router as api_router
+from src.api_v1.airports.snapshot import airport_directory
+from src.api_v1.auth.jwks import google_jwks
 from src.core.config import configure_logging, setting
+from src.core.database import REDIS_CACHE, async_session_maker, engine, redis_clients
+from src.core.http_client import http_client
+from src.core.invalidation import invalidation_bus
+from src.core.jwt_utils import password_hasher
+from src.core.metrics import RedisPoolCollector
+from src.utils.geocoder import reverse_geocoder
 
 description = """
     API airport directory
@@ -26,11 +38,38 @@ description = """
 
 warnings.simplefilter("ignore", FastAPIPaginationWarning)
 
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    # Загружаем снимок справочника аэропортов при старте воркера
+    await redis_clients.init()
+    invalidation_bus.start(redis_clients.get(REDIS_CACHE))
+    google_jwks.start()
+    try:
+        async with async_session_maker() as session:
+            await airport_directory.get(session=session, db_cache=redis_clients.get(REDIS_CACHE))
+    except (SQLAlchemyError, RedisError, OSError) as exc:
+        logger.warning("Airports snapshot is not loaded at startup: %s", exc)
+    yield
+    # Закрываем общие соединения воркера
+    await google_jwks.stop()
+    await invalidation_bus.stop()
+    await http_client.close()
+    await reverse_geocoder.close()
+    password_hasher.shutdown()
+    await redis_clients.close()
+    await engine.dispose()
+
+
 app = FastAPI(
     title="API_AirportDirectory",
     description=description,
     version="0.1.0",
     docs_url="/docs",
+    lifespan=lifespan,
 )
 
 origins = [
@@ -49,6 +88,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # курсор следующей страницы отзывов
 )
 
 app.add_middleware(SessionMiddleware, secret_key=setting.secret_key.get_secret_value())
@@ -68,9 +108,6 @@ app.include_router(router=api_router)
 
 add_pagination(app)
 
-configure_logging(logging.INFO)
-logger = logging.getLogger(__name__)
-
 # Создаем кастомные метрики
 REQUEST_COUNT = Counter(
     "app_request_count",
@@ -85,6 +122,8 @@ REQUEST_DURATION = Histogram(
     buckets=[0.1, 0.5, 1.0, 2.0, 5.0],
 )
 
+REGISTRY.register(RedisPoolCollector(redis_clients))
+
 
 # Middleware для кастомных метрик
 @app.middleware("http")
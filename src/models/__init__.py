@@ -1,6 +1,7 @@
 from .airport import Airport
 from .base import Base
 from .comment import AirportComment
+from .rating import AirportRating
 from .user import User
 
-__all__ = ["Base", "User", "Airport", "AirportComment"]
+__all__ = ["Base", "User", "Airport", "AirportComment", "AirportRating"]
@@ -1,12 +1,19 @@
+from typing import Optional
+
 from geoalchemy2 import Geometry
-from sqlalchemy import Float, String, Text
+from sqlalchemy import Float, Index, String, Text, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.models.base import Base
 from src.models.comment import AirportComment
+from src.models.rating import AirportRating
 
 
 class Airport(Base):
+    __table_args__ = (
+        Index("ix_airports_name_id", "name", "id"),
+        Index("idx_airports_geo_geography", text("geography(geo)"), postgresql_using="gist"),
+    )
     name: Mapped[str]
     full_name: Mapped[str]
     city: Mapped[str] = mapped_column(String, index=True)
@@ -26,3 +33,6 @@ class Airport(Base):
     online_tablo: Mapped[str]
 
     comments: Mapped[list["AirportComment"]] = relationship(back_populates="airport", cascade="all, delete-orphan")
+    rating: Mapped[Optional["AirportRating"]] = relationship(
+        back_populates="airport", cascade="all, delete-orphan", passive_deletes=True
+    )
@@ -1,4 +1,4 @@
-from uuid import uuid4
+import uuid
 
 from sqlalchemy import UUID, func
 from sqlalchemy.ext.asyncio import AsyncAttrs
@@ -12,9 +12,9 @@ class Base(AsyncAttrs, DeclarativeBase):
     def __tablename__(cls) -> str:
         return f"{cls.__name__.lower()}s"
 
-    id: Mapped[UUID] = mapped_column(
+    id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
-        default=uuid4,
+        default=uuid.uuid4,
         server_default=func.gen_random_uuid(),
     )
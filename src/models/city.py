@@ -1,11 +1,18 @@
-from sqlalchemy import Float, Index, String
+from sqlalchemy import Float, Index, String, text
 from sqlalchemy.orm import Mapped, mapped_column, validates
 
 from src.models.base import Base
 
 
 class City(Base):
-    __table_args__ = (Index("idx_users_city_hash", "city", postgresql_using="hash"),)
+    __table_args__ = (
+        Index("idx_users_city_hash", "city", postgresql_using="hash"),
+        Index(
+            "idx_citys_geography",
+            text("geography(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326))"),
+            postgresql_using="gist",
+        ),
+    )
     region: Mapped[str]
     city: Mapped[str] = mapped_column(String)
     latitude: Mapped[float] = mapped_column(Float)
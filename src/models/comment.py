@@ -1,7 +1,8 @@
+import uuid
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import UUID, CheckConstraint, DateTime, ForeignKey, Integer, Text, func
+from sqlalchemy import UUID, CheckConstraint, DateTime, ForeignKey, Index, Integer, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.models.base import Base
@@ -12,7 +13,11 @@ if TYPE_CHECKING:
 
 
 class AirportComment(Base):
-    __table_args__ = (CheckConstraint("rating >= 1 AND rating <= 5", name="check_rating_range"),)
+    __table_args__ = (
+        CheckConstraint("rating >= 1 AND rating <= 5", name="check_rating_range"),
+        Index("ix_airportcomments_user_id", "user_id"),
+        Index("ix_airportcomments_airport_id_created_at_id", "airport_id", "created_at", "id"),
+    )
 
     comment_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     rating: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -22,10 +27,10 @@ class AirportComment(Base):
         default=lambda: datetime.now(timezone.utc),
     )
 
-    airport_id: Mapped[UUID] = mapped_column(
+    airport_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("airports.id", ondelete="CASCADE"), nullable=False
     )
-    user_id: Mapped[UUID] = mapped_column(
+    user_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
 
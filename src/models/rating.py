@@ -0,0 +1,45 @@
+import uuid
+from typing import TYPE_CHECKING
+
+from sqlalchemy import UUID, CheckConstraint, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from src.models.base import Base
+
+if TYPE_CHECKING:
+    from src.models.airport import Airport
+
+RATING_STARS = (1, 2, 3, 4, 5)
+
+
+class AirportRating(Base):
+    """
+    Сводка отзывов аэропорта: число отзывов, сумма оценок и число оценок каждого значения.
+    Обновляется в одной транзакции с добавлением и удалением отзывов
+    """
+
+    __table_args__ = (CheckConstraint("review_count >= 0", name="check_review_count"),)
+
+    airport_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("airports.id", ondelete="CASCADE"), unique=True, nullable=False
+    )
+    review_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    stars_1: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    stars_2: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    stars_3: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    stars_4: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    stars_5: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+    airport: Mapped["Airport"] = relationship(back_populates="rating")
+
+    @property
+    def average_rating(self) -> float:
+        return self.rating_sum / self.review_count if self.review_count else 0.0
+
+    @property
+    def histogram(self) -> dict[int, int]:
+        return {star: getattr(self, f"stars_{star}") for star in RATING_STARS}
+
+    def __repr__(self):
+        return f"<AirportRating(airport_id={self.airport_id}, review_count={self.review_count})>"
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.schedules import crontab
 
 from src.core.config import RedisSettings
 
@@ -24,4 +25,16 @@ app.conf.update(
 
 app.conf.task_default_queue = "sendemail"
 
+# периодические задачи (планировщик запускается вместе с воркером: celery worker -B)
+app.conf.beat_schedule = {
+    "rebuild-airport-ratings": {
+        "task": "rebuild_airport_ratings",
+        "schedule": crontab(hour=4, minute=0),
+    },
+    "rebuild-leaderboards": {
+        "task": "rebuild_leaderboards",
+        "schedule": crontab(minute="*/15"),
+    },
+}
+
 app.autodiscover_tasks(["src.tasks"])  # автоматическая загрузка задач
@@ -62,3 +62,23 @@ def send_email_about_registration(
             server.send_message(msg=email)
         except smtplib.SMTPException as exc:
             self.retry(exc=exc)
+
+
+@app.task(name="rebuild_airport_ratings")
+def rebuild_airport_ratings() -> int:
+    """
+    Периодическая сверка сводок отзывов аэропортов с таблицей комментариев
+    """
+    from src.utils.rebuild_ratings import run_rebuild_ratings
+
+    return run_rebuild_ratings()
+
+
+@app.task(name="rebuild_leaderboards")
+def rebuild_leaderboards() -> None:
+    """
+    Периодическая пересборка рейтингов аэропортов в Redis по данным БД
+    """
+    from src.utils.rebuild_ratings import run_refresh_leaderboards
+
+    run_refresh_leaderboards()
@@ -8,8 +8,9 @@ from sqlalchemy import exists, select
 from sqlalchemy.engine import Result
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.api_v1.cities.snapshot import invalidate_cities
 from src.core.config import BASE_DIR, configure_logging
-from src.core.database import async_session_maker
+from src.core.database import REDIS_CACHE, REDIS_URLS, async_session_maker, create_redis_client
 from src.models.city import City
 
 configure_logging(logging.INFO)
@@ -55,6 +56,11 @@ async def city_from_files_to_db() -> None:
                 logger.info("The city %s is already in the database" % i_data["city"])
         await session.commit()
 
+    # Сообщаем воркерам об изменении справочника городов
+    async with create_redis_client(REDIS_URLS[REDIS_CACHE]) as db_cache:
+        await invalidate_cities(db_cache)
+    logger.info("Cities cache invalidated")
+
 
 async def city_from_files_to_test_db(session: AsyncSession) -> None:
     """
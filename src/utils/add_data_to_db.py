@@ -11,8 +11,9 @@ from sqlalchemy.engine import Result
 from sqlalchemy.ext.asyncio import AsyncSession
 from geoalchemy2.functions import ST_Point  # noqa: I001
 
+from src.api_v1.airports.snapshot import bump_airports_version
 from src.core.config import BASE_DIR, configure_logging
-from src.core.database import async_session_maker
+from src.core.database import REDIS_CACHE, REDIS_URLS, async_session_maker, create_redis_client
 from src.models.airport import Airport
 
 configure_logging(logging.INFO)
@@ -75,6 +76,11 @@ async def data_from_files_to_db() -> None:
                     logger.info("The airport named %s is already in the database" % i_data["name"])
             await session.commit()
 
+    # Сообщаем воркерам о новой версии справочника аэропортов
+    async with create_redis_client(REDIS_URLS[REDIS_CACHE]) as db_cache:
+        await bump_airports_version(db_cache)
+    logger.info("Airports data version updated")
+
 
 async def data_from_files_to_test_db(session: AsyncSession) -> None:
     """
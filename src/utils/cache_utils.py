@@ -0,0 +1,478 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, cast
+from uuid import uuid4
+
+from redis.asyncio import Redis
+from redis.exceptions import LockError, RedisError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import CACHE_EXP, configure_logging
+from src.core.database import async_session_maker
+from src.core.invalidation import invalidation_bus
+from src.core.metrics import CACHE_LOAD_TIME, CACHE_REQUESTS
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 10  # время жизни блокировки пересборки кэша, сек
+WAIT_TIMEOUT = 2.0  # время ожидания пересборки кэша другим воркером, сек
+WAIT_STEP = 0.05
+STALE_EXP = CACHE_EXP * 24  # время жизни устаревшей копии списка, сек
+LOCAL_CACHE_TTL = 60  # время жизни записей кэша чтения в памяти процесса, сек
+LOCAL_CACHE_SIZE = 10000
+
+Loader = Callable[..., Awaitable[str]]
+
+
+async def rebuild_list_cache(
+    db_cache: Redis, key: str, items: list[str], ex: int = CACHE_EXP, keep_stale: bool = True
+) -> None:
+    """
+    Атомарно пересобирает список в кэше: данные записываются одним конвейером (pipeline)
+    во временный ключ, который затем переименовывается в основной.
+    При keep_stale рядом сохраняется долгоживущая копия списка ({key}:stale)
+    :param db_cache: Redis
+        кэш
+    :param key: str
+        ключ списка
+    :param items: list[str]
+        элементы списка
+    :param ex: int
+        время жизни списка, сек
+    :param keep_stale: bool
+        сохранять ли устаревшую копию списка
+    :return: None
+    """
+    if not items:
+        return
+
+    tmp_key: str = f"{key}:tmp:{uuid4().hex}"
+    async with db_cache.pipeline(transaction=True) as pipe:
+        pipe.rpush(tmp_key, *items)
+        pipe.expire(tmp_key, ex)
+        if keep_stale:
+            pipe.copy(tmp_key, f"{key}:stale", replace=True)
+            pipe.expire(f"{key}:stale", STALE_EXP)
+        pipe.rename(tmp_key, key)
+        await pipe.execute()
+
+
+async def get_or_rebuild_list(
+    db_cache: Redis,
+    key: str,
+    loader: Callable[[], Awaitable[list[str]]],
+    ex: int = CACHE_EXP,
+    keep_stale: bool = True,
+) -> list[str]:
+    """
+    Возвращает список из кэша, а при его отсутствии пересобирает его.
+    Пересборку выполняет только один воркер (блокировка в Redis), остальные отдают
+    устаревшую копию списка либо ждут окончания пересборки
+    :param db_cache: Redis
+        кэш
+    :param key: str
+        ключ списка
+    :param loader: Callable[[], Awaitable[list[str]]]
+        функция загрузки элементов списка из БД
+    :param ex: int
+        время жизни списка, сек
+    :param keep_stale: bool
+        сохранять ли устаревшую копию списка
+    :return: list[str]
+    """
+    items: list[str] = await cast(Awaitable[list[str]], db_cache.lrange(key, 0, -1))
+    if items:
+        return items
+
+    lock = db_cache.lock(f"{key}:lock", timeout=LOCK_TIMEOUT)
+    if await lock.acquire(blocking=False):
+        try:
+            items = await loader()
+            await rebuild_list_cache(db_cache=db_cache, key=key, items=items, ex=ex, keep_stale=keep_stale)
+            logger.info("Cache list %s rebuilt", key)
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                logger.warning("Lock for cache list %s expired before release", key)
+        return items
+
+    if keep_stale:
+        items = await cast(Awaitable[list[str]], db_cache.lrange(f"{key}:stale", 0, -1))
+        if items:
+            logger.info("Cache list %s is being rebuilt, stale copy is used", key)
+            return items
+
+    deadline: float = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(WAIT_STEP)
+        items = await cast(Awaitable[list[str]], db_cache.lrange(key, 0, -1))
+        if items:
+            return items
+
+    logger.warning("Cache list %s was not rebuilt in time, loading from db", key)
+    return await loader()
+
+
+class LocalTTLCache:
+    """
+    Кэш в памяти процесса с ограниченным числом записей (вытеснение LRU) и временем жизни записей
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Возвращает значение по ключу либо None, если записи нет или ее время жизни истекло
+        """
+        item: Optional[tuple[float, Any]] = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Сохраняет значение, при переполнении вытесняя давно не использованные записи
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def items(self) -> list[tuple[Hashable, Any]]:
+        """
+        Снимок записей кэша (включая записи с истекшим временем жизни)
+        """
+        return [(key, value) for key, (_, value) in self._data.items()]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class ReadThroughCache:
+    """
+    Двухуровневый кэш чтения: записи хранятся в памяти процесса (LRU с временем жизни) и в Redis.
+    Ключи записей включают пространство имен и версию формата данных ({namespace}:v{version}:{key}).
+    В Redis хранится строка (json), в памяти процесса - результат decode.
+    Запись может состоять из полей (field): в Redis они хранятся в одном хеше и сбрасываются вместе.
+    Одновременные промахи по одному ключу объединяются в одну загрузку.
+    Сброс записей рассылается остальным воркерам через шину invalidation_bus;
+    загрузка, во время которой произошел сброс, не сохраняет результат в кэш
+    """
+
+    # фабрика сессий общих загрузок (cached): загрузка не зависит от сессии запроса, который ее начал
+    session_factory: async_sessionmaker[AsyncSession] = async_session_maker
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int = CACHE_EXP,
+        local_ttl: float = LOCAL_CACHE_TTL,
+        local_size: int = LOCAL_CACHE_SIZE,
+        version: int = 1,
+        decode: Optional[Callable[[str], Any]] = None,
+    ) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.version = version
+        self.decode: Callable[[str], Any] = decode or (lambda data: data)
+        self._local = LocalTTLCache(maxsize=local_size, ttl=local_ttl)
+        self._inflight: dict[Hashable, asyncio.Task] = dict()
+        self._epoch: int = 0  # число сбросов записей в текущем процессе
+        invalidation_bus.subscribe(namespace, self.evict_local)
+
+    def key(self, key: str) -> str:
+        return f"{self.namespace}:v{self.version}:{key}"
+
+    def evict_local(self, key: Optional[str] = None) -> None:
+        """
+        Удаляет из памяти процесса запись (со всеми ее полями) по ключу либо (key=None) все записи
+        """
+        self._epoch += 1
+        if key is None:
+            self._local.clear()
+            self._inflight.clear()
+            return
+        full_key: str = self.key(key)
+
+        def of_key(local_key: Hashable) -> bool:
+            # ключ записи либо (ключ, поле) одного из ее полей
+            return local_key == full_key or (isinstance(local_key, tuple) and local_key[0] == full_key)
+
+        for local_key, _ in self._local.items():
+            if of_key(local_key):
+                self._local.delete(local_key)
+        for local_key in [local_key for local_key in self._inflight if of_key(local_key)]:
+            del self._inflight[local_key]
+
+    async def get(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[str]],
+        db_cache: Optional[Redis] = None,
+        field: Optional[str] = None,
+    ) -> Any:
+        """
+        Возвращает запись из кэша, при промахе загружает ее функцией loader и сохраняет в оба уровня кэша
+        :param key: str
+            ключ записи в пространстве имен
+        :param loader: Callable[[], Awaitable[str]]
+            функция загрузки записи (json) из БД; ее исключения передаются вызывающему, запись не кэшируется
+        :param db_cache: Optional[Redis]
+            кэш; если не задан, используется только память процесса
+        :param field: Optional[str]
+            поле записи; поля одной записи хранятся в Redis в одном хеше
+        :return: Any
+        """
+        start: float = time.perf_counter()
+        full_key: str = self.key(key)
+        local_key: Hashable = full_key if field is None else (full_key, field)
+        value: Optional[Any] = self._local.get(local_key)
+        if value is not None:
+            self._observe("local", start)
+            return value
+
+        task: Optional[asyncio.Task] = self._inflight.get(local_key)
+        source: str = "coalesced"
+        if task is None:
+            task = asyncio.ensure_future(
+                self._load(full_key=full_key, field=field, loader=loader, db_cache=db_cache, epoch=self._epoch)
+            )
+            self._inflight[local_key] = task
+            # запись могла быть сброшена и загружаться заново: удаляется только своя загрузка
+            task.add_done_callback(
+                lambda done: self._inflight.pop(local_key, None) if self._inflight.get(local_key) is done else None
+            )
+            source = ""
+        # shield: отмена одного из ожидающих запросов не отменяет общую загрузку
+        value, loaded_from = await asyncio.shield(task)
+        self._observe(source or loaded_from, start)
+        return value
+
+    async def get_many(
+        self,
+        keys: list[str],
+        loader: Callable[[list[str]], Awaitable[dict[str, str]]],
+        db_cache: Optional[Redis] = None,
+        field: Optional[str] = None,
+    ) -> dict[str, Any]:
+        """
+        Возвращает записи по нескольким ключам: из памяти процесса, отсутствующие - одним запросом к Redis,
+        оставшиеся загружаются одним вызовом loader и сохраняются в оба уровня кэша.
+        Загрузки не объединяются с одновременными загрузками тех же записей
+        :param keys: list[str]
+            ключи записей в пространстве имен
+        :param loader: Callable[[list[str]], Awaitable[dict[str, str]]]
+            функция загрузки записей (json) из БД по ключам; ее исключения передаются вызывающему
+        :param db_cache: Optional[Redis]
+            кэш; если не задан, используется только память процесса
+        :param field: Optional[str]
+            поле записей
+        :return: dict[str, Any]
+            ключ -> запись (ключи, не возвращенные loader, пропускаются)
+        """
+        start: float = time.perf_counter()
+        epoch: int = self._epoch
+        values: dict[str, Any] = dict()
+        for key in keys:
+            value: Optional[Any] = self._local.get(self._local_key(key, field))
+            if value is not None:
+                values[key] = value
+                self._observe("local", start)
+        missing: list[str] = [key for key in keys if key not in values]
+
+        if missing and db_cache is not None:
+            found: dict[str, str] = await self._read_many(missing, field=field, db_cache=db_cache)
+            for key, data in found.items():
+                values[key] = self._remember(key, field, data, epoch)
+                self._observe("redis", start)
+            missing = [key for key in missing if key not in found]
+        if not missing:
+            return values
+
+        loaded: dict[str, str] = await loader(missing)
+        CACHE_LOAD_TIME.labels(self.namespace).observe(time.perf_counter() - start)
+        for key, data in loaded.items():
+            values[key] = self._remember(key, field, data, epoch)
+            self._observe("miss", start)
+        # данные, изменившиеся во время загрузки, отдаются вызывающему, но не кэшируются
+        if db_cache is not None and loaded and epoch == self._epoch:
+            await self._write_many(loaded, field=field, db_cache=db_cache)
+        return values
+
+    def _local_key(self, key: str, field: Optional[str]) -> Hashable:
+        return self.key(key) if field is None else (self.key(key), field)
+
+    def _remember(self, key: str, field: Optional[str], data: str, epoch: int) -> Any:
+        # запись сохраняется в памяти процесса, только если с начала загрузки не было сбросов
+        value: Any = self.decode(data)
+        if epoch == self._epoch:
+            self._local.set(self._local_key(key, field), value)
+        return value
+
+    async def _read_many(self, keys: list[str], field: Optional[str], db_cache: Redis) -> dict[str, str]:
+        try:
+            async with db_cache.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    if field is None:
+                        pipe.get(self.key(key))
+                    else:
+                        pipe.hget(self.key(key), field)
+                cached: list[Optional[str]] = await pipe.execute()
+        except RedisError as exc:
+            logger.warning("Unable to read cache %s: %s", self.namespace, exc)
+            return dict()
+        return {key: data for key, data in zip(keys, cached) if data is not None}
+
+    async def _write_many(self, records: dict[str, str], field: Optional[str], db_cache: Redis) -> None:
+        try:
+            async with db_cache.pipeline(transaction=False) as pipe:
+                for key, data in records.items():
+                    if field is None:
+                        pipe.set(self.key(key), data, ex=self.ttl)
+                    else:
+                        pipe.hset(self.key(key), field, data)
+                        pipe.expire(self.key(key), self.ttl)
+                await pipe.execute()
+        except RedisError as exc:
+            logger.warning("Unable to write cache %s: %s", self.namespace, exc)
+
+    async def _load(
+        self,
+        full_key: str,
+        field: Optional[str],
+        loader: Callable[[], Awaitable[str]],
+        db_cache: Optional[Redis],
+        epoch: int,
+    ) -> tuple[Any, str]:
+        local_key: Hashable = full_key if field is None else (full_key, field)
+        if db_cache is not None:
+            try:
+                data: Optional[str] = await (
+                    db_cache.get(full_key)
+                    if field is None
+                    else cast(Awaitable[Optional[str]], db_cache.hget(full_key, field))
+                )
+            except RedisError as exc:
+                logger.warning("Unable to read cache %s: %s", full_key, exc)
+                db_cache, data = None, None
+            if data is not None:
+                value: Any = self.decode(data)
+                if epoch == self._epoch:
+                    self._local.set(local_key, value)
+                return value, "redis"
+
+        start: float = time.perf_counter()
+        data = await loader()
+        CACHE_LOAD_TIME.labels(self.namespace).observe(time.perf_counter() - start)
+        value = self.decode(data)
+        if epoch != self._epoch:
+            # данные изменились во время загрузки: результат отдается ожидающим, но не кэшируется
+            return value, "miss"
+        self._local.set(local_key, value)
+        if db_cache is not None:
+            try:
+                if field is None:
+                    await db_cache.set(full_key, data, ex=self.ttl)
+                else:
+                    async with db_cache.pipeline(transaction=True) as pipe:
+                        pipe.hset(full_key, field, data)
+                        pipe.expire(full_key, self.ttl)
+                        await pipe.execute()
+            except RedisError as exc:
+                logger.warning("Unable to write cache %s: %s", full_key, exc)
+        return value, "miss"
+
+    def _observe(self, result: str, start: float) -> None:
+        CACHE_REQUESTS.labels(self.namespace, result).observe(time.perf_counter() - start)
+
+    def cached(
+        self, key: Callable[..., str], field: Optional[Callable[..., str]] = None
+    ) -> Callable[[Callable[..., Awaitable[str]]], Callable[..., Awaitable[Any]]]:
+        """
+        Декоратор функции загрузки данных: результат функции кэшируется по ключу key(*args, **kwargs)
+        (и полю field(*args, **kwargs), если оно задано).
+        Декорированная функция принимает дополнительный именованный аргумент db_cache (Redis).
+        Если у функции есть аргумент session, загрузка выполняется в собственной сессии (session_factory):
+        загрузку ожидают все объединенные запросы, и закрытие сессии первого из них не должно ее прерывать
+        """
+
+        def decorator(func: Loader) -> Callable[..., Awaitable[Any]]:
+            signature: inspect.Signature = inspect.signature(func)
+            own_session: bool = "session" in signature.parameters
+
+            @functools.wraps(func)
+            async def wrapper(*args: Any, db_cache: Optional[Redis] = None, **kwargs: Any) -> Any:
+                async def load() -> str:
+                    if not own_session:
+                        return await func(*args, **kwargs)
+                    bound: inspect.BoundArguments = signature.bind(*args, **kwargs)
+                    async with self.session_factory() as session:
+                        bound.arguments["session"] = session
+                        return await func(*bound.args, **bound.kwargs)
+
+                return await self.get(
+                    key=key(*args, **kwargs),
+                    loader=load,
+                    db_cache=db_cache,
+                    field=None if field is None else field(*args, **kwargs),
+                )
+
+            return wrapper
+
+        return decorator
+
+    async def invalidate(self, key: str, db_cache: Optional[Redis] = None) -> None:
+        """
+        Удаляет запись (со всеми ее полями) из Redis и из памяти всех воркеров
+        """
+        full_key: str = self.key(key)
+        if db_cache is not None:
+            try:
+                await db_cache.delete(full_key)
+            except RedisError as exc:
+                logger.warning("Unable to invalidate cache %s: %s", full_key, exc)
+        await invalidation_bus.publish(self.namespace, key, redis=db_cache)
+
+    async def invalidate_all(self, db_cache: Optional[Redis] = None) -> None:
+        """
+        Удаляет все записи пространства имен из Redis и из памяти всех воркеров
+        """
+        if db_cache is not None:
+            try:
+                # ключи удаляются пачками по странице SCAN: один запрос UNLINK на страницу
+                cursor: int = 0
+                while True:
+                    cursor, keys = await db_cache.scan(cursor=cursor, match=f"{self.namespace}:*", count=1000)
+                    if keys:
+                        await db_cache.unlink(*keys)
+                    if cursor == 0:
+                        break
+            except RedisError as exc:
+                logger.warning("Unable to invalidate cache %s: %s", self.namespace, exc)
+        await invalidation_bus.publish(self.namespace, redis=db_cache)
+
+    def clear(self) -> None:
+        """
+        Очищает записи в памяти процесса
+        """
+        self._local.clear()
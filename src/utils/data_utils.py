@@ -1,9 +1,13 @@
 import asyncio
+import base64
+import binascii
 import json
-from typing import Any, Type, TypeVar
+from typing import Type, TypeVar
 
+from fastapi import Response
 from pydantic import BaseModel
 
+from src.core.exceptions import ErrorInData
 from src.models.base import Base
 
 T = TypeVar("T", bound=BaseModel)
@@ -23,16 +27,37 @@ async def model_to_json(pydantic_model: Type[T], object: Base) -> str:
     return data_json
 
 
-async def json_to_model(pydantic_model: Type[T], json_object: str) -> T:
+def json_response(data: str | bytes) -> Response:
     """
-    Преобразовывает json строку с данными объекта в модель pydantic
-    :param pydantic_model: Type[T]
-        модель pydantic
-    :param json_object: str
+    Возвращает готовую json строку (например, из кэша) без повторной валидации и сериализации
+    :param data: str | bytes
         json строка с данными объекта
-    :return: T
+    :return: Response
     """
-    await asyncio.sleep(0)
-    data_dict: dict[str, Any] = json.loads(json_object)
-    data_model: T = pydantic_model(**data_dict)
-    return data_model
+    return Response(content=data, media_type="application/json")
+
+
+def encode_cursor(values: list[str]) -> str:
+    """
+    Кодирует значения ключа последней записи страницы в курсор
+    :param values: list[str]
+        значения ключа сортировки
+    :return: str
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list[str]:
+    """
+    Раскодирует курсор, полученный от клиента
+    :param cursor: str
+        курсор
+    :return: list[str]
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise ErrorInData("Invalid cursor")
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ErrorInData("Invalid cursor")
+    return values
@@ -1,39 +1,64 @@
-import asyncio
-from typing import Optional
+import math
 
-from geopy.geocoders import Nominatim  # type: ignore[import-untyped]
+# Радиус сферы, которую использует ST_DistanceSphere для SRID 4326: (2a + b) / 3 эллипсоида WGS84
+EARTH_RADIUS_METERS = 6371008.771415059
 
 
-async def get_location_info(lat: float, lon: float) -> Optional[dict[str, str]]:
+def distance_sphere(latitude_1: float, longitude_1: float, latitude_2: float, longitude_2: float) -> float:
     """
-        получение информации гео-данным
-    Args:
-        lat (float): широта
-        lon (float): долгота
+    Расстояние между двумя точками по большому кругу (в метрах).
+    Формула и радиус совпадают с ST_DistanceSphere из PostGIS
+    :param latitude_1: float
+        широта первой точки
+    :param longitude_1: float
+        долгота первой точки
+    :param latitude_2: float
+        широта второй точки
+    :param longitude_2: float
+        долгота второй точки
+    :return: float
+    """
+    lat_1: float = math.radians(latitude_1)
+    lat_2: float = math.radians(latitude_2)
+    d_lon: float = math.radians(longitude_2 - longitude_1)
+
+    cos_lat_1, sin_lat_1 = math.cos(lat_1), math.sin(lat_1)
+    cos_lat_2, sin_lat_2 = math.cos(lat_2), math.sin(lat_2)
+    cos_d_lon: float = math.cos(d_lon)
+
+    a: float = math.hypot(cos_lat_2 * math.sin(d_lon), cos_lat_1 * sin_lat_2 - sin_lat_1 * cos_lat_2 * cos_d_lon)
+    b: float = sin_lat_1 * sin_lat_2 + cos_lat_1 * cos_lat_2 * cos_d_lon
+    return math.atan2(a, b) * EARTH_RADIUS_METERS
+
+
+def grid_cell(latitude: float, longitude: float, cell_size: float) -> tuple[int, int]:
+    """
+    Номер ячейки сетки (по широте и долготе), в которую попадает точка
+    :param latitude: float
+        Широта
+    :param longitude: float
+        Долгота
+    :param cell_size: float
+        размер ячейки в градусах
+    :return: tuple[int, int]
+    """
+    return math.floor(latitude / cell_size), math.floor(longitude / cell_size)
 
-    Returns:
-        dict[str, str]: информация в виде
-    {
-    'city': 'Москва',
-    'state': 'Москва',
-    'country': 'Россия',
-    'postcode': '109012',
-    'full_address': 'Московский Кремль и Красная Площадь,Москва, Центральный федеральный округ, 109012, Россия'
-    }
 
+def grid_cell_center(cell: tuple[int, int], cell_size: float) -> tuple[float, float]:
+    """
+    Координаты (широта, долгота) центра ячейки сетки
     """
-    geolocator = Nominatim(user_agent="geo_locator")
-    location = geolocator.reverse(f"{lat}, {lon}", exactly_one=True)
+    return (cell[0] + 0.5) * cell_size, (cell[1] + 0.5) * cell_size
 
-    await asyncio.sleep(0)
 
-    if location:
-        address = location.raw.get("address", {})
-        return {
-            "city": address.get("city", address.get("town", address.get("village"))),
-            "state": address.get("state"),
-            "country": address.get("country"),
-            "postcode": address.get("postcode"),
-            "full_address": location.address,
-        }
-    return None
+def grid_cell_radius(cell: tuple[int, int], cell_size: float) -> float:
+    """
+    Наибольшее расстояние (в метрах) от центра ячейки сетки до ее точек (углов)
+    """
+    center_latitude, center_longitude = grid_cell_center(cell, cell_size)
+    return max(
+        distance_sphere(center_latitude, center_longitude, cell[0] * cell_size + d_lat, cell[1] * cell_size + d_lon)
+        for d_lat in (0.0, cell_size)
+        for d_lon in (0.0, cell_size)
+    )
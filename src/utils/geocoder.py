@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from geopy.adapters import AioHTTPAdapter  # type: ignore[import-untyped]
+from geopy.exc import GeopyError  # type: ignore[import-untyped]
+from geopy.geocoders import Nominatim  # type: ignore[import-untyped]
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.core.config import CACHE_EXP, GeoSettings, configure_logging, setting
+from src.utils.cache_utils import LocalTTLCache
+from src.utils.geo_utils import grid_cell, grid_cell_center
+from src.utils.rate_limit import TokenBucket
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+GEOCODER_CACHE_EXP = CACHE_EXP * 24  # время жизни ответа внешнего геокодера в кэше, сек
+
+
+class ReverseGeocoder:
+    """
+    Асинхронный адаптер внешнего геокодера (Nominatim).
+    Координаты округляются до ячейки сетки, ответ по ячейке кэшируется в памяти процесса и в Redis.
+    Одновременные запросы одной ячейки объединяются в один запрос к сервису,
+    частота обращений к сервису ограничивается «корзиной токенов»
+    """
+
+    def __init__(self, settings: GeoSettings = setting.geo) -> None:
+        self.settings = settings
+        self._geolocator: Optional[Nominatim] = None
+        self._exit_stack = AsyncExitStack()  # закрытие сессии aiohttp клиента
+        self._bucket = TokenBucket(rate=settings.geocoder_rate, capacity=settings.geocoder_burst)
+        self._cache = LocalTTLCache(maxsize=settings.geocoder_cache_size, ttl=GEOCODER_CACHE_EXP)
+        self._inflight: dict[str, asyncio.Task] = dict()
+
+    @property
+    def geolocator(self) -> Nominatim:
+        # Один клиент (и одна сессия aiohttp) на все запросы, создается при первом обращении
+        if self._geolocator is None:
+            self._geolocator = Nominatim(
+                user_agent=self.settings.geocoder_user_agent,
+                domain=self.settings.geocoder_domain,
+                scheme=self.settings.geocoder_scheme,
+                timeout=self.settings.geocoder_timeout,
+                adapter_factory=AioHTTPAdapter,
+            )
+            self._exit_stack.push_async_exit(self._geolocator)
+        return self._geolocator
+
+    async def close(self) -> None:
+        """
+        Закрывает соединения с сервисом и очищает кэш в памяти процесса
+        """
+        await self._exit_stack.aclose()
+        self._geolocator = None
+        self._cache.clear()
+
+    def cell_key(self, latitude: float, longitude: float) -> str:
+        """
+        Ключ кэша ячейки сетки, в которую попадает точка
+        """
+        i, j = grid_cell(latitude, longitude, self.settings.geocoder_cell_size)
+        return f"geocoder:{self.settings.geocoder_cell_size}:{i}:{j}"
+
+    async def reverse(
+        self, latitude: float, longitude: float, db_cache: Optional[Redis] = None
+    ) -> Optional[dict[str, str]]:
+        """
+        Получение информации по гео-данным
+        :param latitude: float
+            Широта
+        :param longitude: float
+            Долгота
+        :param db_cache: Optional[Redis]
+            кэш
+        :return: Optional[dict[str, str]]
+            информация в виде
+            {
+            'city': 'Москва',
+            'state': 'Москва',
+            'country': 'Россия',
+            'postcode': '109012',
+            'full_address': 'Московский Кремль и Красная Площадь,Москва, Центральный федеральный округ, 109012, Россия'
+            }
+            либо None, если место не найдено или сервис недоступен
+        """
+        key: str = self.cell_key(latitude, longitude)
+        location: Optional[dict[str, str]] = self._cache.get(key)
+        if location is not None:
+            return location or None
+
+        task: Optional[asyncio.Task] = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(key=key, db_cache=db_cache))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного из ожидающих запросов не отменяет общий запрос к сервису
+        return await asyncio.shield(task)
+
+    async def _lookup(self, key: str, db_cache: Optional[Redis]) -> Optional[dict[str, str]]:
+        """
+        Ищет ответ по ячейке в Redis, а при его отсутствии запрашивает внешний сервис.
+        Найденный ответ (в том числе пустой) сохраняется в оба уровня кэша
+        """
+        if db_cache is not None:
+            try:
+                location_json: Optional[str] = await db_cache.get(key)
+            except RedisError as exc:
+                logger.warning("Unable to read geocoder cache: %s", exc)
+                db_cache, location_json = None, None
+            if location_json is not None:
+                cached: dict[str, str] = json.loads(location_json)
+                self._cache.set(key, cached)
+                return cached or None
+
+        _, i, j = key.rsplit(":", 2)
+        latitude, longitude = grid_cell_center((int(i), int(j)), self.settings.geocoder_cell_size)
+        try:
+            location: Optional[dict[str, str]] = await self._request(latitude=latitude, longitude=longitude)
+        except (GeopyError, asyncio.TimeoutError) as exc:
+            logger.warning("External geocoder is unavailable: %s", exc)
+            return None
+        if location is None:
+            return None
+
+        self._cache.set(key, location)
+        if db_cache is not None:
+            try:
+                await db_cache.set(key, json.dumps(location, ensure_ascii=False), ex=GEOCODER_CACHE_EXP)
+            except RedisError as exc:
+                logger.warning("Unable to write geocoder cache: %s", exc)
+        return location or None
+
+    async def _request(self, latitude: float, longitude: float) -> Optional[dict[str, str]]:
+        """
+        Запрос к внешнему сервису с учетом ограничения частоты запросов
+        :return: Optional[dict[str, str]]
+            информация о месте, пустой словарь, если место не найдено,
+            либо None, если лимит запросов исчерпан
+        """
+        if not await self._bucket.acquire(timeout=self.settings.geocoder_timeout):
+            logger.warning("External geocoder rate limit exceeded")
+            return None
+
+        async with asyncio.timeout(self.settings.geocoder_timeout):
+            location = await self.geolocator.reverse(f"{latitude}, {longitude}", exactly_one=True)
+
+        if not location:
+            return dict()
+        address = location.raw.get("address", {})
+        return {
+            "city": address.get("city", address.get("town", address.get("village"))),
+            "state": address.get("state"),
+            "country": address.get("country"),
+            "postcode": address.get("postcode"),
+            "full_address": location.address,
+        }
+
+
+reverse_geocoder = ReverseGeocoder()
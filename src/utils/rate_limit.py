@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Optional, cast
+
+from redis.asyncio import Redis
+from redis.exceptions import NoScriptError, RedisError
+
+from src.core.config import RateLimitPolicy, configure_logging, setting
+from src.core.metrics import RATE_LIMIT_FALLBACK, RATE_LIMIT_REJECTED
+from src.utils.cache_utils import LocalTTLCache
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Атомарная «корзина токенов» в Redis: состояние корзины (число токенов и время пополнения) хранится в хеше,
+# время берется с сервера Redis, поэтому часы воркеров не влияют на результат.
+# Возвращает {1, 0} при разрешенном запросе либо {0, retry_after} (сек, строкой)
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ttl)
+return {allowed, tostring(retry_after)}
+"""
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode()).hexdigest()
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов «корзина токенов»:
+    корзина вмещает capacity токенов и пополняется со скоростью rate токенов в секунду
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens: float = float(capacity)
+        self._updated_at: float = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now: float = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self) -> bool:
+        """
+        Забирает токен, если он есть, не дожидаясь пополнения корзины
+        """
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """
+        Время до появления в корзине следующего токена, сек
+        """
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+    async def acquire(self, timeout: float) -> bool:
+        """
+        Забирает токен, при необходимости ожидая пополнения корзины
+        :param timeout: float
+            наибольшее время ожидания, сек
+        :return: bool
+            False, если токен не удалось получить за время timeout
+        """
+        deadline: float = time.monotonic() + timeout
+        async with self._lock:
+            while not self.try_acquire():
+                wait: float = (1 - self._tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+        return True
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitResult:
+    allowed: bool
+    retry_after: float = 0.0  # через сколько секунд запрос будет разрешен
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов по ключу (адрес клиента либо пользователь) для заданной политики.
+    Корзины токенов хранятся в Redis и общие для всех воркеров; при недоступности Redis
+    используются корзины в памяти процесса
+    """
+
+    def __init__(self, name: str, policy: RateLimitPolicy, local_size: int = 10000) -> None:
+        self.name = name
+        self.policy = policy
+        # корзина, пополнившаяся до конца, ничем не отличается от новой, поэтому ключ живет столько же
+        self.ttl: int = max(1, int(policy.burst / policy.rate) + 1)
+        self._local = LocalTTLCache(maxsize=local_size, ttl=self.ttl)
+
+    def key(self, identity: str) -> str:
+        return f"ratelimit:{self.name}:{identity}"
+
+    async def hit(self, identity: str, redis: Optional[Redis] = None) -> RateLimitResult:
+        """
+        Учитывает запрос клиента
+        :param identity: str
+            адрес клиента либо id пользователя
+        :param redis: Optional[Redis]
+            хранилище корзин; если не задано, используется корзина в памяти процесса
+        :return: RateLimitResult
+        """
+        key: str = self.key(identity)
+        result: Optional[RateLimitResult] = None
+        if redis is not None:
+            args: tuple[str, ...] = (key, str(self.policy.burst), str(self.policy.rate), str(self.ttl))
+            try:
+                try:
+                    reply = await cast(Awaitable[list[Any]], redis.evalsha(TOKEN_BUCKET_SHA, 1, *args))
+                except NoScriptError:
+                    # скрипт еще не загружен в Redis (первый вызов или перезапуск сервера)
+                    reply = await cast(Awaitable[list[Any]], redis.eval(TOKEN_BUCKET_SCRIPT, 1, *args))
+                allowed, retry_after = reply
+                result = RateLimitResult(allowed=bool(int(allowed)), retry_after=float(retry_after))
+            except RedisError as exc:
+                RATE_LIMIT_FALLBACK.labels(self.name).inc()
+                logger.warning("Rate limiter falls back to local buckets: %s", exc)
+        if result is None:
+            result = self._hit_local(key)
+        if not result.allowed:
+            RATE_LIMIT_REJECTED.labels(self.name).inc()
+        return result
+
+    def _hit_local(self, key: str) -> RateLimitResult:
+        bucket: Optional[TokenBucket] = self._local.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate=self.policy.rate, capacity=self.policy.burst)
+        self._local.set(key, bucket)
+        if bucket.try_acquire():
+            return RateLimitResult(allowed=True)
+        return RateLimitResult(allowed=False, retry_after=bucket.retry_after())
+
+    def clear(self) -> None:
+        self._local.clear()
+
+
+rate_limiters: dict[str, RateLimiter] = {
+    name: RateLimiter(name=name, policy=policy, local_size=setting.rate_limit.rate_limit_local_size)
+    for name, policy in setting.rate_limit.rate_limit_policies.items()
+}
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from src.api_v1.comments.crude import rating_cache, rebuild_airport_ratings
+from src.api_v1.comments.leaderboard import rebuild_leaderboards
+from src.core.config import configure_logging
+from src.core.database import REDIS_CACHE, REDIS_URLS, async_session_maker, create_redis_client, engine
+
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_ratings() -> int:
+    """
+    Сверка сводок отзывов аэропортов: сводки пересчитываются по таблице комментариев,
+    закэшированные рейтинги сбрасываются в Redis и во всех воркерах, рейтинги аэропортов пересобираются
+    """
+    logger.info("Start rebuild airport ratings")
+    async with async_session_maker() as session:
+        count: int = await rebuild_airport_ratings(session)
+
+        async with create_redis_client(REDIS_URLS[REDIS_CACHE]) as db_cache:
+            await rating_cache.invalidate_all(db_cache=db_cache)
+            await rebuild_leaderboards(session=session, db_cache=db_cache)
+    logger.info("Airport ratings rebuilt (%d airports)", count)
+    return count
+
+
+async def refresh_leaderboards() -> None:
+    """
+    Пересборка рейтингов аэропортов (лучшие по оценкам, самые обсуждаемые за неделю)
+    """
+    async with async_session_maker() as session:
+        async with create_redis_client(REDIS_URLS[REDIS_CACHE]) as db_cache:
+            await rebuild_leaderboards(session=session, db_cache=db_cache)
+
+
+def run_in_new_loop(job: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Запуск задачи в отдельном цикле событий (утилита, задача Celery)
+    """
+
+    async def run() -> Any:
+        try:
+            return await job()
+        finally:
+            await engine.dispose()  # соединения пула привязаны к завершающемуся циклу событий
+
+    return asyncio.run(run())
+
+
+def run_rebuild_ratings() -> int:
+    return run_in_new_loop(rebuild_ratings)
+
+
+def run_refresh_leaderboards() -> None:
+    run_in_new_loop(refresh_leaderboards)
+
+
+if __name__ == "__main__":
+    run_rebuild_ratings()
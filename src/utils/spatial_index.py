@@ -0,0 +1,107 @@
+from typing import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from src.utils.geo_utils import EARTH_RADIUS_METERS
+
+# Расхождение с ST_DistanceSphere: формула и радиус те же, что в PostGIS, поэтому
+# отличия возникают только из-за округления float64 и не превышают 1 см
+DISTANCE_TOLERANCE_METERS = 0.01
+
+FloatArray = npt.NDArray[np.float64]
+IntArray = npt.NDArray[np.intp]
+
+
+def distance_sphere_array(
+    latitude_1: npt.ArrayLike,
+    longitude_1: npt.ArrayLike,
+    latitude_2: npt.ArrayLike,
+    longitude_2: npt.ArrayLike,
+) -> FloatArray:
+    """
+    Векторизованный расчет расстояния по большому кругу (в метрах), аналог ST_DistanceSphere.
+    Аргументы приводятся к общей форме по правилам broadcasting NumPy
+    :param latitude_1: npt.ArrayLike
+        широты первых точек
+    :param longitude_1: npt.ArrayLike
+        долготы первых точек
+    :param latitude_2: npt.ArrayLike
+        широты вторых точек
+    :param longitude_2: npt.ArrayLike
+        долготы вторых точек
+    :return: FloatArray
+    """
+    lat_1 = np.radians(np.asarray(latitude_1, dtype=np.float64))
+    lat_2 = np.radians(np.asarray(latitude_2, dtype=np.float64))
+    d_lon = np.radians(np.asarray(longitude_2, dtype=np.float64) - np.asarray(longitude_1, dtype=np.float64))
+
+    cos_lat_1, sin_lat_1 = np.cos(lat_1), np.sin(lat_1)
+    cos_lat_2, sin_lat_2 = np.cos(lat_2), np.sin(lat_2)
+    cos_d_lon = np.cos(d_lon)
+
+    a = np.hypot(cos_lat_2 * np.sin(d_lon), cos_lat_1 * sin_lat_2 - sin_lat_1 * cos_lat_2 * cos_d_lon)
+    b = sin_lat_1 * sin_lat_2 + cos_lat_1 * cos_lat_2 * cos_d_lon
+    return np.arctan2(a, b) * EARTH_RADIUS_METERS
+
+
+class SphereIndex:
+    """
+    Индекс точек на сфере: координаты хранятся в смежных массивах NumPy,
+    запросы k ближайших и поиска в радиусе выполняются векторизованным расчетом расстояний
+    """
+
+    def __init__(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> None:
+        self._latitudes: FloatArray = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self._longitudes: FloatArray = np.ascontiguousarray(longitudes, dtype=np.float64)
+        if self._latitudes.shape != self._longitudes.shape:
+            raise ValueError("Latitudes and longitudes must have the same length")
+        self._latitudes.flags.writeable = False
+        self._longitudes.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self._latitudes)
+
+    def distances(self, latitude: float, longitude: float) -> FloatArray:
+        """
+        Расстояния (в метрах) от заданной точки до всех точек индекса
+        """
+        return distance_sphere_array(latitude, longitude, self._latitudes, self._longitudes)
+
+    def nearest(self, latitude: float, longitude: float, k: int) -> tuple[IntArray, FloatArray]:
+        """
+        Поиск k ближайших точек
+        :param latitude: float
+            Широта
+        :param longitude: float
+            Долгота
+        :param k: int
+            количество точек
+        :return: tuple[IntArray, FloatArray]
+            номера точек и расстояния до них (в метрах), по возрастанию расстояния
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        distances = self.distances(latitude, longitude)
+        indexes = np.argpartition(distances, k - 1)[:k]
+        indexes = indexes[np.argsort(distances[indexes], kind="stable")]
+        return indexes, distances[indexes]
+
+    def within(self, latitude: float, longitude: float, radius: float) -> tuple[IntArray, FloatArray]:
+        """
+        Поиск точек в радиусе от заданной точки
+        :param latitude: float
+            Широта
+        :param longitude: float
+            Долгота
+        :param radius: float
+            радиус (в метрах)
+        :return: tuple[IntArray, FloatArray]
+            номера точек и расстояния до них (в метрах), по возрастанию расстояния
+        """
+        distances = self.distances(latitude, longitude)
+        indexes = np.flatnonzero(distances <= radius)
+        indexes = indexes[np.argsort(distances[indexes], kind="stable")]
+        return indexes, distances[indexes]
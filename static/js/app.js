@@ -44,6 +44,9 @@ createApp({
         const reviewRating = ref(5);
         const reviewSending = ref(false);
         const average_rating = ref(0.0);
+        const reviewCount = ref(0);
+        const reviewsCursor = ref(null); // курсор следующей страницы отзывов
+        const reviewsLoadingMore = ref(false);
         const airportSearch = ref('');
         const loadingAirportDetails = ref(false);
         const airportSearchError = ref(null);
@@ -870,9 +873,25 @@ createApp({
 
 
         // Методы для работы с отзывами
+        const topRatedAirports = ref([]);
+        const mostReviewedAirports = ref([]);
+
+        const loadLeaderboards = async () => {
+            try {
+                const [topRated, mostReviewed] = await Promise.all([
+                    fetch(`${baseURL}/api/leaderboard/top-rated?limit=5`),
+                    fetch(`${baseURL}/api/leaderboard/most-reviewed?limit=5`),
+                ]);
+                if (topRated.ok) topRatedAirports.value = await topRated.json();
+                if (mostReviewed.ok) mostReviewedAirports.value = await mostReviewed.json();
+            } catch (error) {
+                console.error('Ошибка загрузки рейтингов аэропортов:', error);
+            }
+        };
+
         const loadAverageRating = async (airportId) => {
             try {
-                const response = await fetch(`${baseURL}/api/reviews/${airportId}/rating`);
+                const response = await fetch(`${baseURL}/api/reviews/${airportId}/histogram`);
 
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
@@ -880,11 +899,13 @@ createApp({
 
                 const data = await response.json();
                 average_rating.value = data.average_rating;
+                reviewCount.value = data.review_count;
                 console.log('Обновленный рейтинг аэропорта:', average_rating.value);
 
             } catch (error) {
                 console.error('Ошибка загрузки рейтинга:', error);
                 average_rating.value = 0.0; // Значение по умолчанию при ошибке
+                reviewCount.value = reviews.value.length;
             }
         };
 
@@ -894,6 +915,7 @@ createApp({
                 const response = await fetch(`${baseURL}/api/reviews/${airportId}`);
                 if (response.ok) {
                     reviews.value = await response.json();
+                    reviewsCursor.value = response.headers.get('X-Next-Cursor');
                     console.log('Загрузка отзывов:', reviews.value);
                     await loadAverageRating(airportId);
                 }
@@ -905,6 +927,24 @@ createApp({
             }
         };
 
+        const loadMoreReviews = async () => {
+            if (!reviewsCursor.value || !selectedAirport.value) return;
+
+            reviewsLoadingMore.value = true;
+            try {
+                const params = new URLSearchParams({ cursor: reviewsCursor.value });
+                const response = await fetch(`${baseURL}/api/reviews/${selectedAirport.value.id}?${params}`);
+                if (response.ok) {
+                    reviews.value = reviews.value.concat(await response.json());
+                    reviewsCursor.value = response.headers.get('X-Next-Cursor');
+                }
+            } catch (error) {
+                console.error('Ошибка загрузки отзывов:', error);
+            } finally {
+                reviewsLoadingMore.value = false;
+            }
+        };
+
         const submitReview = async () => {
             if (!reviewText.value.trim() || !selectedAirport.value) return;
 
@@ -1001,6 +1041,7 @@ createApp({
                 }
             }, 1000);
             fetchAirports(1);
+            loadLeaderboards();
             getUserLocation();
 
             const modalElem = document.getElementById('airportSearchModal');
@@ -1052,12 +1093,18 @@ createApp({
             reviewRating,
             reviewSending,
             average_rating,
+            reviewCount,
+            reviewsCursor,
+            reviewsLoadingMore,
             airportSearch,
             loadingAirportDetails,
             airportSearchError,
             formatDate,
             submitReview,
             loadReviews,
+            loadMoreReviews,
+            topRatedAirports,
+            mostReviewedAirports,
             openCityModal,
             openAirportModal,
             selectCity,
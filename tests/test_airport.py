@@ -1,11 +1,24 @@
 import asyncio
+import contextlib
+import json
+import random
 
+import pytest
+from aiohttp import web
 from httpx import AsyncClient
+from redis import Redis
 from sqlalchemy import func, select
 from sqlalchemy.engine import Result
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.api_v1.airports.crud import get_airports_nearest
+from src.core.config import GeoSettings, setting
+from src.core.invalidation import InvalidationBus
 from src.models.airport import Airport
+from src.utils.cache_utils import ReadThroughCache, get_or_rebuild_list
+from src.utils.geo_utils import distance_sphere
+from src.utils.geocoder import ReverseGeocoder
+from src.utils.spatial_index import DISTANCE_TOLERANCE_METERS, SphereIndex
 
 
 async def test_db_operation(test_db: AsyncSession):
@@ -92,3 +105,352 @@ async def test_airport_geo_local(
     print(response.json())
     assert response.status_code == 200
     assert response.json()["city"] == "Москва"
+
+
+async def test_airport_nearest_snapshot_matches_db(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+    monkeypatch,
+):
+    monkeypatch.setattr(setting.geo, "nearest_engine", "memory")
+    data = {
+        "latitude": 55.75,
+        "longitude": 37.62,
+        "limit": 5,
+    }
+    response = await client.get("api/nearest", params=data)
+    assert response.status_code == 200
+
+    airports_db = await get_airports_nearest(session=test_db, latitude=55.75, longitude=37.62, limit=5)
+    assert [airport["id"] for airport in response.json()] == [str(airport.id) for airport in airports_db]
+    assert [airport["distance"] for airport in response.json()] == [airport.distance for airport in airports_db]
+
+
+async def test_airport_get_by_cursor(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+):
+    names: list[str] = list()
+    params: dict[str, str | int] = {"size": 3}
+    while True:
+        response = await client.get("api/airports/cursor", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert page["total"] == 8
+        names.extend(airport["name"] for airport in page["items"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert len(names) == 8
+    assert names == sorted(names)
+
+
+async def test_airport_list_cache_single_rebuild(
+    event_loop: asyncio.AbstractEventLoop,
+    db_redis_cache: Redis,
+):
+    key = "test:airports"
+    await db_redis_cache.delete(key, f"{key}:stale")
+    calls: list[int] = list()
+
+    async def loader() -> list[str]:
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return ["a", "b", "c"]
+
+    results = await asyncio.gather(*(get_or_rebuild_list(db_redis_cache, key, loader) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(result == ["a", "b", "c"] for result in results)
+    assert await db_redis_cache.lrange(key, 0, -1) == ["a", "b", "c"]
+    await db_redis_cache.delete(key, f"{key}:stale")
+
+
+def test_sphere_index_matches_scalar_distance():
+    rnd = random.Random(7)
+    points = [(rnd.uniform(41.0, 78.0), rnd.uniform(19.0, 180.0)) for _ in range(200)]
+    index = SphereIndex(latitudes=[lat for lat, _ in points], longitudes=[lon for _, lon in points])
+
+    indexes, distances = index.nearest(latitude=55.75, longitude=37.62, k=5)
+
+    expected = sorted(range(len(points)), key=lambda i: distance_sphere(55.75, 37.62, *points[i]))[:5]
+    assert indexes.tolist() == expected
+    for i, distance in zip(indexes.tolist(), distances.tolist()):
+        assert abs(distance - distance_sphere(55.75, 37.62, *points[i])) < DISTANCE_TOLERANCE_METERS
+
+    within, _ = index.within(latitude=55.75, longitude=37.62, radius=distances[-1])
+    assert within.tolist() == expected
+
+
+async def test_airport_nearest_cell_cache(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+    db_redis_cache: Redis,
+    monkeypatch,
+):
+    monkeypatch.setattr(setting.geo, "nearest_engine", "postgis")
+    async for key in db_redis_cache.scan_iter(match="nearest:*"):
+        await db_redis_cache.delete(key)
+
+    # Точки одной ячейки сетки и разные limit обслуживаются одной записью кэша
+    for latitude, longitude, limit in ((55.75, 37.62, 3), (55.71, 37.68, 5), (55.79, 37.61, 1)):
+        data = {"latitude": latitude, "longitude": longitude, "limit": limit}
+        response = await client.get("api/nearest", params=data)
+        assert response.status_code == 200
+
+        airports_db = await get_airports_nearest(session=test_db, latitude=latitude, longitude=longitude, limit=limit)
+        assert [airport["id"] for airport in response.json()] == [str(airport.id) for airport in airports_db]
+        assert [airport["distance"] for airport in response.json()] == [airport.distance for airport in airports_db]
+
+
+async def test_airport_within_radius_and_bbox(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+):
+    data = {"latitude": 55.75, "longitude": 37.62, "radius_km": 50}
+    response = await client.get("api/airports/within", params=data)
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert {airport["city"] for airport in items} == {"Москва"}
+    assert [airport["distance"] for airport in items] == sorted(airport["distance"] for airport in items)
+    assert all(airport["distance"] <= 50 for airport in items)
+
+    data = {"min_latitude": 55.0, "min_longitude": 37.0, "max_latitude": 56.5, "max_longitude": 38.5}
+    response = await client.get("api/airports/within", params=data)
+    assert response.status_code == 200
+    assert response.json()["total"] == len(items)
+
+    response = await client.get("api/airports/within", params={"latitude": 55.75, "longitude": 37.62})
+    assert response.status_code == 400
+
+
+async def test_airport_distance_batch_and_matrix(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+):
+    stmt = select(Airport).filter(Airport.city == "Москва").order_by(Airport.name)
+    result = await test_db.execute(stmt)
+    airports = result.scalars().all()
+    city = {"latitude": 55.75, "longitude": 37.62}
+    points = [{"latitude": airport.latitude, "longitude": airport.longitude} for airport in airports]
+
+    response = await client.post(
+        "api/distance/batch", json={"pairs": [{"origin": city, "destination": point} for point in points]}
+    )
+    assert response.status_code == 200
+    for airport, distance in zip(airports, response.json()["distance_meters"]):
+        expected: float = distance_sphere(55.75, 37.62, airport.latitude, airport.longitude)
+        assert abs(distance - expected) <= DISTANCE_TOLERANCE_METERS
+
+    response = await client.post("api/distance/matrix", json={"origins": [city, *points], "destinations": points})
+    assert response.status_code == 200
+    matrix = response.json()["distance_kilometers"]
+    assert len(matrix) == len(points) + 1
+    assert all(matrix[i + 1][i] == 0 for i in range(len(points)))
+
+
+async def test_reverse_geocoder_stub_server():
+    requests: list[str] = list()
+
+    async def reverse(request: web.Request) -> web.Response:
+        requests.append(request.query["lat"])
+        await asyncio.sleep(0.05)
+        return web.json_response(
+            {
+                "lat": request.query["lat"],
+                "lon": request.query["lon"],
+                "display_name": "Красная площадь, Москва, Россия",
+                "address": {"city": "Москва", "state": "Москва", "country": "Россия", "postcode": "109012"},
+            }
+        )
+
+    app = web.Application()
+    app.router.add_get("/reverse", reverse)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port: int = runner.addresses[0][1]
+
+    settings = GeoSettings(
+        geocoder_domain=f"127.0.0.1:{port}",
+        geocoder_scheme="http",
+        geocoder_timeout=0.5,
+        geocoder_rate=0.1,
+        geocoder_burst=1,
+    )
+    geocoder = ReverseGeocoder(settings=settings)
+    try:
+        # одновременные запросы точек одной ячейки объединяются в один запрос к сервису
+        locations = await asyncio.gather(*(geocoder.reverse(55.751 + i * 0.0001, 37.621) for i in range(10)))
+        assert all(location["city"] == "Москва" for location in locations)
+        assert len(requests) == 1
+
+        # повторный запрос ячейки обслуживается из кэша
+        assert (await geocoder.reverse(55.752, 37.622))["city"] == "Москва"
+        assert len(requests) == 1
+
+        # лимит запросов исчерпан: без ожидания дольше таймаута возвращается пустой ответ
+        assert await geocoder.reverse(43.45, 39.95) is None
+        assert len(requests) == 1
+    finally:
+        await geocoder.close()
+        await runner.cleanup()
+
+
+async def test_read_through_cache_single_flight():
+    cache = ReadThroughCache(namespace="test", decode=json.loads)
+    calls: list[int] = list()
+
+    @cache.cached(key=lambda id_item: f"id:{id_item}")
+    async def load_item(id_item: int) -> str:
+        calls.append(id_item)
+        await asyncio.sleep(0.01)
+        if id_item < 0:
+            raise ValueError("Item not found")
+        return json.dumps({"id": id_item})
+
+    # одновременные промахи по одному ключу - одна загрузка
+    results = await asyncio.gather(*(load_item(1) for _ in range(10)))
+    assert results == [{"id": 1}] * 10
+    assert calls == [1]
+
+    assert await load_item(id_item=1) == {"id": 1}
+    assert calls == [1]
+
+    # ошибки загрузки не кэшируются
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await load_item(-1)
+    assert calls == [1, -1, -1]
+
+    await cache.invalidate("id:1")
+    assert await load_item(1) == {"id": 1}
+    assert calls == [1, -1, -1, 1]
+
+
+async def test_read_through_cache_own_session():
+    cache = ReadThroughCache(namespace="test_session")
+    opened: list[object] = list()
+
+    @contextlib.asynccontextmanager
+    async def session_factory():
+        session = object()
+        opened.append(session)
+        yield session
+
+    cache.session_factory = session_factory
+
+    @cache.cached(key=lambda session, id_item: f"id:{id_item}")
+    async def load_item(session: object, id_item: int) -> str:
+        await asyncio.sleep(0.01)
+        return json.dumps({"session": opened.index(session)})
+
+    # общая загрузка идет в собственной сессии, а не в сессии запроса, который ее начал
+    request_session = object()
+    results = await asyncio.gather(*(load_item(session=request_session, id_item=1) for _ in range(3)))
+    assert results == ['{"session": 0}'] * 3
+    assert len(opened) == 1
+
+
+async def test_read_through_cache_fields():
+    cache = ReadThroughCache(namespace="test_fields")
+    calls: list[str] = list()
+
+    @cache.cached(key=lambda id_item, page: f"id:{id_item}", field=lambda id_item, page: f"page:{page}")
+    async def load_page(id_item: int, page: int) -> str:
+        calls.append(f"{id_item}:{page}")
+        number: int = len(calls)
+        await asyncio.sleep(0.01)
+        return json.dumps([id_item, page, number])
+
+    assert await load_page(1, 1) == "[1, 1, 1]"
+    assert await load_page(1, 2) == "[1, 2, 2]"
+    assert await load_page(2, 1) == "[2, 1, 3]"
+
+    # сброс записи удаляет все ее поля, остальные записи остаются в кэше
+    cache.evict_local("id:1")
+    assert await load_page(1, 2) == "[1, 2, 4]"
+    assert await load_page(2, 1) == "[2, 1, 3]"
+
+    # загрузка, во время которой запись сброшена, не кэшируется и не объединяется с последующими запросами
+    stale = asyncio.ensure_future(load_page(1, 1))
+    await asyncio.sleep(0)
+    cache.evict_local("id:1")
+    fresh = await load_page(1, 1)
+    assert await stale == "[1, 1, 5]"
+    assert fresh == "[1, 1, 6]"
+    assert await load_page(1, 1) == "[1, 1, 6]"
+
+
+async def test_read_through_cache_get_many():
+    cache = ReadThroughCache(namespace="test_many", decode=json.loads)
+    calls: list[list[str]] = list()
+
+    async def load(keys: list[str]) -> dict[str, str]:
+        calls.append(keys)
+        return {key: json.dumps({"id": key}) for key in keys if key != "missing"}
+
+    # промахи загружаются одним вызовом, записи, которых нет в БД, пропускаются
+    values = await cache.get_many(["1", "2", "missing"], loader=load, field="summary")
+    assert values == {"1": {"id": "1"}, "2": {"id": "2"}}
+    assert calls == [["1", "2", "missing"]]
+
+    # загружаются только отсутствующие в кэше записи
+    values = await cache.get_many(["2", "3"], loader=load, field="summary")
+    assert values == {"2": {"id": "2"}, "3": {"id": "3"}}
+    assert calls[1:] == [["3"]]
+
+    cache.evict_local("2")
+    await cache.get_many(["1", "2"], loader=load, field="summary")
+    assert calls[2:] == [["2"]]
+
+
+async def test_invalidation_bus_events():
+    bus = InvalidationBus()
+    evicted: list = list()
+    bus.subscribe("airport", evicted.append)
+
+    await bus.publish("airport", "id:1")
+    assert evicted == ["id:1"]
+
+    bus._versions["airport"] = 1
+    bus.handle_message('{"namespace": "airport", "key": "id:2", "version": 2}')
+    assert evicted == ["id:1", "id:2"]
+    assert bus._versions["airport"] == 2
+
+    # событие версии 3 пропущено: версия не считается обработанной, сверка сбросит пространство имен
+    bus.handle_message('{"namespace": "airport", "key": "id:4", "version": 4}')
+    assert bus._versions["airport"] == 2
+
+    bus.handle_message("not json")
+    assert evicted == ["id:1", "id:2", "id:4"]
+
+
+async def test_invalidation_bus_between_workers(event_loop: asyncio.AbstractEventLoop, db_redis_cache: Redis):
+    worker, writer = InvalidationBus(version_check=0.1), InvalidationBus()
+    evicted: list = list()
+    worker.subscribe("test", evicted.append)
+    worker.start(db_redis_cache)
+    try:
+        await asyncio.sleep(0.2)  # подписка и начальная сверка версий
+        evicted.clear()
+        await writer.publish("test", "key", redis=db_redis_cache)
+        for _ in range(20):
+            if evicted:
+                break
+            await asyncio.sleep(0.05)
+        assert evicted == ["key"]
+
+        # событие, опубликованное без подписчиков, восполняется сверкой версий
+        await db_redis_cache.incr("invalidation:version:test")
+        await asyncio.sleep(0.3)
+        assert evicted[-1] is None
+    finally:
+        await worker.stop()
@@ -0,0 +1,60 @@
+import json
+import time
+
+import jwt
+import pytest
+from aiohttp import web
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from src.api_v1.auth.jwks import JWKSCache, verify_google_id_token
+from src.core.config import setting
+from src.core.http_client import HttpClient
+
+
+async def test_google_id_token_verified_by_cached_jwks():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk: dict = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": "test-key", "alg": "RS256", "use": "sig"})
+    requests: list[str] = list()
+
+    async def certs(request: web.Request) -> web.Response:
+        requests.append(request.path)
+        return web.json_response({"keys": [jwk]})
+
+    app = web.Application()
+    app.router.add_get("/certs", certs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port: int = runner.addresses[0][1]
+
+    client = HttpClient()
+    jwks = JWKSCache(url=f"http://127.0.0.1:{port}/certs", refresh_interval=3600, client=client)
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": setting.google.OAUTH_GOOGLE_CLIENT_ID,
+        "exp": int(time.time()) + 600,
+        "email": "google@example.com",
+        "name": "Google User",
+        "picture": "",
+    }
+    try:
+        token: str = jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": "test-key"})
+        for _ in range(3):
+            assert (await verify_google_id_token(token, jwks=jwks))["email"] == "google@example.com"
+        assert len(requests) == 1
+
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        forged: str = jwt.encode(claims, other_key, algorithm="RS256", headers={"kid": "test-key"})
+        with pytest.raises(jwt.InvalidSignatureError):
+            await verify_google_id_token(forged, jwks=jwks)
+
+        wrong_audience: str = jwt.encode(
+            {**claims, "aud": "other-client"}, private_key, algorithm="RS256", headers={"kid": "test-key"}
+        )
+        with pytest.raises(jwt.InvalidAudienceError):
+            await verify_google_id_token(wrong_audience, jwks=jwks)
+    finally:
+        await client.close()
+        await runner.cleanup()
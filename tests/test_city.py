@@ -5,6 +5,9 @@ from sqlalchemy import func, select
 from sqlalchemy.engine import Result
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.api_v1.cities.crud import get_city_nearest
+from src.api_v1.cities.snapshot import load_city_snapshot
+from src.core.config import setting
 from src.models.city import City
 
 
@@ -26,3 +29,29 @@ async def test_city_get_by_name(
     response = await client.get("api/city", params=data)
     assert response.status_code == 200
     assert response.json()["city"] == "Адлер"
+
+
+async def test_city_geo_local_offline(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db_city: AsyncSession,
+    monkeypatch,
+):
+    monkeypatch.setattr(setting.geo, "geocoder_fallback", False)
+
+    for engine in ("memory", "postgis"):
+        monkeypatch.setattr(setting.geo, "geocoder_engine", engine)
+        response = await client.get("api/geo-local", params={"latitude": 43.45, "longitude": 39.95})
+        assert response.status_code == 200
+        assert response.json()["city"] == "Адлер"
+
+        response = await client.get("api/geo-local", params={"latitude": 0.0, "longitude": 0.0})
+        assert response.status_code == 200
+        assert response.json()["city"] == "Неизвестный город"
+
+    snapshot = await load_city_snapshot(test_db_city)
+    for latitude, longitude in ((43.45, 39.95), (55.75, 37.62), (61.0, 100.0)):
+        city_memory = snapshot.nearest(latitude=latitude, longitude=longitude)
+        city_db = await get_city_nearest(session=test_db_city, latitude=latitude, longitude=longitude)
+        assert city_memory.city == city_db.city
+        assert city_memory.distance == city_db.distance
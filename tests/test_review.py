@@ -1,10 +1,15 @@
 import asyncio
 
 from httpx import AsyncClient
-from sqlalchemy import select
+from redis import Redis
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.api_v1.comments.crude import get_rating_summary, rebuild_airport_ratings
+from src.api_v1.comments.leaderboard import rebuild_leaderboards
 from src.models.airport import Airport
+from src.models.comment import AirportComment
+from src.models.rating import AirportRating
 
 
 async def test_create_reviews_email_confirmed(
@@ -132,3 +137,175 @@ async def test_get_rating_none(
     response = await client.get(f"api/reviews/{airport.id}/rating")
     assert response.status_code == 200
     assert response.json()["average_rating"] == 0.0
+
+
+async def test_rating_histogram_and_rebuild(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+    token_admin: str,
+):
+    stmt = select(Airport).filter(Airport.name == "Шереметьево")
+    result = await test_db.execute(stmt)
+    airport = result.scalars().one_or_none()
+
+    header = {"Authorization": f"Bearer {token_admin}"}
+    for rating in (5, 4, 4):
+        data = {"content": "Отзыв", "rating": rating, "airport_id": str(airport.id)}
+        response = await client.post("api/reviews", json=data, headers=header)
+        assert response.status_code == 201
+
+    response = await client.get(f"api/reviews/{airport.id}/histogram")
+    assert response.status_code == 200
+    assert response.json() == {
+        "review_count": 3,
+        "average_rating": 13 / 3,
+        "histogram": {"1": 0, "2": 0, "3": 0, "4": 2, "5": 1},
+    }
+
+    comment = (await test_db.execute(select(AirportComment).filter(AirportComment.rating == 5))).scalars().first()
+    response = await client.delete(f"api/reviews/comment/{comment.id}", headers=header)
+    assert response.status_code == 204
+    response = await client.get(f"api/reviews/{airport.id}/rating")
+    assert response.json()["average_rating"] == 4
+
+    # сверка пересчитывает сводку с нуля и приходит к тому же результату
+    await test_db.execute(update(AirportRating).values(review_count=100))
+    assert await rebuild_airport_ratings(test_db) == 1
+    summary = await get_rating_summary(session=test_db, id_airport=airport.id)
+    assert (summary.review_count, summary.rating_sum, summary.histogram[4]) == (2, 8, 2)
+
+
+async def test_get_reviews_pagination(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+    token_admin: str,
+):
+    stmt = select(Airport).filter(Airport.name == "Шереметьево")
+    result = await test_db.execute(stmt)
+    airport = result.scalars().one_or_none()
+
+    header = {"Authorization": f"Bearer {token_admin}"}
+    for number in range(3):
+        data = {"content": f"Отзыв {number}", "rating": 5, "airport_id": str(airport.id)}
+        response = await client.post("api/reviews", json=data, headers=header)
+        assert response.status_code == 201
+
+    response = await client.get(f"api/reviews/{airport.id}", params={"size": 2})
+    assert response.status_code == 200
+    assert [review["comment_text"] for review in response.json()] == ["Отзыв 2", "Отзыв 1"]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = await client.get(f"api/reviews/{airport.id}", params={"size": 2, "cursor": cursor})
+    assert response.status_code == 200
+    assert [review["comment_text"] for review in response.json()] == ["Отзыв 0"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = await client.get(f"api/reviews/{airport.id}", params={"cursor": "bad"})
+    assert response.status_code == 400
+
+
+async def test_reviews_cache_invalidated_on_write(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+    token_admin: str,
+):
+    stmt = select(Airport).filter(Airport.name == "Шереметьево")
+    result = await test_db.execute(stmt)
+    airport = result.scalars().one_or_none()
+
+    # пустые страница отзывов и рейтинг попадают в кэш
+    response = await client.get(f"api/reviews/{airport.id}")
+    assert response.json() == []
+    response = await client.get(f"api/reviews/{airport.id}/rating")
+    assert response.json()["average_rating"] == 0.0
+
+    header = {"Authorization": f"Bearer {token_admin}"}
+    data = {"content": "Всё отлично", "rating": 4, "airport_id": str(airport.id)}
+    response = await client.post("api/reviews", json=data, headers=header)
+    assert response.status_code == 201
+
+    # после добавления отзыва кэш аэропорта сброшен
+    response = await client.get(f"api/reviews/{airport.id}")
+    assert [review["comment_text"] for review in response.json()] == ["Всё отлично"]
+    response = await client.get(f"api/reviews/{airport.id}/rating")
+    assert response.json()["average_rating"] == 4
+    response = await client.get(f"api/reviews/{airport.id}/histogram")
+    assert response.json()["review_count"] == 1
+
+    # после удаления отзыва - тоже
+    response = await client.get(f"api/reviews/{airport.id}")
+    response = await client.delete(f"api/reviews/comment/{response.json()[0]['id']}", headers=header)
+    assert response.status_code == 204
+    response = await client.get(f"api/reviews/{airport.id}")
+    assert response.json() == []
+    response = await client.get(f"api/reviews/{airport.id}/rating")
+    assert response.json()["average_rating"] == 0.0
+
+
+async def test_leaderboards(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+    db_redis_cache: Redis,
+    token_admin: str,
+):
+    airports: dict[str, Airport] = dict()
+    for name in ("Шереметьево", "Внуково"):
+        result = await test_db.execute(select(Airport).filter(Airport.name == name))
+        airports[name] = result.scalars().one()
+    # рейтинги в Redis приводятся к состоянию БД текущего теста
+    await rebuild_leaderboards(session=test_db, db_cache=db_redis_cache)
+
+    header = {"Authorization": f"Bearer {token_admin}"}
+    for name, rating in (("Шереметьево", 3), ("Шереметьево", 4), ("Внуково", 5)):
+        data = {"content": "Отзыв", "rating": rating, "airport_id": str(airports[name].id)}
+        response = await client.post("api/reviews", json=data, headers=header)
+        assert response.status_code == 201
+
+    response = await client.get("api/leaderboard/top-rated", params={"min_reviews": 1})
+    assert response.status_code == 200
+    assert [(item["name"], item["average_rating"], item["review_count"]) for item in response.json()] == [
+        ("Внуково", 5, 1),
+        ("Шереметьево", 3.5, 2),
+    ]
+    response = await client.get("api/leaderboard/top-rated", params={"min_reviews": 2})
+    assert [item["name"] for item in response.json()] == ["Шереметьево"]
+
+    response = await client.get("api/leaderboard/most-reviewed")
+    assert response.status_code == 200
+    assert [(item["name"], item["review_count"]) for item in response.json()] == [("Шереметьево", 2), ("Внуково", 1)]
+
+    # пересборка по данным БД приходит к тем же рейтингам
+    await rebuild_leaderboards(session=test_db, db_cache=db_redis_cache)
+    response = await client.get("api/leaderboard/most-reviewed", params={"limit": 1})
+    assert [(item["name"], item["review_count"]) for item in response.json()] == [("Шереметьево", 2)]
+
+
+async def test_airports_list_with_ratings(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_db: AsyncSession,
+    token_admin: str,
+):
+    stmt = select(Airport).filter(Airport.name == "Шереметьево")
+    result = await test_db.execute(stmt)
+    airport = result.scalars().one_or_none()
+
+    header = {"Authorization": f"Bearer {token_admin}"}
+    for rating in (4, 5):
+        data = {"content": "Отзыв", "rating": rating, "airport_id": str(airport.id)}
+        response = await client.post("api/reviews", json=data, headers=header)
+        assert response.status_code == 201
+
+    response = await client.get("api/airports", params={"page": 1, "size": 20})
+    assert response.status_code == 200
+    ratings = {item["name"]: (item["average_rating"], item["review_count"]) for item in response.json()["items"]}
+    assert ratings["Шереметьево"] == (4.5, 2)
+    assert ratings["Внуково"] == (0.0, 0)
+
+    response = await client.get("api/airports/cursor", params={"size": 20})
+    ratings = {item["name"]: (item["average_rating"], item["review_count"]) for item in response.json()["items"]}
+    assert ratings["Шереметьево"] == (4.5, 2)
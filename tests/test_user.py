@@ -1,8 +1,21 @@
 import asyncio
+import uuid
 
+import bcrypt
+import jwt
+import pytest
 from httpx import AsyncClient
+from redis import Redis
+from starlette.requests import Request
 
+from src.api_v1.users.identity import user_cache_key
+from src.core.config import RateLimitPolicy, RateLimitSettings, setting
+from src.core.depends import client_identity
+from src.core.exceptions import PasswordHashBusy
+from src.core.jwt_utils import PasswordHasher, create_jwt
+from src.core.token_cache import VerifiedTokenCache
 from src.models.user import User
+from src.utils.rate_limit import RateLimiter, rate_limiters
 
 username = "Bob"
 email = "Bob@mail.ru"
@@ -79,3 +92,153 @@ async def test_user_about_me(
     )
     assert response.status_code == 200
     assert response.json()["full_name"] == "TestUser"
+
+
+async def test_user_identity_cache(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    db_redis_cache: Redis,
+    test_user_admin: User,
+    token_admin: str,
+):
+    header = {"Authorization": f"Bearer {token_admin}"}
+    response = await client.get("api/users/me", headers=header)
+    assert response.status_code == 200
+    assert await db_redis_cache.get(user_cache_key(test_user_admin.id)) is not None
+
+    response = await client.patch(f"api/users/{test_user_admin.id}/", headers=header, json={"full_name": "NewName"})
+    assert response.status_code == 200
+    assert await db_redis_cache.get(user_cache_key(test_user_admin.id)) is None
+
+    response = await client.get("api/users/me", headers=header)
+    assert response.status_code == 200
+    assert response.json()["full_name"] == "NewName"
+
+
+async def test_password_hasher_sheds_excess():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    try:
+        results = await asyncio.gather(
+            *(hasher.run("hash", bcrypt.hashpw, password.encode(), bcrypt.gensalt()) for _ in range(4)),
+            return_exceptions=True,
+        )
+    finally:
+        hasher.shutdown()
+
+    assert sum(isinstance(result, bytes) for result in results) == 2
+    assert sum(isinstance(result, PasswordHashBusy) for result in results) == 2
+    assert hasher.pending == 0
+
+
+async def test_token_cache_decodes_once():
+    cache = VerifiedTokenCache()
+    sub: str = str(uuid.uuid4())
+    token: str = await create_jwt(user=sub)
+
+    assert (await cache.decode(token))["sub"] == sub
+    assert (await cache.decode(token))["sub"] == sub
+    assert len(cache._cache) == 1
+
+    cache.revoke_subject(sub)
+    assert len(cache._cache) == 0
+
+    with pytest.raises(jwt.InvalidTokenError):
+        await cache.decode(token + "x")
+
+
+async def test_user_logout_revokes_token(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    token_admin: str,
+):
+    header = {"Authorization": f"Bearer {token_admin}"}
+    response = await client.get("api/users/me", headers=header)
+    assert response.status_code == 200
+
+    response = await client.get("api/users/logout", headers=header)
+    assert response.status_code == 200
+
+    response = await client.get("api/users/me", headers=header)
+    assert response.status_code == 401
+
+    # отозванный токен нельзя обменять на новый через запрос подтверждения почты
+    response = await client.get("api/users/mail_confirm", headers=header)
+    assert response.status_code == 401
+
+
+async def test_user_sessions_per_device(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    test_user_admin: User,
+):
+    login = {"username": "testuser@example.com", "password": "1qaz!QAZ"}
+    tokens: list[str] = list()
+    for _ in range(2):
+        response = await client.post("/api/users/login", json=login)
+        assert response.status_code == 202
+        tokens.append(response.json()["access_token"])
+        client.cookies.clear()  # каждый вход - отдельное устройство
+
+    response = await client.get("api/users/logout", headers={"Authorization": f"Bearer {tokens[0]}"})
+    assert response.status_code == 200
+    response = await client.get("api/users/me", headers={"Authorization": f"Bearer {tokens[0]}"})
+    assert response.status_code == 401
+    response = await client.get("api/users/me", headers={"Authorization": f"Bearer {tokens[1]}"})
+    assert response.status_code == 200
+
+    response = await client.post("/api/users/login", json=login)
+    tokens.append(response.json()["access_token"])
+    response = await client.post("api/users/logout_all", headers={"Authorization": f"Bearer {tokens[2]}"})
+    assert response.status_code == 200
+    for token in tokens[1:]:
+        response = await client.get("api/users/me", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 401
+
+
+async def test_rate_limiter_local_fallback():
+    limiter = RateLimiter(name="test", policy=RateLimitPolicy(rate=1, burst=2))
+
+    assert (await limiter.hit("ip:1")).allowed
+    assert (await limiter.hit("ip:1")).allowed
+    result = await limiter.hit("ip:1")
+    assert not result.allowed
+    assert 0 < result.retry_after <= 1
+    assert (await limiter.hit("ip:2")).allowed
+
+
+async def test_rate_limit_client_identity():
+    def request(headers: dict[str, str]) -> Request:
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+        return Request({"type": "http", "headers": raw_headers, "client": ("10.0.0.2", 5000)})
+
+    # X-Forwarded-For задает клиент: ключом служит адрес из заголовка nginx
+    identity = await client_identity(request({"X-Forwarded-For": "1.1.1.1", "X-Real-IP": "2.2.2.2"}), by_user=False)
+    assert identity == "ip:2.2.2.2"
+    assert await client_identity(request({}), by_user=False) == "ip:10.0.0.2"
+
+    # политики из окружения дополняют политики по умолчанию
+    policies = RateLimitSettings(rate_limit_policies={"login": {"rate": 1, "burst": 1}}).rate_limit_policies
+    assert policies["login"].burst == 1
+    assert {"register", "mail_confirm", "geo_local"} <= set(policies)
+
+
+async def test_user_login_rate_limited(
+    event_loop: asyncio.AbstractEventLoop,
+    client: AsyncClient,
+    db_redis_cache: Redis,
+    test_user_admin: User,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    limiter = rate_limiters["login"]
+    monkeypatch.setattr(setting.rate_limit, "rate_limit_enabled", True)
+    monkeypatch.setattr(limiter, "policy", RateLimitPolicy(rate=0.01, burst=2))
+    async for key in db_redis_cache.scan_iter(match=limiter.key("*")):
+        await db_redis_cache.delete(key)
+
+    login = {"username": "testuser@example.com", "password": "1qaz!QAZ"}
+    for _ in range(2):
+        response = await client.post("/api/users/login", json=login)
+        assert response.status_code == 202
+    response = await client.post("/api/users/login", json=login)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1